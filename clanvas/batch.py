@@ -0,0 +1,55 @@
+from .outputter import get_outputter
+
+EXIT_OK = 0
+EXIT_COMMAND_FAILED = 1
+EXIT_USAGE = 2
+
+
+def split_commands(script):
+    """
+    Splits a script into commands at newlines and at semicolons outside of quotes,
+    dropping blank lines and # comments.
+    """
+    commands, current, quote = [], [], None
+    for char in script:
+        if quote is not None:
+            quote = None if char == quote else quote
+        elif char in '"\'':
+            quote = char
+        elif char in ';\n':
+            commands.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    commands.append(''.join(current))
+
+    return [command.strip() for command in commands if command.strip() and not command.strip().startswith('#')]
+
+
+def run_batch(clanvas, commands, keep_going=False):
+    """
+    Runs commands one after another in the same session, so caches and prefetched data are shared between them.
+    :param keep_going: run the remaining commands after one fails instead of stopping.
+    :return: the exit status, the highest status of any command run (EXIT_OK, EXIT_COMMAND_FAILED or EXIT_USAGE).
+    """
+    status = EXIT_OK
+    default_to_shell, clanvas.default_to_shell = clanvas.default_to_shell, False  # unknown commands fail
+    try:
+        for command in commands:
+            clanvas.command_status = EXIT_OK
+            stop = clanvas.onecmd_plus_hooks(command)
+            status = max(status, clanvas.command_status)
+
+            stats = clanvas.stats.last
+            if stats is not None:
+                get_outputter().poutput_debug(
+                    f'{command}: {stats.total_elapsed():.3f}s, '
+                    f'{sum(endpoint.requests for endpoint in stats.endpoints.values())} requests '
+                    f'({stats.network_time():.3f}s), exit status {clanvas.command_status}')
+
+            if stop or (clanvas.command_status != EXIT_OK and not keep_going):
+                break
+    finally:
+        clanvas.default_to_shell = default_to_shell
+
+    return status
@@ -0,0 +1,419 @@
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .offline import CONNECTION_ERRORS, NotAvailableOfflineException
+from .prefetch import mark_background_thread
+
+
+def make_key(args, kwargs):
+    return json.dumps([args, sorted(kwargs.items())])
+
+
+def approximate_size(value, seen=None):
+    """
+    Estimates the memory held by a cached value, following containers and object
+    attributes but skipping private attributes (such as the shared canvasapi requester).
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(k, seen) + approximate_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item, seen) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += approximate_size({k: v for k, v in vars(value).items() if not k.startswith('_')}, seen)
+    return size
+
+
+class Cache:
+    """
+    Thread-safe memo table for one function of one Clanvas instance.
+
+    Entries older than ttl are still returned, but trigger a background refresh. Entries that have been in
+    memory longer than max_age are dropped and fetched again on the next call, and at most maxsize entries
+    are kept, evicting the least recently used. Concurrent calls for the same key share a single fetch.
+    If a disk_cache is given, fetched values are also persisted there and used to seed later sessions.
+    If a refresher is given, background refreshes call it with the stale value followed by the arguments
+    instead of the loader, so that it can fetch only what changed. Since a refresher cannot see deletions,
+    the loader is still used once the last full load of an entry is older than max_age (or unknown).
+    If a streamer is given, stream offers the elements of a missing entry as the streamer yields them, storing
+    them (sorted by order, if given) once all have arrived.
+
+    While the given OfflineMode is active, the last fetched value is returned regardless of its age.
+    A fetch that cannot connect switches it on, if there is a value to fall back to.
+    """
+
+    def __init__(self, name, loader, maxsize=None, max_age=None, ttl=None, disk_cache=None, offline=None,
+                 refresher=None, streamer=None, order=None):
+        self.name = name
+        self.loader = loader
+        self.refresher = refresher
+        self.streamer = streamer
+        self.order = order
+        self.maxsize = maxsize
+        self.max_age = max_age.total_seconds() if max_age is not None else None
+        self.ttl = ttl.total_seconds() if ttl is not None else None
+        self.disk_cache = disk_cache
+        self.offline = offline
+
+        self.entries = OrderedDict()  # key -> (value, fetched_at, loaded_at)
+        self.full_loads = {}  # key -> time of the last fetch through the loader
+        self.lock = threading.Lock()
+        self.key_locks = {}  # key -> [lock, number of threads using it]
+        self.refreshing = set()
+        self.listeners = []
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.refreshes = 0
+
+    def __call__(self, *args, **kwargs):
+        key = make_key(args, kwargs)
+
+        if self.offline is not None and self.offline.active:
+            return self._snapshot(key)
+
+        found, value = self._lookup(key, args, kwargs)
+        if found:
+            return value
+
+        with self._key_lock(key):
+            found, value = self._lookup(key, args, kwargs, count_miss=True)
+            if found:
+                return value
+
+            if self.disk_cache is not None:
+                entry = self.disk_cache.get(self.name, key)
+                if entry is not None:
+                    value, fetched_at = entry
+                    self._store(key, value, fetched_at)
+                    self._refresh_if_stale(key, fetched_at, args, kwargs)
+                    return value
+
+            return self._fetch(key, args, kwargs)
+
+    def stream(self, *args, **kwargs):
+        """
+        Like calling the cache, except that on a miss the elements are yielded as the streamer produces them
+        (page by page, unsorted) instead of once all of them have been fetched.
+        :return: an iterable of the elements of the value for the arguments.
+        """
+        key = make_key(args, kwargs)
+        if self.streamer is None or (self.offline is not None and self.offline.active):
+            return self(*args, **kwargs)
+
+        found, value = self._lookup(key, args, kwargs)
+        if found:
+            return value
+        if self.disk_cache is not None and self.disk_cache.get(self.name, key) is not None:
+            return self(*args, **kwargs)  # served from disk, nothing to wait for
+        return self._stream(key, args, kwargs)
+
+    def peek(self, *args, **kwargs):
+        """
+        :return: the cached value for the arguments without fetching or touching statistics, or None.
+        """
+        with self.lock:
+            entry = self.entries.get(make_key(args, kwargs))
+        return entry[0] if entry is not None else None
+
+    def refresh(self, *args, **kwargs):
+        """
+        Fetches the entry for the arguments now, through the refresher if there is a value in memory.
+        :return: a (previous, current) tuple of values, previous being None if there was none.
+        """
+        key = make_key(args, kwargs)
+        with self._key_lock(key):
+            with self.lock:
+                entry = self.entries.get(key)
+            previous = entry[0] if entry is not None else None
+            return previous, self._fetch(key, args, kwargs, previous=previous)
+
+    def invalidate(self, *args, **kwargs):
+        """
+        Drops the entry for the given arguments from memory and disk, or every entry if no arguments are given.
+        """
+        if not args and not kwargs:
+            self.clear()
+            return
+
+        key = make_key(args, kwargs)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.full_loads.pop(key, None)
+        if self.disk_cache is not None:
+            self.disk_cache.delete(self.name, key)
+            self.disk_cache.delete(self.full_load_resource, key)
+        self._notify(key, None)
+
+    def clear(self):
+        with self.lock:
+            keys = list(self.entries)
+            self.entries.clear()
+            self.full_loads.clear()
+        if self.disk_cache is not None:
+            self.disk_cache.delete(self.name)
+            self.disk_cache.delete(self.full_load_resource)
+        for key in keys:
+            self._notify(key, None)
+
+    def add_listener(self, listener):
+        """
+        :param listener: called with (key, value) whenever an entry is stored, or (key, None) when one is dropped.
+        """
+        self.listeners.append(listener)
+
+    def stats(self):
+        with self.lock:
+            values = [entry[0] for entry in self.entries.values()]
+            hits, misses = self.hits, self.misses
+            evictions, expirations, refreshes = self.evictions, self.expirations, self.refreshes
+
+        lookups = hits + misses
+        return {'name': self.name, 'entries': len(values), 'maxsize': self.maxsize,
+                'hits': hits, 'misses': misses, 'hit_rate': hits / lookups if lookups else None,
+                'evictions': evictions, 'expirations': expirations, 'refreshes': refreshes,
+                'memory': approximate_size(values)}
+
+    @property
+    def full_load_resource(self):
+        return self.name + '.full_load'
+
+    def _full_load_due(self, key):
+        """
+        :return: whether the next fetch of key must use the loader rather than the refresher.
+        """
+        if self.refresher is None or self.max_age is None:
+            return False
+        with self.lock:
+            full_load = self.full_loads.get(key)
+        if full_load is None and self.disk_cache is not None:
+            entry = self.disk_cache.get(self.full_load_resource, key)
+            if entry is not None:
+                full_load = entry[1]
+                with self.lock:
+                    self.full_loads[key] = full_load
+        return full_load is None or time.time() - full_load > self.max_age
+
+    def _lookup(self, key, args, kwargs, count_miss=False):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.max_age is not None and now - entry[2] > self.max_age:
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                if count_miss:
+                    self.misses += 1
+                return False, None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+        self._refresh_if_stale(key, entry[1], args, kwargs)
+        return True, entry[0]
+
+    def _store(self, key, value, fetched_at):
+        with self.lock:
+            self.entries[key] = (value, fetched_at, time.time())
+            self.entries.move_to_end(key)
+            evicted = []
+            while self.maxsize is not None and len(self.entries) > self.maxsize:
+                evicted.append(self.entries.popitem(last=False)[0])
+                self.evictions += 1
+
+        self._notify(key, value)
+        for evicted_key in evicted:
+            self._notify(evicted_key, None)
+
+    def _snapshot(self, key, error=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+
+        if entry is None and self.disk_cache is not None:
+            entry = self.disk_cache.get(self.name, key)
+            if entry is not None:
+                self._store(key, *entry)
+
+        if entry is None:
+            raise NotAvailableOfflineException(f'Not available offline, no saved copy of {self.name}') from error
+
+        self.offline.served(entry[1])
+        return entry[0]
+
+    def _fetch(self, key, args, kwargs, previous=None):
+        try:
+            full_load = previous is None or self.refresher is None or self._full_load_due(key)
+            if full_load:
+                value = self.loader(*args, **kwargs)
+            else:
+                value = self.refresher(previous, *args, **kwargs)
+        except CONNECTION_ERRORS as e:
+            if self.offline is None:
+                raise
+            self.offline.connection_failed()
+            return self._snapshot(key, error=e)
+
+        if self.offline is not None:
+            self.offline.connection_succeeded()
+        self._loaded(key, value, full_load)
+        return value
+
+    def _loaded(self, key, value, full_load):
+        """
+        Stores a freshly fetched value in memory and on disk.
+        :param full_load: whether the value was fetched in full rather than through the refresher.
+        """
+        now = time.time()
+        self._store(key, value, now)
+        if full_load:
+            with self.lock:
+                self.full_loads[key] = now
+        if self.disk_cache is not None:
+            self.disk_cache.put(self.name, key, value)
+            if full_load and self.refresher is not None:
+                self.disk_cache.put(self.full_load_resource, key, True)
+
+    def _stream(self, key, args, kwargs):
+        with self._key_lock(key):
+            found, value = self._lookup(key, args, kwargs, count_miss=True)
+            if found:
+                yield from value  # fetched by another thread while this one waited
+                return
+
+            elements = []
+            try:
+                for element in self.streamer(*args, **kwargs):
+                    elements.append(element)
+                    yield element
+            except CONNECTION_ERRORS as e:
+                if self.offline is None:
+                    raise
+                self.offline.connection_failed()
+                if elements:
+                    raise
+                yield from self._snapshot(key, error=e)
+                return
+
+            if self.offline is not None:
+                self.offline.connection_succeeded()
+            self._loaded(key, sorted(elements, key=self.order) if self.order is not None else elements, True)
+
+    def _refresh_if_stale(self, key, fetched_at, args, kwargs):
+        stale = self.ttl is not None and time.time() - fetched_at > self.ttl
+        if not stale and not self._full_load_due(key):
+            return
+        if self.offline is not None and self.offline.active:
+            return
+
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+            self.refreshes += 1
+
+        def refresh():
+            mark_background_thread()
+            try:
+                with self._key_lock(key):
+                    with self.lock:
+                        entry = self.entries.get(key)
+                    self._fetch(key, args, kwargs, previous=entry[0] if entry is not None else None)
+            except Exception:
+                pass  # keep serving the stale copy, the next stale hit will try again
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    @contextmanager
+    def _key_lock(self, key):
+        with self.lock:
+            entry = self.key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.key_locks[key]
+
+    def _notify(self, key, value):
+        for listener in self.listeners:
+            listener(key, value)
+
+
+class cached:
+    """
+    Decorator for Clanvas methods which gives each instance its own Cache for the method,
+    registered in the instance's _caches dict. Accessing the method on an instance returns
+    the Cache, which is called like the method and also offers invalidate, peek and stats.
+    :param maxsize: maximum number of entries, least recently used are evicted first.
+    :param max_age: timedelta after which an entry is dropped from memory.
+    :param ttl: timedelta after which an entry is refreshed in the background.
+
+    :param order: key function the streamed elements are sorted by before they are stored.
+
+    A method of the same name decorated with @<method>.refresher becomes the Cache's refresher,
+    and one decorated with @<method>.streamer its streamer.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, maxsize=None, max_age=None, ttl=None, order=None):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.ttl = ttl
+        self.order = order
+        self.refresh_func = None
+        self.stream_func = None
+
+    def __call__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+        return self
+
+    def refresher(self, func):
+        self.refresh_func = func
+        return self
+
+    def streamer(self, func):
+        self.stream_func = func
+        return self
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        with cached._lock:
+            caches = instance.__dict__.setdefault('_caches', OrderedDict())
+            name = self.func.__name__
+            if name not in caches:
+                loader = self.func.__get__(instance, owner)
+                caches[name] = Cache(name, loader, maxsize=self.maxsize, max_age=self.max_age, ttl=self.ttl,
+                                     disk_cache=getattr(instance, 'disk_cache', None),
+                                     offline=getattr(instance, 'offline_mode', None),
+                                     refresher=self.refresh_func.__get__(instance, owner)
+                                     if self.refresh_func is not None else None,
+                                     streamer=self.stream_func.__get__(instance, owner)
+                                     if self.stream_func is not None else None,
+                                     order=self.order)
+            return caches[name]
@@ -1,7 +1,15 @@
+import functools
+import json
 import os
 import readline
+import shutil
+import subprocess
 import sys
+import time
 import webbrowser
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import takewhile
 from functools import partialmethod
 from getpass import getpass
 from os import makedirs
@@ -11,21 +19,32 @@ from urllib.parse import urlparse
 import cmd2
 import colorama
 from canvasapi import Canvas
-from cmd2 import Cmd
+from cmd2 import Cmd, plugin
 
-from .completion import apply_completers
+from .batch import EXIT_OK, EXIT_COMMAND_FAILED, EXIT_USAGE, run_batch, split_commands
+from .cache import cached
+from .completion import CompletionIndex, apply_completers
 from .config import InvalidClanvasConfigurationException, parse_clanvas_config_file
+from .diskcache import DiskCache
 from .filesynchronizer import pull_all_files
 from .interfaces import *
 from .lister import *
-from .outputter import Verbosity, bind_outputter
+from .offline import CONNECTION_ERRORS, NotAvailableOfflineException, OfflineMode, queued_files
+from .outputter import OutputFormat, Verbosity, bind_outputter
+from .pagination import fetch_all, iterate_pages
+from .transport import TRANSPORT_DEFAULTS, configure_requester
+from .prefetch import PrefetchScheduler, INTERACTIVE, CURRENT_COURSE, BACKGROUND
+from .rendering import RenderCache
+from .stats import StatsRecorder
+from .uploader import expand_file_patterns, submit_files
 from .utils import *
+from .watcher import Watcher
 
 
 class Clanvas(cmd2.Cmd):
     CLANVAS_CATEGORY = 'Clanvas'
 
-    def __init__(self, base_url, access_token, *args, **kwargs):
+    def __init__(self, base_url, access_token, *args, cache_file=None, transport=None, **kwargs):
         super(Clanvas, self).__init__(*args, **kwargs)
 
         self.default_to_shell = True
@@ -33,58 +52,268 @@ class Clanvas(cmd2.Cmd):
 
         self.settable.update({'prompt_format': 'prompt format string'})
         self.settable.update({'verbosity': 'default command verbosity (NORMAL/VERBOSE/DEBUG)'})
+        self.settable.update({'output_format': 'output format of listings (TEXT/JSONL)'})
+        self.settable.update({'paging': 'page listings longer than the screen'})
+        self.settable.update({'completion_budget': 'seconds tab completion waits for data that is not cached'})
+        self.settable.update({'offline': 'answer from saved data and queue uploads instead of using the network'})
         self.settable.pop('prompt')
 
         self.url = base_url
         self.host = urlparse(base_url).netloc
         self.canvas = Canvas(base_url, access_token)  # type: Canvas
+        session = configure_requester(self.canvas._Canvas__requester, **(transport or {}))
+        self.stats = StatsRecorder()
+        self.stats.instrument(session)
+        self._caches = OrderedDict()
+        self.disk_cache = DiskCache(cache_file, self.host, access_token, self.canvas._Canvas__requester)\
+            if cache_file is not None else None
+        self.offline_mode = OfflineMode(self.disk_cache)
+
+        self.rendered_topics = RenderCache(self.disk_cache)
 
         self.home = os.path.expanduser("~")
 
         self.current_course = None  # type: Course
+        self.command_status = EXIT_OK
+
+        self.completion_index = CompletionIndex(self)
+        self.prefetcher = PrefetchScheduler(workers=2)
+        self.register_postloop_hook(self.stop_prefetching)
+        self.register_precmd_hook(self.start_command_stats)
+        self.register_cmdfinalization_hook(self.finish_command_stats)
+        self.register_precmd_hook(self.start_command_offline)
+        self.register_cmdfinalization_hook(self.report_offline)
 
-        bind_outputter(functools.partial(self.poutput, end=''), self.get_verbosity)
+        bind_outputter(functools.partial(self.poutput, end=''), self.get_verbosity, self.get_output_format,
+                       self.open_pager)
 
         apply_completers(self)
 
     def get_caches(self):
+        """
+        :return: the Cache objects of this instance's cached methods by method name, once first used.
+        """
         return self._caches
 
-    @blocking_lru
+    def command_failed(self, status=EXIT_COMMAND_FAILED):
+        """
+        Records that the running command failed, which batch mode turns into the exit status.
+        """
+        self.command_status = max(self.command_status, status)
+
+    def perror(self, err, *args, **kwargs):
+        self.command_failed()
+        super(Clanvas, self).perror(err, *args, **kwargs)
+
+    def cache_counts(self):
+        all_stats = [cache.stats() for cache in list(self._caches.values())]
+        return sum(stats['hits'] for stats in all_stats), sum(stats['misses'] for stats in all_stats)
+
+    def start_command_stats(self, data: plugin.PrecommandData) -> plugin.PrecommandData:
+        if data.statement.command != 'stats':
+            self.stats.start_command(data.statement.command, self.cache_counts())
+        return data
+
+    def finish_command_stats(self, data: plugin.CommandFinalizationData) -> plugin.CommandFinalizationData:
+        if self.stats.current is not None:
+            self.stats.finish_command(self.cache_counts())
+        return data
+
+    def start_command_offline(self, data: plugin.PrecommandData) -> plugin.PrecommandData:
+        self.offline_mode.start_command()
+        return data
+
+    def report_offline(self, data: plugin.CommandFinalizationData) -> plugin.CommandFinalizationData:
+        """
+        Tells the user how old the saved data answering the command was, and about automatic switches.
+        """
+        fetched_at = self.offline_mode.finish_command()
+        switched = self.offline_mode.take_switch()
+        if switched == 'offline':
+            self.pfeedback(f'offline: could not connect to {self.host}, answering from saved data')
+        elif switched == 'online':
+            self.pfeedback(f'offline: {self.host} is reachable again, back online')
+            if self.offline_mode.outbox:
+                self.pfeedback(f'offline: {len(self.offline_mode.outbox)} queued submissions, send them with outbox -s')
+        if fetched_at is not None:
+            self.pfeedback(f'offline: saved data from {human_age(time.time() - fetched_at)}')
+        return data
+
+    def onecmd(self, statement):
+        try:
+            return super(Clanvas, self).onecmd(statement)
+        except NotAvailableOfflineException as e:
+            self.command_failed()
+            get_outputter().poutput(e.message)
+            return False
+        except UsageError:
+            self.command_failed(EXIT_USAGE)
+            return False
+
+    def default(self, statement):
+        if not self.default_to_shell:
+            self.command_failed()
+        return super(Clanvas, self).default(statement)
+
+    def complete(self, text, state):
+        if state != 0:
+            return super(Clanvas, self).complete(text, state)
+
+        start = time.perf_counter()
+        try:
+            return super(Clanvas, self).complete(text, state)
+        finally:
+            self.stats.record_completion(time.perf_counter() - start)
+
+    def prefetch_session(self):
+        """
+        Warms the login data first, then the assignments, announcements and tabs of current term courses.
+        """
+        self.prefetcher.submit(self.current_user_profile, priority=INTERACTIVE)
+        self.prefetcher.submit(self.get_courses, priority=INTERACTIVE)
+        self.prefetcher.submit(self.prefetch_term_courses, priority=BACKGROUND)
+
+    def stop_prefetching(self) -> None:
+        self.prefetcher.shutdown()
+
+    def prefetch_term_courses(self):
+        for course in filter_latest_term_courses(list(self.get_courses().values())):
+            self.prefetch_course(course, priority=BACKGROUND)
+
+    def prefetch_course(self, course, priority=CURRENT_COURSE):
+        for course_cache in [self.list_assignments_cached, self.list_announcements_cached, self.list_tabs_cached]:
+            if course_cache.peek(course.id) is None:
+                self.prefetcher.submit(course_cache, course.id, priority=priority)
+
+    @cached(maxsize=1, ttl=timedelta(hours=12))
     def get_courses(self, **kwargs):
         return {course.id: course for course in sorted(
-            self.canvas.get_current_user().get_courses(include=['term', 'total_scores']),
+            fetch_all(self.canvas.get_current_user().get_courses(include=['term', 'total_scores'])),
             key=lambda course: (-course.enrollment_term_id if hasattr(course, 'enrollment_term_id') else 0,
                                 course.name if hasattr(course, 'name') else ''))}
 
-    @blocking_lru
+    @cached(maxsize=1, ttl=timedelta(days=7))
     def current_user_profile(self, **kwargs):
         return self.canvas.get_current_user().get_profile()
 
-    @blocking_lru
+    @cached(maxsize=64, ttl=timedelta(days=1))
     def list_tabs_cached(self, course_id):
         course = self.get_courses()[course_id]
-        return sorted(course.get_tabs(), key=lambda tab: tab.position)
+        return sorted(fetch_all(course.get_tabs()), key=lambda tab: tab.position)
 
-    @blocking_lru
+    @cached(maxsize=32, max_age=timedelta(days=1), ttl=timedelta(minutes=10), order=lambda t: t.posted_at_date)
     def list_announcements_cached(self, course_id):
         course = self.get_courses()[course_id]
-        return sorted(course.get_discussion_topics(only_announcements=True), key=lambda t: t.posted_at_date)
+        return sorted(fetch_all(course.get_discussion_topics(only_announcements=True)), key=lambda t: t.posted_at_date)
 
-    @blocking_lru
+    @list_announcements_cached.streamer
+    def list_announcements_cached(self, course_id):
+        course = self.get_courses()[course_id]
+        return iterate_pages(course.get_discussion_topics(only_announcements=True))
+
+    @list_announcements_cached.refresher
+    def list_announcements_cached(self, previous, course_id):
+        """
+        Fetches the announcements by most recent activity only until reaching the latest activity already known.
+        """
+        since = max(map(last_activity, previous), default=None)
+        if since is None:
+            return self.list_announcements_cached.loader(course_id)
+
+        course = self.get_courses()[course_id]
+        updates = takewhile(lambda topic: last_activity(topic) >= since,
+                            course.get_discussion_topics(only_announcements=True, order_by='recent_activity'))
+        return merge_updates(previous, updates, key=lambda t: t.posted_at_date)
+
+    @cached(maxsize=32, max_age=timedelta(days=1), ttl=timedelta(hours=1), order=lambda t: t.created_at_date)
     def list_assignments_cached(self, course_id):
         course = self.get_courses()[course_id]
-        return sorted(course.get_assignments(), key=lambda t: t.created_at_date)
+        return sorted(fetch_all(course.get_assignments()), key=lambda t: t.created_at_date)
+
+    @list_assignments_cached.streamer
+    def list_assignments_cached(self, course_id):
+        return iterate_pages(self.get_courses()[course_id].get_assignments())
+
+    @cached(maxsize=32, max_age=timedelta(days=1), ttl=timedelta(minutes=10))
+    def list_submissions_cached(self, course_id):
+        return course_submissions(self.get_courses()[course_id])
+
+    @list_submissions_cached.refresher
+    def list_submissions_cached(self, previous, course_id):
+        """
+        Fetches only the submissions submitted or graded since the latest such time already known.
+        """
+        since = max((at for submission in previous for at in
+                     [getattr(submission, 'submitted_at', None), getattr(submission, 'graded_at', None)] if at),
+                    default=None)
+        if since is None:
+            return self.list_submissions_cached.loader(course_id)
+
+        course = self.get_courses()[course_id]
+        updates = fetch_all(course.get_multiple_submissions(submitted_since=since)) + \
+            fetch_all(course.get_multiple_submissions(graded_since=since))
+        return merge_updates(previous, updates)
+
+    @cached(maxsize=32, max_age=timedelta(days=1), ttl=timedelta(hours=1))
+    def list_assignment_groups_cached(self, course_id):
+        return course_assignment_groups(self.get_courses()[course_id])
+
+    def grade_providers(self):
+        return {'submissions_provider': self.list_submissions_cached,
+                'groups_provider': self.list_assignment_groups_cached}
 
     def get_verbosity(self) -> Verbosity:
         return Verbosity[self.verbosity]
 
+    def get_output_format(self) -> OutputFormat:
+        return OutputFormat[self.output_format.upper()]
+
+    @contextmanager
+    def open_pager(self, printfn, num_lines):
+        """
+        Provides a function that writes to the pager when paging is set, the output is not redirected,
+        and num_lines already fill the terminal, or printfn otherwise.
+        """
+        interactive = self.stdin.isatty() and self.stdout.isatty() and \
+            (sys.platform.startswith('win') or os.environ.get('TERM') is not None)
+        if not self.paging or not interactive or self.redirecting or num_lines < shutil.get_terminal_size().lines:
+            yield printfn
+            return
+
+        with self.sigint_protection:
+            pager = subprocess.Popen(self.pager, shell=True, stdin=subprocess.PIPE, universal_newlines=True)
+
+        def write(text):
+            try:
+                pager.stdin.write(text)
+            except BrokenPipeError:
+                pass  # the pager was quit early, drop the rest
+
+        try:
+            yield write
+        finally:
+            try:
+                pager.stdin.close()
+            except BrokenPipeError:
+                pass
+            with self.sigint_protection:
+                pager.wait()
+
     prompt_format = (Fore.LIGHTGREEN_EX + '{login_id}@{host}' + Style.RESET_ALL + ':'
                      + Fore.LIGHTYELLOW_EX + '{pwc}' + Style.RESET_ALL + ':' + Fore.LIGHTBLUE_EX
                      + '{pwd} ' + Style.RESET_ALL + '$ ').replace('\x1b', "\\x1b")
 
     verbosity = 'NORMAL'
 
+    output_format = 'TEXT'
+
+    paging = False
+
+    completion_budget = 0.25
+
+    offline = property(lambda self: self.offline_mode.enabled,
+                       lambda self, enabled: self.offline_mode.set_enabled(enabled))
+
     canvas_path = expanduser('~/canvas')
 
     # cmd2 attribute that determines the prompt format
@@ -94,12 +323,18 @@ class Clanvas(cmd2.Cmd):
         if self.canvas is None:
             return '$ '
 
-        return self.prompt_format.replace('\\x1b', '\x1b').format(
-            login_id=self.current_user_profile()['login_id'],
+        try:
+            login_id = self.current_user_profile()['login_id']
+        except NotAvailableOfflineException:
+            login_id = '?'
+
+        prompt = self.prompt_format.replace('\\x1b', '\x1b').format(
+            login_id=login_id,
             host=self.host,
             pwc=self.current_course.course_code if self.current_course is not None else '~',
             pwd=os.getcwd().replace(self.home, '~')
         )
+        return '(offline) ' + prompt if self.offline_mode.active else prompt
 
     @cmd2.with_argparser(cd_parser)
     def do_cd(self, opts):
@@ -126,8 +361,12 @@ class Clanvas(cmd2.Cmd):
             return False
 
         match = get_course_by_query(self, opts.course)
-        if match is not None:
-            self.current_course = match
+        if match is None:
+            self.command_failed()
+            return False
+
+        self.current_course = match
+        self.prefetch_course(match)
 
     @cmd2.with_category(CLANVAS_CATEGORY)
     @cmd2.with_argparser(lc_parser)
@@ -138,42 +377,156 @@ class Clanvas(cmd2.Cmd):
     @cmd2.with_argparser(la_parser)
     @argparser_course_required_wrapper
     def do_la(self, course, opts):
-        return list_assignments(course, self.list_assignments_cached, long=opts.long,
-                                submissions=opts.submissions, upcoming=opts.upcoming)
+        return list_assignments(course, self.list_assignments_cached.stream, long=opts.long,
+                                submissions=opts.submissions, upcoming=opts.upcoming,
+                                submissions_provider=self.list_submissions_cached)
 
     @cmd2.with_category(CLANVAS_CATEGORY)
     @cmd2.with_argparser(lg_parser)
+    def do_lg(self, opts):
+        if opts.all:
+            if not list_all_grades(filter_latest_term_courses(list(self.get_courses().values())),
+                                   self.list_assignments_cached, long=opts.long,
+                                   hide_ungraded=opts.hide_ungraded, expand=opts.expand, **self.grade_providers()):
+                self.command_failed()
+            return False
+        return self.list_course_grades(opts)
+
     @argparser_course_required_wrapper
-    def do_lg(self, course, opts):
-        return list_grades(course, long=opts.long, hide_ungraded=opts.hide_ungraded)
+    def list_course_grades(self, course, opts):
+        if not list_grades(course, self.list_assignments_cached, long=opts.long, hide_ungraded=opts.hide_ungraded,
+                           **self.grade_providers()):
+            self.command_failed()
+        return False
 
     @cmd2.with_category(CLANVAS_CATEGORY)
     @cmd2.with_argparser(lann_parser)
     @argparser_course_required_wrapper
     def do_lann(self, course: Course, opts):
-        return list_announcements(self.list_announcements_cached(course.id), number=opts.number,
-                                  days=opts.days, print=opts.print)
+        # a listing that is not cached yet is printed as its pages arrive, unless it must be complete first
+        announcements = self.list_announcements_cached if opts.number is not None or opts.print \
+            else self.list_announcements_cached.stream
+        return list_announcements(announcements(course.id), number=opts.number,
+                                  days=opts.days, print=opts.print, render=self.rendered_topics)
 
     @cmd2.with_category(CLANVAS_CATEGORY)
     @cmd2.with_argparser(catann_parser)
     @argparser_course_required_wrapper
     def do_catann(self, course: Course, opts):
-        return list_announcement(course, opts.ids)
+        if not list_announcement(course, opts.ids, render=self.rendered_topics,
+                                 fetch=functools.partial(self.get_announcement, course)):
+            self.command_failed()
+        return False
+
+    def get_announcement(self, course, announcement_id):
+        """
+        Fetches an announcement of the course, or while offline looks it up in the saved announcement listing.
+        """
+        if not self.offline_mode.active:
+            try:
+                return course.get_discussion_topic(announcement_id)
+            except CONNECTION_ERRORS:
+                self.offline_mode.connection_failed()
+
+        topics = self.list_announcements_cached(course.id)
+        topic = next((topic for topic in topics if topic.id == announcement_id), None)
+        if topic is None:
+            raise ResourceDoesNotExist('Not Found')
+        return topic
 
     @cmd2.with_category(CLANVAS_CATEGORY)
     @cmd2.with_argparser(ua_parser)
     @argparser_course_required_wrapper
     def do_ua(self, course: Course, opts):
+        files, unmatched = expand_file_patterns(opts.files)
+        if unmatched:
+            self.command_failed()
+            for pattern in unmatched:
+                get_outputter().poutput(f'ua: no such file: {pattern}')
+            return
+
+        if not self.offline_mode.active:
+            try:
+                self.upload_submission(course, opts.id, files, jobs=opts.jobs)
+                return
+            except CONNECTION_ERRORS:
+                self.offline_mode.connection_failed()
+        self.queue_submission(course, opts.id, files)
+
+    def upload_submission(self, course: Course, assignment_id, files, jobs=4):
+        """
+        :return: whether the submission was made, False if the assignment does not exist or an upload failed.
+        """
         try:
-            assignment: Assignment = course.get_assignment(opts.id)
-            get_outputter().poutput(f'Uploading submission for "{assignment.name}"')
-            assignment.submit({'submission_type': 'online_upload'}, opts.file)
-            get_outputter().poutput(f'Uploaded {opts.file}')
-            get_outputter().poutput(f'To {assignment.html_url}')
-
+            assignment: Assignment = course.get_assignment(assignment_id)
         except ResourceDoesNotExist as e:
+            self.command_failed()
             get_outputter().poutput('Invalid assignment ID.')
-            get_outputter().poutput_debug(f'Course {course.id} has no assignment {opts.id}')
+            get_outputter().poutput_debug(f'Course {course.id} has no assignment {assignment_id}')
+            return False
+
+        get_outputter().poutput(f'Uploading submission for "{assignment.name}"')
+        submission = submit_files(assignment, files, jobs=jobs)
+        self.offline_mode.connection_succeeded()
+        if submission is None:
+            self.command_failed()
+            return False
+
+        self.list_assignments_cached.invalidate(course.id)
+        self.list_submissions_cached.invalidate(course.id)
+        get_outputter().poutput(f'Submitted {", ".join(files)}')
+        get_outputter().poutput(f'To {assignment.html_url}')
+        return True
+
+    def queue_submission(self, course: Course, assignment_id, files):
+        try:
+            assignment = next((a for a in self.list_assignments_cached(course.id) if a.id == assignment_id), None)
+            if assignment is None:
+                self.command_failed()
+                get_outputter().poutput('Invalid assignment ID.')
+                return
+            name = assignment.name
+        except NotAvailableOfflineException:
+            name = None  # cannot check the id without the saved assignments, the upload will
+
+        self.offline_mode.queue({'course_id': course.id, 'course': unique_course_code(course),
+                                 'assignment_id': assignment_id, 'assignment': name,
+                                 'files': [os.path.abspath(file) for file in files]})
+        get_outputter().poutput(f'Offline, queued {", ".join(files)} for "{name or assignment_id}"')
+        get_outputter().poutput_verbose('Send it with outbox -s once back online.')
+
+    @cmd2.with_category(CLANVAS_CATEGORY)
+    @cmd2.with_argparser(outbox_parser)
+    def do_outbox(self, opts):
+        if opts.clear:
+            self.offline_mode.clear_outbox()
+            return False
+
+        outbox = list(self.offline_mode.outbox)
+        if not opts.send:
+            list_outbox(outbox)
+            return False
+
+        if self.offline_mode.active and not self.offline_mode.automatic:
+            get_outputter().poutput('outbox: cannot send while offline, use set offline false first')
+            return False
+
+        for item in outbox:
+            try:
+                course = self.get_courses().get(item['course_id'])
+                if course is None:
+                    get_outputter().poutput(f'outbox: no course {item["course"]}, '
+                                            f'dropping {", ".join(queued_files(item))}')
+                elif not all(isfile(file) for file in queued_files(item)):
+                    get_outputter().poutput(f'outbox: missing files, dropping {", ".join(queued_files(item))}')
+                else:
+                    self.upload_submission(course, item['assignment_id'], queued_files(item))
+            except CONNECTION_ERRORS:
+                self.command_failed()
+                get_outputter().poutput(f'outbox: could not connect to {self.host}, '
+                                        f'{len(self.offline_mode.outbox)} submissions still queued')
+                return False
+            self.offline_mode.remove(item)
 
     @cmd2.with_category(CLANVAS_CATEGORY)
     @cmd2.with_argparser(wopen_parser)
@@ -185,6 +538,7 @@ class Clanvas(cmd2.Cmd):
         matched_tabs = list(filter(lambda course_tab: course_tab.label.lower() in given_tabs_set, course_tabs))
 
         if len(matched_tabs) == 0:
+            self.command_failed()
             for tab in opts.tabs:
                 get_outputter().poutput(f'No tab found matching "{tab}"')
             return False
@@ -192,10 +546,48 @@ class Clanvas(cmd2.Cmd):
         for tab in matched_tabs:
             webbrowser.open(tab.full_url, new=2)
 
+    @cmd2.with_category(CLANVAS_CATEGORY)
+    @cmd2.with_argparser(watch_parser)
+    def do_watch(self, opts):
+        if self.offline_mode.active and not self.offline_mode.automatic:
+            get_outputter().poutput('watch: cannot watch while offline, use set offline false first')
+            return False
+
+        if opts.course is not None:
+            course = get_course_by_query(self, opts.course)
+            if course is None:
+                self.command_failed()
+                return False
+            courses = [course]
+        else:
+            courses = list(filter_latest_term_courses(list(self.get_courses().values())))
+
+        watcher = Watcher(self, courses, interval=opts.interval, max_interval=opts.max_interval)
+        watcher.snapshot()
+        get_outputter().poutput_verbose(f'Watching {len(courses)} courses, press Ctrl-C to stop.')
+
+        polls = 0
+        try:
+            while opts.count is None or polls < opts.count:
+                if polls > 0:
+                    time.sleep(watcher.next_interval)
+                polls += 1
+                try:
+                    list_notifications(watcher.poll())
+                except CONNECTION_ERRORS:
+                    self.offline_mode.connection_failed()
+                    watcher.back_off()
+                    get_outputter().poutput_verbose(f'watch: could not connect to {self.host}')
+                except CanvasException as e:
+                    watcher.back_off()
+                    get_outputter().poutput_verbose(f'watch: {e}')
+        except KeyboardInterrupt:
+            pass
+
     @cmd2.with_category(CLANVAS_CATEGORY)
     @cmd2.with_argparser(whoami_parser)
     def do_whoami(self, opts):
-        profile = self.canvas.get_current_user().get_profile()
+        profile = self.current_user_profile()
 
         if not opts.verbose:
             get_outputter().poutput(profile['name'] + ' (' + profile['login_id'] + ')')
@@ -203,6 +595,41 @@ class Clanvas(cmd2.Cmd):
             verbose_fields = ['name', 'short_name', 'login_id', 'primary_email', 'id', 'time_zone']
             get_outputter().poutput('\n'.join([field + ': ' + str(profile[field]) for field in verbose_fields]))
 
+    @cmd2.with_category(CLANVAS_CATEGORY)
+    @cmd2.with_argparser(cache_parser)
+    def do_cache(self, opts):
+        caches = self.get_caches()
+
+        if opts.clear is not None:
+            for name in opts.clear or list(caches):
+                if name in caches:
+                    caches[name].clear()
+                    get_outputter().poutput_verbose(f'Cleared {name}')
+                else:
+                    get_outputter().poutput(f'cache: no cache named {name}')
+            return False
+
+        list_caches(caches.values())
+
+    @cmd2.with_category(CLANVAS_CATEGORY)
+    @cmd2.with_argparser(stats_parser)
+    def do_stats(self, opts):
+        stats = self.stats.session if opts.session else self.stats.last
+        if stats is None:
+            get_outputter().poutput('stats: no command has been run yet')
+            return False
+
+        if opts.json:
+            report = stats.to_dict()
+            if opts.session:
+                report['background'] = self.stats.background.to_dict()
+            get_outputter().poutput(json.dumps(report, indent=2))
+        else:
+            list_command_stats(stats)
+            if opts.session and self.stats.background.endpoints:
+                get_outputter().poutput('')
+                list_command_stats(self.stats.background)
+
     @cmd2.with_category(CLANVAS_CATEGORY)
     @cmd2.with_argparser(pullf_parser)
     @argparser_course_required_wrapper
@@ -211,7 +638,9 @@ class Clanvas(cmd2.Cmd):
         destination_path = join(
             *[os.path.expanduser('~'), 'canvas', 'courses', code, 'files']) if opts.output is None else opts.output
 
-        pull_all_files(destination_path, course)
+        if not pull_all_files(destination_path, course, jobs=max(1, opts.jobs), delete=opts.delete,
+                              dry_run=opts.dry_run):
+            self.command_failed()
 
 
 def is_valid_url(possible_url):
@@ -220,6 +649,8 @@ def is_valid_url(possible_url):
 
 
 def get_login_entry(destination):
+    transport = {}
+
     if is_valid_url(destination):
         url = destination
         history_filename = urlparse(url).netloc
@@ -238,22 +669,24 @@ def get_login_entry(destination):
             url = entry["url"]
             history_filename = destination
             token = entry["token"]
+            transport = {key: value for key, value in entry.items() if key in TRANSPORT_DEFAULTS}
         else:
             print(f'No entry for name "{destination}" in clanvas config')
             sys.exit(1)
 
-    return url, token, history_filename
+    return url, token, history_filename, transport
 
 
 def login(destination):
-    url, token, history_filename = get_login_entry(destination)
+    url, token, history_filename, transport = get_login_entry(destination)
 
     history_dir = join(clanvas_dir(), 'history')
     makedirs(history_dir, exist_ok=True)
 
     history_file = join(history_dir, history_filename)
-    clanvas = Clanvas(url, token, persistent_history_file=history_file, persistent_history_length=5000)
-    call_eagerly(clanvas.get_courses, clanvas.current_user_profile)
+    clanvas = Clanvas(url, token, persistent_history_file=history_file, persistent_history_length=5000,
+                      cache_file=join(clanvas_dir(), 'cache.sqlite'), transport=transport)
+    clanvas.prefetch_session()
     return clanvas
 
 
@@ -272,10 +705,26 @@ def main():
 
     parser = argparse.ArgumentParser()
     parser.add_argument('destination', help='Canvas URL or the hostname of entry from Clanvas config')
+    parser.add_argument('-c', '--command', action='append', default=[],
+                        help='run these ;-separated commands and exit instead of starting the shell')
+    parser.add_argument('-f', '--file', type=argparse.FileType('r'),
+                        help='run the commands in this script file (- for standard input) and exit')
+    parser.add_argument('-k', '--keep-going', action='store_true',
+                        help='in batch mode, run the remaining commands after one fails')
     args = parser.parse_args()
 
+    commands = [command for script in args.command for command in split_commands(script)]
+    if args.file is not None:
+        with args.file:
+            commands += split_commands(args.file.read())
+
     clanvas = login(args.destination)
-    clanvas.cmdloop()
+    if args.command or args.file is not None:
+        status = run_batch(clanvas, commands, keep_going=args.keep_going)
+        clanvas.stop_prefetching()
+        sys.exit(status)
+    else:
+        clanvas.cmdloop()
 
 
 if __name__ == "__main__":
@@ -1,23 +1,35 @@
 import io
 import os
 import shlex
+import threading
+import time
 from contextlib import redirect_stderr
-from functools import partial, wraps
+from functools import partial, wraps, lru_cache
 
 from cmd2.argparse_completer import CompletionItem
 
-from .interfaces import course_query_or_cc, course_option_parser, course_actions, \
+from .cache import make_key
+from .interfaces import course_option_parser, course_actions, \
     catann_parser_ids_action, wopen_parser_tabs_action, pullf_parser_output_action, ua_parser_id_action, \
-    ua_parser_file_action, cd_parser_directory_action
-from .utils import unique_course_code, filter_courses
+    ua_parser_file_action, cd_parser_directory_action, UsageError
+from .prefetch import INTERACTIVE
+from .prefixindex import PrefixIndex
+from .utils import unique_course_code
 
 
+@lru_cache(maxsize=64)
 def parse_partial(argparser, line):
+    """
+    Parses a partially typed command line, memoized since every TAB press on the same line parses it again.
+    The returned namespace is shared between calls and must not be modified.
+    """
     try:
         stream = io.StringIO()
         with redirect_stderr(stream):
             opts, _ = argparser.parse_known_args(shlex.split(line)[1:])
             return opts
+    except UsageError:
+        return None
     except ValueError as e:
         if str(e) == 'No closing quotation':
             return parse_partial(argparser, line + ('"' if line.rfind('"') > line.rfind("'") else "'"))
@@ -31,25 +43,31 @@ def parse_partial(argparser, line):
 def course_required_completer(completer_function):
     @wraps(completer_function)
     def call_with_course(text, line, begidx, endidx, clanvas):
+        deadline = completion_deadline(clanvas)
         opts = parse_partial(course_option_parser, line)
         if opts is None:
             return []
 
-        course = course_query_or_cc(clanvas, opts.course, fail_on_ambiguous=True, quiet=True)
+        if opts.course is None:
+            course = clanvas.current_course
+        else:
+            matches = clanvas.completion_index.search('get_courses', opts.course.replace(' ', ''), deadline=deadline)
+            course = matches[0][1] if len(matches) == 1 else None
         if course is None:
             return []
 
-        return completer_function(text, line, begidx, endidx, course, clanvas)
+        return completer_function(text, line, begidx, endidx, course, clanvas, deadline)
 
     return call_with_course
 
 
-def _course_completer(text, line, begidx, endidx, clanvas):
-    courses = filter_courses(clanvas.get_courses().values(), query=line[begidx:endidx])
+def completion_deadline(clanvas):
+    return time.monotonic() + clanvas.completion_budget
 
-    def completion_item(course):
-        return CompletionItem(unique_course_code(course), course.name if hasattr(course, 'name') else '')
-    return [completion_item(course) for course in courses]
+
+def _course_completer(text, line, begidx, endidx, clanvas):
+    return [item for item, _ in clanvas.completion_index.search('get_courses', line[begidx:endidx].replace(' ', ''),
+                                                                deadline=completion_deadline(clanvas))]
 
 
 def apply_completers(clanvas):
@@ -72,30 +90,91 @@ def apply_completers(clanvas):
         course_complete_action.desc_header = 'Name'
 
 
-# TODO: radix tree for more CPU efficiency at the cost of memory efficiency?
-
-def startswith_completer(input, iterable, case_sensitive=False):
-    return list(filter(lambda item: (item if case_sensitive else item.lower())
-                       .startswith((input if case_sensitive else input.lower())), iterable))
+def course_index(courses):
+    return PrefixIndex(((unique_course_code(course),
+                         (CompletionItem(unique_course_code(course), course.name if hasattr(course, 'name') else ''),
+                          course))
+                        for course in courses.values()), substrings=True)
+
+
+def assignment_index(assignments):
+    return PrefixIndex((str(assignment.id), CompletionItem(str(assignment.id), assignment.name
+                                                           if hasattr(assignment, 'name') else ''))
+                       for assignment in assignments)
+
+
+def announcement_index(announcements):
+    return PrefixIndex((str(ann.id), CompletionItem(str(ann.id), ann.title if hasattr(ann, 'title') else ''))
+                       for ann in announcements)
+
+
+def tab_index(tabs):
+    return PrefixIndex((tab.label, tab.label) for tab in tabs)
+
+
+class CompletionIndex:
+    """
+    Prefix indexes over the cached course, assignment, announcement and tab listings, kept in step with
+    the caches through listeners: built whenever a listing is stored and dropped when it is invalidated.
+    """
+
+    builders = {
+        'get_courses': course_index,
+        'list_assignments_cached': assignment_index,
+        'list_announcements_cached': announcement_index,
+        'list_tabs_cached': tab_index,
+    }
+
+    def __init__(self, clanvas):
+        self.clanvas = clanvas
+        self.indexes = {}  # (cache name, cache key) -> PrefixIndex
+        self.updated = threading.Condition()
+        for name in self.builders:
+            getattr(clanvas, name).add_listener(partial(self.update, name))
+
+    def update(self, name, key, value):
+        index = self.builders[name](value) if value is not None else None
+        with self.updated:
+            if index is None:
+                self.indexes.pop((name, key), None)
+            else:
+                self.indexes[(name, key)] = index
+            self.updated.notify_all()
+
+    def search(self, name, prefix, *args, deadline=None):
+        """
+        Searches the index of the listing that getattr(clanvas, name)(*args) returns.
+        For courses the values are (CompletionItem, course) pairs and prefix may match anywhere in the course code.
+        :param deadline: time.monotonic() value to give up at. If the listing is not cached it is fetched by the
+        prefetcher and searched once it arrives, or nothing is found if the deadline passes first, so that the
+        next search finds it. Without a deadline the listing is fetched on the calling thread.
+        """
+        key = (name, make_key(args, {}))
+        index = self.indexes.get(key)
+        if index is None and deadline is None:
+            getattr(self.clanvas, name)(*args)
+            index = self.indexes.get(key)
+        elif index is None:
+            self.clanvas.prefetcher.submit(getattr(self.clanvas, name), *args, priority=INTERACTIVE)
+            with self.updated:
+                self.updated.wait_for(lambda: key in self.indexes, timeout=max(0, deadline - time.monotonic()))
+                index = self.indexes.get(key)
+        return index.search(prefix) if index is not None else ()
 
 
 @course_required_completer
-def _assignment_completer(text, line, begidx, endidx, course, clanvas):
-    def completion_item(assignment):
-        return CompletionItem(str(assignment.id), assignment.name if hasattr(assignment, 'name') else '')
-    return startswith_completer(line[begidx:endidx],
-                                [completion_item(assignment) for assignment in clanvas.list_assignments_cached(course.id)])
+def _assignment_completer(text, line, begidx, endidx, course, clanvas, deadline):
+    return list(clanvas.completion_index.search('list_assignments_cached', line[begidx:endidx], course.id,
+                                                deadline=deadline))
 
 
 @course_required_completer
-def _catann_tab_completer(text, line, begidx, endidx, course, clanvas):
-    def completion_item(announcement):
-        return CompletionItem(str(announcement.id), announcement.title if hasattr(announcement, 'title') else '')
-    return startswith_completer(line[begidx:endidx],
-                                [completion_item(ann) for ann in clanvas.list_announcements_cached(course.id)])
+def _catann_tab_completer(text, line, begidx, endidx, course, clanvas, deadline):
+    return list(clanvas.completion_index.search('list_announcements_cached', line[begidx:endidx], course.id,
+                                                deadline=deadline))
 
 
 @course_required_completer
-def _wopen_tab_completer(text, line, begidx, endidx, course, clanvas):
-    return startswith_completer(line[begidx:endidx],
-                                [tab.label for tab in clanvas.list_tabs_cached(course.id)])
+def _wopen_tab_completer(text, line, begidx, endidx, course, clanvas, deadline):
+    return list(clanvas.completion_index.search('list_tabs_cached', line[begidx:endidx], course.id,
+                                                deadline=deadline))
@@ -1,6 +1,8 @@
 from itertools import groupby
 from urllib.parse import urlparse
 
+from .transport import TRANSPORT_DEFAULTS
+
 
 class InvalidClanvasConfigurationException(Exception):
     message: str
@@ -9,7 +11,7 @@ class InvalidClanvasConfigurationException(Exception):
         self.message = message
 
 
-VALID_KEYS = {'default', 'url', 'token'}
+VALID_KEYS = {'default', 'url', 'token'} | set(TRANSPORT_DEFAULTS)
 
 REQUIRED_KEYS = {'url', 'token'}
 
@@ -39,6 +41,15 @@ def parse_group(group_items):
     if url_components.scheme == '':
         raise InvalidClanvasConfigurationException(f'Host "{name}" has invalid URL. No URL scheme provided.')
 
+    # Transport settings take the type of their default value
+    for key, default in TRANSPORT_DEFAULTS.items():
+        if key in mappings:
+            try:
+                mappings[key] = type(default)(mappings[key])
+            except ValueError:
+                raise InvalidClanvasConfigurationException(f'Host "{name}" has invalid value "{mappings[key]}" '
+                                                           f'for "{key}". Should be a {type(default).__name__}.')
+
     return name, mappings
 
 
@@ -0,0 +1,95 @@
+import hashlib
+import importlib
+import json
+import sqlite3
+import time
+from contextlib import closing
+from os import makedirs
+from os.path import dirname
+
+from canvasapi.canvas_object import CanvasObject
+
+
+def encode(value):
+    """
+    Converts a cached value (canvasapi objects, dicts, lists and plain JSON values)
+    into a JSON-serializable structure that can be turned back into the same value with decode.
+    """
+    if isinstance(value, CanvasObject):
+        cls = type(value)
+        return {'__canvas__': f'{cls.__module__}.{cls.__name__}', 'attributes': value.attributes}
+    elif isinstance(value, dict):
+        return {'__dict__': [[encode(k), encode(v)] for k, v in value.items()]}
+    elif isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    else:
+        return value
+
+
+def decode(data, requester):
+    if isinstance(data, dict):
+        if '__canvas__' in data:
+            module_name, _, class_name = data['__canvas__'].rpartition('.')
+            if not module_name.startswith('canvasapi.'):
+                raise ValueError(f'Refusing to decode non-canvasapi class {data["__canvas__"]}')
+            cls = getattr(importlib.import_module(module_name), class_name)
+            return cls(requester, data['attributes'])
+        elif '__dict__' in data:
+            return {decode(k, requester): decode(v, requester) for k, v in data['__dict__']}
+        else:
+            return data
+    elif isinstance(data, list):
+        return [decode(item, requester) for item in data]
+    else:
+        return data
+
+
+class DiskCache:
+    """
+    SQLite backed store for Canvas API results, scoped per host and access token
+    so that several accounts can share the same cache file.
+    """
+
+    def __init__(self, filename, host, access_token, requester):
+        self.filename = filename
+        self.scope = host + ':' + hashlib.sha256(access_token.encode()).hexdigest()[:16]
+        self.requester = requester
+
+        makedirs(dirname(filename), exist_ok=True)
+        with self._connect() as db, db:
+            db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                       'scope TEXT, resource TEXT, key TEXT, stored_at REAL, payload TEXT, '
+                       'PRIMARY KEY (scope, resource, key))')
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.filename, timeout=10))
+
+    def get(self, resource, key):
+        """
+        :return: a (value, stored_at) tuple, or None if nothing is stored for the resource and key.
+        """
+        with self._connect() as db:
+            row = db.execute('SELECT payload, stored_at FROM entries WHERE scope = ? AND resource = ? AND key = ?',
+                             (self.scope, resource, key)).fetchone()
+        if row is None:
+            return None
+
+        try:
+            return decode(json.loads(row[0]), self.requester), row[1]
+        except (ValueError, TypeError, AttributeError, ImportError):
+            self.delete(resource, key)
+            return None
+
+    def put(self, resource, key, value):
+        payload = json.dumps(encode(value))
+        with self._connect() as db, db:
+            db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                       (self.scope, resource, key, time.time(), payload))
+
+    def delete(self, resource, key=None):
+        with self._connect() as db, db:
+            if key is None:
+                db.execute('DELETE FROM entries WHERE scope = ? AND resource = ?', (self.scope, resource))
+            else:
+                db.execute('DELETE FROM entries WHERE scope = ? AND resource = ? AND key = ?',
+                           (self.scope, resource, key))
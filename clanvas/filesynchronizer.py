@@ -1,16 +1,34 @@
+import hashlib
+import json
 import os
 import pathlib
-from os.path import join
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from os.path import join, dirname, exists, normpath
 from typing import TypeVar, Generic, Sequence
 
 from canvasapi.exceptions import Unauthorized
 from canvasapi.file import File
 from canvasapi.folder import Folder
 
+from .pagination import fetch_all
+from .prefetch import inherit_background
 from .utils import *
 
 T = TypeVar('T')
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+MANIFEST_FILENAME = '.clanvas-manifest.json'
+
+
+class IncompleteDownloadException(Exception):
+    message: str
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
 
 class FileTree(Generic[T]):
     def __init__(self, path: str, folders: 'Sequence[FileTree[T]]', files: Sequence[T]):
@@ -19,38 +37,362 @@ class FileTree(Generic[T]):
         self.files: Sequence[T] = files
 
 
-def build_canvas_file_tree(base, folder: Folder) -> FileTree[File]:
-    folders = list(map(lambda subfolder: build_canvas_file_tree(join(base, subfolder.name), subfolder), folder.get_folders()))
-    files = list(folder.get_files())
-    return FileTree(base, folders, files)
+def build_canvas_file_tree(folders: Sequence[Folder], files: Sequence[File]) -> FileTree[File]:
+    """
+    Assembles a FileTree from flat listings of every folder and file in a course,
+    linking them through parent_folder_id and folder_id.
+    """
+    subfolders = defaultdict(list)
+    for folder in folders:
+        subfolders[folder.parent_folder_id].append(folder)
+
+    folder_files = defaultdict(list)
+    for file in files:
+        folder_files[file.folder_id].append(file)
+
+    def subtree(base, folder):
+        return FileTree(base, [subtree(join(base, sub.name), sub) for sub in subfolders[folder.id]],
+                        folder_files[folder.id])
+
+    return subtree('.', next(folder for folder in folders if folder.parent_folder_id is None))
+
+
+def traverse_canvas_file_tree(root: Folder, executor) -> FileTree[File]:
+    """
+    Builds a FileTree by listing folders level by level, requesting
+    the contents of every folder in a level concurrently.
+    """
+    tree = FileTree('.', [], [])
+    level = [(tree, root)]
+    fetch = inherit_background(fetch_all)
+
+    while level:
+        listings = [(subtree, executor.submit(fetch, folder.get_folders()), executor.submit(fetch, folder.get_files()))
+                    for subtree, folder in level]
+        level = []
+        for subtree, folders_future, files_future in listings:
+            subfolders = folders_future.result()
+            subtree.files = files_future.result()
+            subtree.folders = [FileTree(join(subtree.path, subfolder.name), [], []) for subfolder in subfolders]
+            level.extend(zip(subtree.folders, subfolders))
+
+    return tree
+
+
+def discover_canvas_file_tree(course: Course, jobs=4) -> FileTree[File]:
+    """
+    Lists all of a course's folders and files in bulk (two paginated requests made concurrently). If
+    the bulk listing is not allowed, falls back to listing the course folder by folder.
+    """
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        folders_future = executor.submit(inherit_background(fetch_all), course.get_folders())
+        files_future = executor.submit(inherit_background(fetch_all), course.get_files())
+        try:
+            return build_canvas_file_tree(folders_future.result(), files_future.result())
+        except Unauthorized:
+            get_outputter().poutput_debug('Bulk file listing unauthorized, listing folder by folder.')
+
+        response = course._requester.request('GET', f'courses/{course.id}/folders/root')
+        return traverse_canvas_file_tree(Folder(course._requester, response.json()), executor)
 
 
 def length_file_tree(folder: FileTree) -> int:
     return sum(map(length_file_tree, folder.folders)) + len(folder.files)
 
 
-def pull_file_tree(directory, tree):
-    pathlib.Path(join(directory, tree.path)).mkdir(parents=True, exist_ok=True)
+def canvas_mtime(file):
+    return unix_time_seconds(file.modified_at_date.replace(tzinfo=pytz.utc))
+
 
+def remote_files(tree):
+    """
+    Yields (path relative to the sync directory, file) for every file in the tree.
+    """
     for file in tree.files:
-        file_path = join(join(directory, tree.path), file.filename)
+        yield normpath(join(tree.path, file.filename)), file
 
-        canvas_mtime = unix_time_seconds(file.modified_at_date.replace(tzinfo=pytz.utc))
+    for subtree in tree.folders:
+        yield from remote_files(subtree)
 
-        if not os.path.exists(file_path) or canvas_mtime > os.stat(file_path).st_mtime:
-            file.download(file_path)
-            atime = os.stat(file_path).st_atime
-            os.utime(file_path, (atime, canvas_mtime))
 
+def make_tree_directories(directory, tree):
+    pathlib.Path(join(directory, tree.path)).mkdir(parents=True, exist_ok=True)
     for subtree in tree.folders:
-        pull_file_tree(directory, subtree)
+        make_tree_directories(directory, subtree)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(directory):
+    """
+    Reads the manifest recording every file synced into directory, keyed by Canvas file id.
+    Each entry holds the local path, local size and mtime, the Canvas modification time and a sha256 hash.
+    """
+    try:
+        with open(join(directory, MANIFEST_FILENAME), 'r') as f:
+            return {int(file_id): entry for file_id, entry in json.load(f)['files'].items()}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def save_manifest(directory, manifest):
+    manifest_path = join(directory, MANIFEST_FILENAME)
+    with open(manifest_path + '.part', 'w') as f:
+        json.dump({'version': 1, 'files': {str(file_id): entry for file_id, entry in manifest.items()}},
+                  f, indent=1, sort_keys=True)
+    os.replace(manifest_path + '.part', manifest_path)
+
+
+def manifest_entry(directory, path, file, sha256=None):
+    stat = os.stat(join(directory, path))
+    return {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'modified_at': canvas_mtime(file),
+            'sha256': sha256 if sha256 is not None else file_sha256(join(directory, path))}
+
+
+def locally_modified(directory, entry):
+    """
+    Checks whether a synced file changed on disk. Only hashes the file if its size or mtime moved.
+    """
+    stat = os.stat(join(directory, entry['path']))
+    if stat.st_size == entry['size'] and stat.st_mtime == entry['mtime']:
+        return False
+    return file_sha256(join(directory, entry['path'])) != entry['sha256']
+
+
+class SyncPlan:
+    def __init__(self):
+        self.downloads = []  # (path, file) to fetch from Canvas
+        self.moves = []  # (old path, new path, file) renamed or moved on Canvas
+        self.adopted = []  # (path, file) already up to date locally but missing from the manifest
+        self.deletions = []  # (file id, path) no longer on Canvas
+        self.conflicts = []  # paths changed both locally and on Canvas
+        self.local_changes = []  # paths changed only locally
+
+
+def plan_sync(directory, tree, manifest) -> SyncPlan:
+    """
+    Diffs the remote file tree against the manifest in a single pass. Unchanged
+    files cost one stat call and are otherwise left untouched.
+    """
+    plan = SyncPlan()
+    remote_ids = set()
+
+    for path, file in remote_files(tree):
+        remote_ids.add(file.id)
+        entry = manifest.get(file.id)
+
+        if entry is None:
+            local_path = join(directory, path)
+            if exists(local_path) and canvas_mtime(file) <= os.stat(local_path).st_mtime:
+                plan.adopted.append((path, file))
+            else:
+                plan.downloads.append((path, file))
+        elif not exists(join(directory, entry['path'])):
+            plan.downloads.append((path, file))
+        else:
+            remote_changed = entry['modified_at'] != canvas_mtime(file)
+
+            if locally_modified(directory, entry):
+                (plan.conflicts if remote_changed else plan.local_changes).append(entry['path'])
+                continue
+
+            if entry['path'] != path:
+                if exists(join(directory, path)):
+                    plan.conflicts.append(path)
+                    continue
+                plan.moves.append((entry['path'], path, file))
+
+            if remote_changed:
+                plan.downloads.append((path, file))
+
+    plan.deletions = [(file_id, entry['path']) for file_id, entry in manifest.items() if file_id not in remote_ids]
+
+    return plan
+
+
+def load_partial_version(partial_path):
+    try:
+        with open(partial_path + '.json') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_partial_version(partial_path, version):
+    with open(partial_path + '.json', 'w') as f:
+        json.dump(version, f)
+
+
+def remove_partial(partial_path):
+    for path in [partial_path, partial_path + '.json']:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def download_file(file, file_path, canvas_mtime):
+    """
+    Streams a file into file_path + '.part', resuming from an earlier partial download with a
+    Range request if there is one. Only once the size matches what Canvas reports is the
+    file stamped with the Canvas mtime and moved into place.
+
+    The size and mtime of the file being downloaded are saved next to the partial file (with the
+    response's ETag or Last-Modified, sent back as If-Range), and a partial file of another version
+    of the file is discarded instead of being resumed.
+    :return: the size of the downloaded file in bytes.
+    """
+    partial_path = file_path + '.part'
+    expected_size = getattr(file, 'size', None)
+    version = {'size': expected_size, 'mtime': canvas_mtime}
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+
+    saved = load_partial_version(partial_path) if offset > 0 else None
+    if offset > 0 and (saved is None or saved.get('size') != expected_size or saved.get('mtime') != canvas_mtime
+                       or (expected_size is not None and offset > expected_size)):
+        remove_partial(partial_path)
+        offset, saved = 0, None
+
+    if expected_size is None or offset < expected_size:
+        headers = {'Authorization': f'Bearer {file._requester.access_token}'}
+        if offset > 0:
+            headers['Range'] = f'bytes={offset}-'
+            if saved.get('validator'):
+                headers['If-Range'] = saved['validator']
+
+        session = file._requester._session
+        response = session.get(file.url, headers=headers, stream=True)
+        if response.status_code == 416:
+            # the partial file does not line up with the remote one, start over
+            response.close()
+            headers.pop('Range', None)
+            headers.pop('If-Range', None)
+            response = session.get(file.url, headers=headers, stream=True)
+
+        with response:
+            response.raise_for_status()
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            save_partial_version(partial_path, dict(version, validator=response.headers.get('ETag') or
+                                                    response.headers.get('Last-Modified')))
+            with open(partial_path, mode) as file_out:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    file_out.write(chunk)
+
+    size = os.path.getsize(partial_path)
+    if expected_size is not None and size != expected_size:
+        if size > expected_size:
+            remove_partial(partial_path)
+        raise IncompleteDownloadException(f'received {size} of {expected_size} bytes')
+
+    atime = os.stat(partial_path).st_atime
+    os.utime(partial_path, (atime, canvas_mtime))
+    os.replace(partial_path, file_path)
+    remove_partial(partial_path)
+    return size
+
+
+def download_and_hash(directory, path, file):
+    download_file(file, join(directory, path), canvas_mtime(file))
+    return manifest_entry(directory, path, file)
+
+
+def download_files(directory, downloads, manifest, jobs):
+    start = time.perf_counter()
+    total_bytes = 0
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(inherit_background(download_and_hash), directory, path, file): (path, file)
+                   for path, file in downloads}
+
+        for count, future in enumerate(as_completed(futures), 1):
+            path, file = futures[future]
+            try:
+                entry = future.result()
+                manifest[file.id] = entry
+                total_bytes += entry['size']
+                get_outputter().poutput_verbose(f'[{count}/{len(downloads)}] {path} ({human_size(entry["size"])})')
+            except Exception as e:
+                errors.append((path, e))
+
+    elapsed = time.perf_counter() - start
+    downloaded = len(downloads) - len(errors)
+    get_outputter().poutput(f'Downloaded {downloaded} file{"" if downloaded == 1 else "s"} '
+                            f'({human_size(total_bytes)}) in {elapsed:.1f}s, '
+                            f'{human_size(total_bytes / elapsed if elapsed > 0 else 0)}/s')
+
+    for path, e in sorted(errors, key=lambda error: error[0]):
+        get_outputter().poutput(f'Failed to download {path}: {e}')
+
+    return not errors
+
+
+def pull_file_tree(directory, tree, jobs=4, delete=False, dry_run=False):
+    """
+    Brings directory in line with the Canvas file tree, using the manifest stored in
+    directory to apply moves and skip unchanged files.
+    :param delete: remove local copies of files deleted on Canvas, unless they were changed locally.
+    :param dry_run: only report what would be done.
+    :return: True if every download succeeded.
+    """
+    manifest = load_manifest(directory)
+    plan = plan_sync(directory, tree, manifest)
+
+    for path in sorted(plan.conflicts):
+        get_outputter().poutput(f'Conflict: {path} changed locally and on Canvas, keeping local copy')
+    for path in sorted(plan.local_changes):
+        get_outputter().poutput_verbose(f'Locally modified: {path}')
+
+    if dry_run:
+        for old_path, new_path, _ in plan.moves:
+            get_outputter().poutput(f'Would move {old_path} -> {new_path}')
+        for path, _ in sorted(plan.downloads, key=lambda download: download[0]):
+            get_outputter().poutput(f'Would download {path}')
+        for _, path in sorted(plan.deletions, key=lambda deletion: deletion[1]):
+            get_outputter().poutput(f'Would {"delete" if delete else "keep"} {path} (deleted on Canvas)')
+        return True
+
+    make_tree_directories(directory, tree)
+
+    for old_path, new_path, file in plan.moves:
+        pathlib.Path(dirname(join(directory, new_path))).mkdir(parents=True, exist_ok=True)
+        os.replace(join(directory, old_path), join(directory, new_path))
+        manifest[file.id]['path'] = new_path
+        get_outputter().poutput(f'Moved {old_path} -> {new_path}')
+
+    for path, file in plan.adopted:
+        manifest[file.id] = manifest_entry(directory, path, file)
+
+    for file_id, path in sorted(plan.deletions, key=lambda deletion: deletion[1]):
+        if not exists(join(directory, path)):
+            del manifest[file_id]
+        elif delete and not locally_modified(directory, manifest[file_id]):
+            os.remove(join(directory, path))
+            del manifest[file_id]
+            get_outputter().poutput(f'Deleted {path}')
+        else:
+            get_outputter().poutput(f'Deleted on Canvas: {path}')
+
+    success = download_files(directory, plan.downloads, manifest, jobs) if plan.downloads else True
+    if not plan.downloads:
+        get_outputter().poutput_verbose('All files up to date.')
+
+    save_manifest(directory, manifest)
+    return success
 
 
-def pull_all_files(directory, course: Course):
-    top_level_folder = next(folder for folder in course.get_folders() if folder.parent_folder_id is None)
+def pull_all_files(directory, course: Course, jobs=4, delete=False, dry_run=False):
+    """
+    :return: True if the course's files could be listed and every download succeeded.
+    """
     try:
-        tree = build_canvas_file_tree('.', top_level_folder)
+        tree = discover_canvas_file_tree(course, jobs=jobs)
         get_outputter().poutput_verbose('Detected ' + str(length_file_tree(tree)) + ' files.')
-        pull_file_tree(directory, tree)
+        return pull_file_tree(directory, tree, jobs=jobs, delete=delete, dry_run=dry_run)
     except Unauthorized:
         get_outputter().poutput('Not authorized to access this course\'s files')
+        return False
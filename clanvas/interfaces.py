@@ -1,10 +1,29 @@
 import argparse
 import functools
+import sys
 
 from .outputter import get_outputter
 from .utils import get_course_by_query
 
 
+class UsageError(Exception):
+    """
+    Raised for invalid command arguments, after the usage message has been printed.
+    """
+
+
+class ArgumentParser(argparse.ArgumentParser):
+    """
+    ArgumentParser that raises UsageError instead of exiting, since cmd2 swallows SystemExit and the Clanvas
+    instance running the command needs to record the failure.
+    """
+
+    def error(self, message):
+        self.print_usage(sys.stderr)
+        sys.stderr.write(f'{self.prog}: error: {message}\n')
+        raise UsageError(message)
+
+
 def course_query_or_cc(clanvas, course, fail_on_ambiguous=False, quiet=False):
     if course is not None:
         return get_course_by_query(clanvas, course, fail_on_ambiguous=fail_on_ambiguous, quiet=quiet)
@@ -34,6 +53,7 @@ def argparser_course_required_wrapper(with_argparser):
     def inject_argparser(self, opts, *args, **kwargs):
         course = course_query_or_cc(self, opts.course)
         if course is None:
+            self.command_failed()
             get_outputter().poutput('Please specify a course to use this command.')
             get_outputter().poutput_verbose('Use the cc command or the -c option.')
             return False
@@ -46,61 +66,86 @@ def argparser_course_required_wrapper(with_argparser):
 
 DEFAULT = '__DEFAULT__'
 
-course_option_parser = argparse.ArgumentParser()
+course_option_parser = ArgumentParser()
 course_optional(course_option_parser)
 
-cc_parser = argparse.ArgumentParser()
+cc_parser = ArgumentParser()
 cc_parser_course_action = cc_parser.add_argument('course', nargs='?', default='',
                                                  help='course id or matching course string (e.g. the course code)')
 course_actions.append(cc_parser_course_action)
 
-cd_parser = argparse.ArgumentParser(description='Change the working directory.')
+cache_parser = ArgumentParser(description='Show cache statistics or clear cached Canvas data.')
+cache_parser.add_argument('--clear', nargs='*', metavar='NAME', default=None,
+                          help='clear the named caches, or all caches if none are named')
+
+cd_parser = ArgumentParser(description='Change the working directory.')
 cd_parser_directory_action = cd_parser.add_argument('directory', nargs='?', default='',
                        help='absolute or relative pathname of directory to become the new working directory')
 
-lc_parser = argparse.ArgumentParser(description='List courses.')
+stats_parser = ArgumentParser(description='Show request and timing statistics of the last command.')
+stats_parser.add_argument('-s', '--session', action='store_true', help='show totals for the whole session')
+stats_parser.add_argument('--json', action='store_true', help='print the statistics as JSON')
+
+lc_parser = ArgumentParser(description='List courses.')
 lc_parser.add_argument('-a', '--all', action='store_true', help='all courses (previous terms)')
 lc_parser.add_argument('-l', '--long', action='store_true', help='long listing')
 
-la_parser = argparse.ArgumentParser(description='List course assignments.')
+la_parser = ArgumentParser(description='List course assignments.')
 course_optional(la_parser)
 la_parser.add_argument('-l', '--long', action='store_true', help='long listing')
 la_parser.add_argument('-s', '--submissions', action='store_true', help='show submissions')
 la_parser.add_argument('-u', '--upcoming', action='store_true', help='show only upcoming assignments')
 
-lann_parser = argparse.ArgumentParser(description='List course announcements.')
+lann_parser = ArgumentParser(description='List course announcements.')
 course_optional(lann_parser)
 lann_parser.add_argument('-n', '--number', type=int, default=None, help='number of announcements to display')
 lann_parser.add_argument('-d', '--days', type=int, default=None, help='only show announcements this many days old')
 lann_parser.add_argument('-p', '--print', action='store_true', help='print out body of announcements in list')
 
-catann_parser = argparse.ArgumentParser(description='Print course announcements.')
+catann_parser = ArgumentParser(description='Print course announcements.')
 course_optional(catann_parser)
 catann_parser_ids_action = catann_parser.add_argument('ids', nargs='*', help='ids of announcements to print')
 
-lg_parser = argparse.ArgumentParser(description='List course grades.')
+lg_parser = ArgumentParser(description='List course grades.')
 course_optional(lg_parser)
 lg_parser.add_argument('-l', '--long', action='store_true', help='long listing')
 lg_parser.add_argument('-u', '--hide-ungraded', action='store_true', help='hide ungraded assignments')
+lg_parser.add_argument('-a', '--all', action='store_true', help='summarize grades for all current courses')
+lg_parser.add_argument('-e', '--expand', action='store_true', help='with --all, also list each course\'s grades')
 
-login_parser = argparse.ArgumentParser(description='Set URL and token to use for all Canvas API calls')
+login_parser = ArgumentParser(description='Set URL and token to use for all Canvas API calls')
 login_parser.add_argument('url', help='URL of Canvas server')
 login_parser.add_argument('token', help='Canvas API access token')
 login_parser.add_argument('-q', '--quiet', action='store_true', help='suppress login message')
 
-pullf_parser = argparse.ArgumentParser(description='Pull course files to local disk.')
+outbox_parser = ArgumentParser(description='List or send the submissions queued while offline.')
+outbox_parser.add_argument('-s', '--send', action='store_true', help='upload the queued submissions')
+outbox_parser.add_argument('--clear', action='store_true', help='drop the queued submissions without uploading')
+
+pullf_parser = ArgumentParser(description='Pull course files to local disk.')
 course_optional(pullf_parser)
 pullf_parser_output_action = pullf_parser.add_argument('-o', '--output', help='location to save course files')
+pullf_parser.add_argument('-j', '--jobs', type=int, default=4, help='number of files to download at once')
+pullf_parser.add_argument('--delete', action='store_true', help='delete local copies of files removed from Canvas')
+pullf_parser.add_argument('-n', '--dry-run', action='store_true', help='only show what would be changed')
 
-ua_parser = argparse.ArgumentParser(description='Upload a submission to an assignment')
+ua_parser = ArgumentParser(description='Upload a submission of one or more files to an assignment')
 course_optional(ua_parser)
 ua_parser_id_action = ua_parser.add_argument('id', type=int, help='id of assignment to upload a submission to')
-ua_parser_file_action = ua_parser.add_argument('file', default=None, help='file to submit')
+ua_parser_file_action = ua_parser.add_argument('files', nargs='+', help='files or glob patterns to submit')
+ua_parser.add_argument('-j', '--jobs', type=int, default=4, help='number of files to upload at once')
+
+watch_parser = ArgumentParser(description='Poll courses and report new announcements, grades and due date changes.')
+course_optional(watch_parser)
+watch_parser.add_argument('-i', '--interval', type=float, default=300, help='seconds between polls')
+watch_parser.add_argument('-m', '--max-interval', type=float, default=3600,
+                          help='seconds the interval may grow to while nothing changes')
+watch_parser.add_argument('-n', '--count', type=int, default=None, help='stop after this many polls')
 
-whoami_parser = argparse.ArgumentParser()
+whoami_parser = ArgumentParser()
 whoami_parser.add_argument('-v', '--verbose', action='store_true',
                            help='display more info about the logged in user')
 
-wopen_parser = argparse.ArgumentParser(description='Open tabs in canvas web interface.')
+wopen_parser = ArgumentParser(description='Open tabs in canvas web interface.')
 course_optional(wopen_parser)
 wopen_parser_tabs_action = wopen_parser.add_argument('tabs', nargs='*', default='', help='course tabs to open')
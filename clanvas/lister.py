@@ -1,34 +1,70 @@
-from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from operator import itemgetter
 
 from canvasapi.assignment import Assignment, AssignmentGroup
 from canvasapi.exceptions import Unauthorized, CanvasException, ResourceDoesNotExist
 from canvasapi.submission import Submission
 from colorama import Fore, Style, Back
-from html2text import html2text
 from tree_format import format_tree
 
+from .offline import queued_files
+from .pagination import fetch_all
+from .prefetch import inherit_background
+from .rendering import render_html
+from .stats import LATENCY_BUCKETS
 from .utils import *
 
 
 def calculate_group_ratio(group, assignment_submission_pairs):
-    # Memoize by sticking it in the group... maybe this is totally pointless though since arithmetic ops are cheap
-    if hasattr(group, 'clanvas_total_points'):
-        return group.clanvas_ratio, group.clanvas_total_points, group.clanvas_total_possible
-
+    """
+    :return: (ratio, total points, total points possible) of the graded assignments of a group. Not stored on the
+    group, which is shared through the assignment groups cache while the submissions change.
+    """
     total_points = sum([(s.score if s is not None else 0) for (a, s) in assignment_submission_pairs])
     total_possible = sum([(a.points_possible if s is not None else 0) for (a, s) in assignment_submission_pairs])
     ratio = total_points / total_possible if total_possible != 0 else None
-    group.clanvas_total_points = total_points
-    group.clanvas_total_possible = total_possible
-    group.clanvas_ratio = ratio
     return ratio, total_points, total_possible
 
 
+def course_record(course):
+    return {'type': 'course', 'id': course.id, 'code': unique_course_code(course),
+            'course_code': getattr(course, 'course_code', None), 'name': getattr(course, 'name', None),
+            'term': course.term['name'] if hasattr(course, 'term') else None}
+
+
+def assignment_record(assignment):
+    return {'type': 'assignment', 'id': assignment.id, 'course_id': getattr(assignment, 'course_id', None),
+            'name': assignment.name, 'due_at': getattr(assignment, 'due_at', None),
+            'points_possible': getattr(assignment, 'points_possible', None)}
+
+
+def submission_record(submission):
+    return {'type': 'submission', 'id': submission.id, 'assignment_id': submission.assignment_id,
+            'score': getattr(submission, 'score', None), 'grade': getattr(submission, 'grade', None),
+            'submitted_at': getattr(submission, 'submitted_at', None)}
+
+
+def announcement_record(topic, message=None):
+    record = {'type': 'announcement', 'id': topic.id, 'course_id': getattr(topic, 'course_id', None),
+              'posted_at': getattr(topic, 'posted_at', None), 'user_name': getattr(topic, 'user_name', None),
+              'title': topic.title}
+    if message is not None:
+        record['message'] = message
+    return record
+
+
+def render_messages(topics):
+    return [render_html(topic.message or '') for topic in topics]
+
+
 def list_courses(courses, all=False, long=False):
     display_courses = courses if all else filter_latest_term_courses(courses)
 
-    if display_courses:
+    if get_outputter().jsonl():
+        for course in display_courses:
+            get_outputter().precord(course_record(course))
+    elif display_courses:
         if long:
             def course_info_items(c):
                 return [c.course_code,
@@ -36,23 +72,47 @@ def list_courses(courses, all=False, long=False):
                         c.term['name'] if hasattr(c, 'term') else '',
                         c.name if hasattr(c, 'name') else '']
 
-            get_outputter().poutput(tabulate(map(course_info_items, display_courses), tablefmt='plain'))
+            get_outputter().ptable(map(course_info_items, display_courses))
         else:
             get_outputter().poutput('\n'.join([unique_course_code(c) for c in display_courses]))
     else:
         get_outputter().poutput('No courses available.')
 
 
-def list_assignments(course: Course, assignments_provider, long=False, submissions=False, upcoming=False):
+def course_submissions(course: Course):
+    return fetch_all(course.get_multiple_submissions())
+
+
+def course_assignment_groups(course: Course):
+    return list(course.get_assignment_groups())
+
+
+def list_assignments(course: Course, assignments_provider, long=False, submissions=False, upcoming=False,
+                     submissions_provider=None):
+    """
+    :param submissions_provider: function from a course id to the user's submissions, fetched directly if not given.
+    """
     assignments = assignments_provider(course.id)
+    submissions_provider = submissions_provider or (lambda course_id: course_submissions(course))
 
     if upcoming:
         assignments = filter_future_assignments(assignments)
 
-    if long:
+    if get_outputter().jsonl():
+        assignment_ids = set()
+        for assignment in assignments:
+            assignment_ids.add(assignment.id)
+            get_outputter().precord(assignment_record(assignment))
+        if submissions:
+            for submission in submissions_provider(course.id):
+                if submission.assignment_id in assignment_ids:
+                    get_outputter().precord(submission_record(submission))
+    elif long:
         if submissions:
-            assignment_ids = map(lambda assignment: assignment.id, assignments)
-            assignment_submissions = course.get_multiple_submissions(assignment_ids=assignment_ids)
+            assignments = list(assignments)
+            assignment_ids = {assignment.id for assignment in assignments}
+            assignment_submissions = [submission for submission in submissions_provider(course.id)
+                                      if submission.assignment_id in assignment_ids]
 
             submissions_by_assignment = defaultdict(list)
 
@@ -66,7 +126,7 @@ def list_assignments(course: Course, assignments_provider, long=False, submissio
 
             get_outputter().poutput(format_tree(tree, format_node=itemgetter(0), get_children=itemgetter(1)))
         else:
-            get_outputter().poutput(tabulate(map(assignment_info_items, assignments), tablefmt='plain'))
+            get_outputter().ptable(map(assignment_info_items, assignments))
     else:
         get_outputter().poutput('\n'.join([assignment.name for assignment in assignments]))
 
@@ -116,9 +176,23 @@ def tabulate_grade_row(assignment, submission, long):
         return [colored(string) for string in [assignment.name, fraction, percentage]]
 
 
-def grades_tree(course: Course):
-    assignment_submission_pair = course.get_assignments()
-    submissions_by_assignment = get_submissions_for_assignments(course, assignment_submission_pair)
+def grades_tree(course: Course, assignments_provider, submissions_provider=None, groups_provider=None):
+    """
+    Fetches assignments, the user's submissions and the assignment groups of a course concurrently
+    through the providers (functions from a course id, usually caches), and arranges them into a tree of groups.
+    Submissions and assignment groups are fetched directly if no provider is given for them.
+    """
+    submissions_provider = submissions_provider or (lambda course_id: course_submissions(course))
+    groups_provider = groups_provider or (lambda course_id: course_assignment_groups(course))
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        assignments_future = executor.submit(inherit_background(assignments_provider), course.id)
+        submissions_future = executor.submit(inherit_background(submissions_provider), course.id)
+        groups_future = executor.submit(inherit_background(groups_provider), course.id)
+
+        assignments = sorted(assignments_future.result(), key=lambda a: getattr(a, 'position', 0) or 0)
+        submissions_by_assignment = group_submissions_by_assignment(submissions_future.result())
+        assignment_groups = groups_future.result()
 
     def graded_submission(assignment):
         if assignment.id in submissions_by_assignment:
@@ -128,10 +202,9 @@ def grades_tree(course: Course):
                 return submission
         return None
 
-    graded_assignment_submissions = {assignment: graded_submission(assignment) for assignment in assignment_submission_pair}
+    graded_assignment_submissions = {assignment: graded_submission(assignment) for assignment in assignments}
 
     tree_items = []
-    assignment_groups = course.get_assignment_groups()
 
     grouped_assignment_submission_pairs = {}
     for assignment, submission in graded_assignment_submissions.items():
@@ -148,72 +221,173 @@ def grades_tree(course: Course):
     return course, tree_items
 
 
-def list_grades(course: Course, long=False, hide_ungraded=False):
-    try:
-        tree = grades_tree(course)
-
-        @lru_cache(maxsize=None)
-        def group_ratio(id):
-            pass
-
-        def format_node(node):
-            item = node[0]
-            if isinstance(item, Course):
-                course = item
-                groups_item = node[1]
-
-                course_name = course_name_or_unique_course_code(course)
-
-                def weighted_contribution(group, assignment_submission_pairs):
-                    ratio = calculate_group_ratio(group, assignment_submission_pairs)[0]
-                    return (group.group_weight/100) * ratio if ratio is not None else group.group_weight/100
-
-                weighted_sum = sum(weighted_contribution(group, assignments) for (group, assignments) in groups_item)
-                if weighted_sum > 0:
-                    percentage = percentage_string(weighted_sum, 1)
-                    color = best_color(weighted_sum) if weighted_sum > 0 else ''
-                    return color + course_name + ' ' + percentage + Style.RESET_ALL
-                else:
-                    return course_name
-            elif isinstance(item, AssignmentGroup):
-                group = item
-                assignment_submission_pairs = node[1]
-
-                ratio, total_points, total_possible = calculate_group_ratio(group, assignment_submission_pairs)
-
-                fraction = rstripped_fraction(total_points, total_possible)
-                if total_possible != 0:
-                    ratio = total_points / total_possible
-                    percentage = percentage_string(ratio, 1)
-                    color = best_color(ratio)
-                else:
-                    percentage = 'N/A'
-                    color = ''
-
-                if long:
-                    items = [group.name, f'(Weight={percentage_string(group.group_weight/100, 0)})', fraction, percentage]
-                else:
-                    items = [group.name, fraction, percentage]
-
-                return color + ' '.join(items) + Style.RESET_ALL
-            elif isinstance(item, Assignment):
-                assignment, submission = node
-                return ' '.join([str(x) for x in tabulate_grade_row(assignment, submission, long=long)])
-
-        def get_children(node):
-            if isinstance(node[1], Submission) or node[1] is None:
-                return []
+def weighted_contribution(group, assignment_submission_pairs):
+    ratio = calculate_group_ratio(group, assignment_submission_pairs)[0]
+    return (group.group_weight/100) * ratio if ratio is not None else group.group_weight/100
+
+
+def course_grade_ratio(groups_item):
+    return sum(weighted_contribution(group, assignments) for (group, assignments) in groups_item)
+
+
+def format_grades_tree(tree, long=False, hide_ungraded=False):
+    def format_node(node):
+        item = node[0]
+        if isinstance(item, Course):
+            course = item
+            groups_item = node[1]
+
+            course_name = course_name_or_unique_course_code(course)
+
+            weighted_sum = course_grade_ratio(groups_item)
+            if weighted_sum > 0:
+                percentage = percentage_string(weighted_sum, 1)
+                color = best_color(weighted_sum) if weighted_sum > 0 else ''
+                return color + course_name + ' ' + percentage + Style.RESET_ALL
+            else:
+                return course_name
+        elif isinstance(item, AssignmentGroup):
+            group = item
+            assignment_submission_pairs = node[1]
+
+            ratio, total_points, total_possible = calculate_group_ratio(group, assignment_submission_pairs)
+
+            fraction = rstripped_fraction(total_points, total_possible)
+            if total_possible != 0:
+                ratio = total_points / total_possible
+                percentage = percentage_string(ratio, 1)
+                color = best_color(ratio)
             else:
-                return list(filter(lambda item: not hide_ungraded or item[1] is not None, node[1]))
+                percentage = 'N/A'
+                color = ''
+
+            if long:
+                items = [group.name, f'(Weight={percentage_string(group.group_weight/100, 0)})', fraction, percentage]
+            else:
+                items = [group.name, fraction, percentage]
+
+            return color + ' '.join(items) + Style.RESET_ALL
+        elif isinstance(item, Assignment):
+            assignment, submission = node
+            return ' '.join([str(x) for x in tabulate_grade_row(assignment, submission, long=long)])
 
-        get_outputter().poutput(format_tree(tree, format_node=format_node, get_children=get_children), end='')
-    except Unauthorized:
-        get_outputter().poutput(f'{course_name_or_unique_course_code(course)}: Unauthorized')
+    def get_children(node):
+        if isinstance(node[1], Submission) or node[1] is None:
+            return []
+        else:
+            return list(filter(lambda item: not hide_ungraded or item[1] is not None, node[1]))
+
+    return format_tree(tree, format_node=format_node, get_children=get_children)
+
+
+def grade_records(tree, hide_ungraded=False):
+    """
+    Yields a course_grade record for a grades tree, followed by a grade record for each assignment.
+    """
+    course, groups_item = tree
+    yield {'type': 'course_grade', 'course_id': course.id, 'code': unique_course_code(course),
+           'name': getattr(course, 'name', None), 'grade': course_grade_ratio(groups_item)}
+
+    for group, assignment_submission_pairs in groups_item:
+        for assignment, submission in assignment_submission_pairs:
+            if hide_ungraded and submission is None:
+                continue
+            yield {'type': 'grade', 'course_id': course.id, 'group': group.name, 'group_weight': group.group_weight,
+                   'assignment_id': assignment.id, 'assignment': assignment.name,
+                   'points_possible': assignment.points_possible,
+                   'submission_id': submission.id if submission is not None else None,
+                   'score': submission.score if submission is not None else None}
+
+
+def grade_error_message(error):
+    return 'Unauthorized' if isinstance(error, Unauthorized) else str(error)
+
+
+def grade_error_record(course, error):
+    return {'type': 'course_grade', 'course_id': course.id, 'code': unique_course_code(course),
+            'name': getattr(course, 'name', None), 'error': grade_error_message(error)}
+
+
+def list_grades(course: Course, assignments_provider, long=False, hide_ungraded=False, **providers):
+    """
+    :param providers: submissions_provider and groups_provider for grades_tree.
+    :return: whether the grades could be fetched.
+    """
+    try:
+        tree = grades_tree(course, assignments_provider, **providers)
+        if get_outputter().jsonl():
+            for record in grade_records(tree, hide_ungraded=hide_ungraded):
+                get_outputter().precord(record)
+            return True
+        get_outputter().poutput(format_grades_tree(tree, long=long, hide_ungraded=hide_ungraded), end='')
+        return True
     except CanvasException as e:
-        get_outputter().poutput(f'{course_name_or_unique_course_code(course)}: {str(e)}')
+        if get_outputter().jsonl():
+            get_outputter().precord(grade_error_record(course, e))
+        else:
+            get_outputter().poutput(f'{course_name_or_unique_course_code(course)}: {grade_error_message(e)}')
+        return False
+
+
+def list_all_grades(courses, assignments_provider, long=False, hide_ungraded=False, expand=False, jobs=8,
+                    **providers):
+    """
+    Fetches the grades of every course concurrently and prints one summary
+    row per course, followed by each course's grade tree if expand is set.
+    :return: whether the grades of every course could be fetched.
+    """
+    courses = list(courses)
+    if not courses:
+        get_outputter().poutput('No courses available.')
+        return True
+
+    with ThreadPoolExecutor(max_workers=min(jobs, len(courses))) as executor:
+        tree = inherit_background(grades_tree)
+        futures = [(course, executor.submit(tree, course, assignments_provider, **providers)) for course in courses]
+
+        if get_outputter().jsonl():
+            success = True
+            for course, future in futures:
+                try:
+                    records = grade_records(future.result(), hide_ungraded=hide_ungraded)
+                    get_outputter().precord(next(records))
+                    if expand:
+                        for record in records:
+                            get_outputter().precord(record)
+                except CanvasException as e:
+                    success = False
+                    get_outputter().precord(grade_error_record(course, e))
+            return success
+
+    rows = []
+    trees = []
+    for course, future in futures:
+        name = course.name if hasattr(course, 'name') else ''
+        try:
+            tree = future.result()
+        except CanvasException as e:
+            rows.append([unique_course_code(course), name, grade_error_message(e)])
+            continue
 
+        ratio = course_grade_ratio(tree[1])
+        rows.append([unique_course_code(course), name,
+                     best_color(ratio) + percentage_string(ratio, 1) + Style.RESET_ALL if ratio > 0 else ''])
+        trees.append(tree)
 
-def list_announcements(display_topics, number=None, days=None, print=False):
+    get_outputter().poutput(tabulate(rows, tablefmt='plain'))
+
+    if expand:
+        for tree in trees:
+            get_outputter().poutput('')
+            get_outputter().poutput(format_grades_tree(tree, long=long, hide_ungraded=hide_ungraded), end='')
+
+    return len(trees) == len(courses)
+
+
+def list_announcements(display_topics, number=None, days=None, print=False, render=render_messages):
+    """
+    :param render: function from a list of topics to their rendered messages, such as a RenderCache.
+    """
     if number is not None:
         display_topics = display_topics[-number:]
 
@@ -221,33 +395,115 @@ def list_announcements(display_topics, number=None, days=None, print=False):
         display_topics = filter_days_from_today(display_topics, days, key=lambda t: t.posted_at_date)
 
     if print:
-        def print_topic(topic):
-            return '\n'.join([topic.user_name, topic.title, html2text('\n'.join(topic.message.splitlines())).strip()])
-        output = '\n=================\n'.join(map(print_topic, display_topics))
+        display_topics = list(display_topics)
+        messages = render(display_topics)
+    else:
+        messages = repeat(None)  # leaves display_topics an iterator, so rows print as the topics arrive
+
+    if get_outputter().jsonl():
+        for topic, message in zip(display_topics, messages):
+            get_outputter().precord(announcement_record(topic, message=message))
+        return False
+
+    if print:
+        for i, (topic, message) in enumerate(zip(display_topics, messages)):
+            if i > 0:
+                get_outputter().poutput('=================')
+            get_outputter().poutput('\n'.join([topic.user_name, topic.title, message]))
     else:
         def topic_row(topic):
             return [topic.id, compact_datetime(topic.posted_at_date), topic.user_name, topic.title]
-        output = tabulate(map(topic_row, display_topics), tablefmt='plain')
-
-    get_outputter().poutput(output)
+        get_outputter().ptable(map(topic_row, display_topics))
 
     return False
 
 
-def list_announcement(course: Course, ids):
-    for announcement_id in ids:
-        try:
-            topic = course.get_discussion_topic(int(announcement_id))
+def list_announcement(course: Course, ids, render=render_messages, jobs=8, fetch=None):
+    """
+    Fetches the announcements concurrently, printing each in the order of ids as soon as it and those before it arrive.
+    :param fetch: function from an announcement id to its discussion topic, by default course.get_discussion_topic.
+    :return: whether every announcement was found.
+    """
+    if not ids:
+        return True
+
+    success = True
+    fetch = fetch or course.get_discussion_topic
+    with ThreadPoolExecutor(max_workers=min(jobs, len(ids))) as executor:
+        futures = [(announcement_id, executor.submit(inherit_background(fetch), int(announcement_id)))
+                   for announcement_id in ids]
+
+        for announcement_id, future in futures:
+            try:
+                topic = future.result()
+
+                print_items = [topic.user_name,
+                               long_datetime(topic.posted_at_date),
+                               topic.title,
+                               '',
+                               render([topic])[0]]
+
+                get_outputter().poutput('\n'.join(print_items))
+            except ResourceDoesNotExist:
+                success = False
+                get_outputter().poutput(f'{str(announcement_id)}: no such '
+                                       f'announcement id for {unique_course_code(course)}')
+
+    return success
+
+
+def list_caches(caches):
+    def cache_row(stats):
+        return [stats['name'],
+                f'{stats["entries"]}/{stats["maxsize"] if stats["maxsize"] is not None else "-"}',
+                stats['hits'],
+                stats['misses'],
+                percentage_string(stats['hit_rate'], 0) if stats['hit_rate'] is not None else '',
+                stats['evictions'] + stats['expirations'],
+                human_size(stats['memory'])]
+
+    rows = [cache_row(cache.stats()) for cache in caches]
+    if rows:
+        get_outputter().poutput(tabulate(rows, headers=['Cache', 'Entries', 'Hits', 'Misses', 'Hit rate',
+                                                        'Dropped', 'Memory'], tablefmt='plain'))
+    else:
+        get_outputter().poutput('No caches in use.')
 
-            body = html2text('\n'.join(topic.message.splitlines())).strip()
 
-            print_items = [topic.user_name,
-                           long_datetime(topic.posted_at_date),
-                           topic.title,
-                           '',
-                           body]
+def list_outbox(outbox):
+    if not outbox:
+        get_outputter().poutput('No queued submissions.')
+        return
 
-            get_outputter().poutput('\n'.join(print_items))
-        except ResourceDoesNotExist:
-            get_outputter().poutput(f'{str(announcement_id)}: no such'
-                                   f'announcement id for {unique_course_code(course)}')
+    rows = [[compact_datetime(datetime.fromtimestamp(item['queued_at'], pytz.utc)), item['course'],
+             item['assignment'] or item['assignment_id'], ', '.join(queued_files(item))] for item in outbox]
+    get_outputter().poutput(tabulate(rows, headers=['Queued', 'Course', 'Assignment', 'Files'], tablefmt='plain'))
+
+
+def list_notifications(notifications):
+    for notification in notifications:
+        if get_outputter().jsonl():
+            get_outputter().precord(notification.record())
+        else:
+            get_outputter().poutput(notification.line())
+
+
+def list_command_stats(stats):
+    elapsed = stats.total_elapsed()
+    network = stats.network_time()
+    get_outputter().poutput(f'{stats.command}: {elapsed:.3f}s elapsed, {network:.3f}s in requests, '
+                            f'{stats.cache_hits} cache hits, {stats.cache_misses} cache misses')
+    if stats.completions:
+        get_outputter().poutput(f'{stats.completions} completions in {stats.completion_time:.3f}s')
+
+    def endpoint_row(name, endpoint):
+        return [name, endpoint.requests, endpoint.pages, endpoint.errors, human_size(endpoint.bytes),
+                f'{endpoint.latency * 1000:.0f}', f'{endpoint.latency * 1000 / endpoint.requests:.0f}',
+                f'{endpoint.max_latency * 1000:.0f}', ' '.join(str(count) for count in endpoint.histogram)]
+
+    rows = [endpoint_row(name, stats.endpoints[name]) for name in sorted(stats.endpoints)]
+    if rows:
+        histogram_header = '/'.join(str(bound) for bound in LATENCY_BUCKETS) + '/+ms'
+        get_outputter().poutput(tabulate(rows, headers=['Endpoint', 'Requests', 'Pages', 'Errors', 'Data',
+                                                        'Total ms', 'Mean ms', 'Max ms', histogram_header],
+                                         tablefmt='plain'))
@@ -0,0 +1,131 @@
+import threading
+import time
+from datetime import timedelta
+
+from canvasapi.exceptions import CanvasException
+from requests.exceptions import ConnectionError, Timeout
+
+from .prefetch import is_background_thread
+
+# Failures that mean Canvas cannot be reached at all, as opposed to an error response
+CONNECTION_ERRORS = (ConnectionError, Timeout)
+
+
+class NotAvailableOfflineException(CanvasException):
+    """
+    Raised for data that is needed while offline but was never saved by an earlier session.
+    """
+
+
+def queued_files(item):
+    """
+    :return: the files of a queued submission, including those queued with a single file by older versions.
+    """
+    return item['files'] if 'files' in item else [item['file']]
+
+
+class OfflineMode:
+    """
+    Tracks whether Canvas is being answered from saved snapshots instead of the network, either because it was
+    set by the user or, automatically, because a request could not connect. Automatic offline mode lets a request
+    through again every retry_after so that the session goes back online once Canvas is reachable.
+    Also keeps the outbox of changes (submissions) made while offline, persisted in the DiskCache if given.
+    """
+
+    resource = 'outbox'
+
+    def __init__(self, disk_cache=None, retry_after=timedelta(minutes=1)):
+        self.disk_cache = disk_cache
+        self.retry_after = retry_after.total_seconds()
+
+        self.enabled = False
+        self.automatic = False
+        self.failed_at = None
+        self.switched = None  # 'offline' or 'online' until the switch is reported
+
+        self.lock = threading.Lock()
+        self.recording = False
+        self.oldest_served = None
+
+        entry = disk_cache.get(self.resource, 'pending') if disk_cache is not None else None
+        self.outbox = entry[0] if entry is not None else []
+
+    @property
+    def active(self):
+        """
+        :return: whether requests should be answered from snapshots.
+        """
+        if not self.enabled:
+            return False
+        return not self.automatic or time.time() - self.failed_at < self.retry_after
+
+    def set_enabled(self, enabled):
+        self.enabled = bool(enabled)
+        self.automatic = False
+
+    def connection_failed(self):
+        with self.lock:
+            if not self.enabled:
+                self.enabled = self.automatic = True
+                self.switched = 'offline'
+            if self.automatic:
+                self.failed_at = time.time()
+
+    def connection_succeeded(self):
+        with self.lock:
+            if self.enabled and self.automatic:
+                self.enabled = self.automatic = False
+                self.switched = 'online'
+
+    def take_switch(self):
+        """
+        :return: 'offline' or 'online' if the mode switched automatically since the last call, otherwise None.
+        """
+        with self.lock:
+            switched, self.switched = self.switched, None
+        return switched
+
+    def start_command(self):
+        with self.lock:
+            self.recording = True
+            self.oldest_served = None
+
+    def finish_command(self):
+        """
+        :return: when the oldest snapshot used by the command was fetched, or None if none was used.
+        """
+        with self.lock:
+            self.recording = False
+            return self.oldest_served
+
+    def served(self, fetched_at):
+        """
+        Records that a snapshot fetched at the given time answered (part of) the running command.
+        """
+        if is_background_thread():
+            return
+        with self.lock:
+            if self.recording and (self.oldest_served is None or fetched_at < self.oldest_served):
+                self.oldest_served = fetched_at
+
+    def queue(self, item):
+        """
+        :param item: a JSON-serializable dict describing the change, a queued_at time is added.
+        """
+        with self.lock:
+            self.outbox.append(dict(item, queued_at=time.time()))
+            self._save()
+
+    def remove(self, item):
+        with self.lock:
+            self.outbox.remove(item)
+            self._save()
+
+    def clear_outbox(self):
+        with self.lock:
+            self.outbox = []
+            self._save()
+
+    def _save(self):
+        if self.disk_cache is not None:
+            self.disk_cache.put(self.resource, 'pending', self.outbox)
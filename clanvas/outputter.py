@@ -1,4 +1,13 @@
+import json
+import re
+from contextlib import contextmanager
 from enum import Enum
+from itertools import chain, islice
+
+# Rows used to fix the column widths of a streamed table, one page of a Canvas listing
+TABLE_BATCH = 100
+
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
 
 
 class Verbosity(Enum):
@@ -8,10 +17,39 @@ class Verbosity(Enum):
     DEBUG = 3
 
 
+class OutputFormat(Enum):
+    TEXT = 0
+    JSONL = 1
+
+
+def is_number(value):
+    if isinstance(value, (int, float)):
+        return True
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def visible_len(string):
+    return len(ANSI_ESCAPE.sub('', string))
+
+
+@contextmanager
+def no_pager(printfn, num_lines):
+    yield printfn
+
+
 class Outputter:
-    def __init__(self, printfn, verbosityfn):
+    def __init__(self, printfn, verbosityfn, formatfn=lambda: OutputFormat.TEXT, pagerfn=no_pager):
         self.printfn = printfn
         self.verbosityfn = verbosityfn
+        self.formatfn = formatfn
+        self.pagerfn = pagerfn
+
+    def jsonl(self):
+        return self.formatfn() is OutputFormat.JSONL
 
     def check(self, verbosity):
         return self.verbosityfn().value >= verbosity.value
@@ -29,6 +67,42 @@ class Outputter:
     def poutput_debug(self, msg, end='\n'):
         self.poutput(msg, end, verbosity=Verbosity.DEBUG)
 
+    def ptable(self, rows, verbosity=Verbosity.NORMAL):
+        """
+        Prints rows in the layout of tabulate's plain format, but streamed: column widths and alignment are fixed
+        from the first TABLE_BATCH rows, and each row is printed as soon as the rows iterable produces it.
+        If the first batch alone fills the screen, the output goes through the pager.
+        """
+        if not self.check(verbosity):
+            return
+
+        rows = iter(rows)
+        first = [['' if cell is None else str(cell) for cell in row] for row in islice(rows, TABLE_BATCH)]
+        if not first:
+            return
+
+        num_columns = max(len(row) for row in first)
+        widths = [max((visible_len(row[i]) for row in first if i < len(row)), default=0) for i in range(num_columns)]
+        numeric = [all(is_number(row[i]) for row in first if i < len(row) and row[i] != '')
+                   for i in range(num_columns)]
+
+        def format_row(row):
+            cells = []
+            for i, cell in enumerate(row):
+                padding = ' ' * max(0, widths[i] - visible_len(cell)) if i < num_columns else ''
+                cells.append(padding + cell if i < num_columns and numeric[i] else cell + padding)
+            return '  '.join(cells).rstrip()
+
+        with self.pagerfn(self.printfn, len(first)) as printfn:
+            for row in chain(first, (['' if cell is None else str(cell) for cell in row] for row in rows)):
+                printfn(format_row(row) + '\n')
+
+    def precord(self, record, verbosity=Verbosity.NORMAL):
+        """
+        Prints one record as a line of JSON, for the JSONL output format.
+        """
+        self.poutput(json.dumps(record, default=str), verbosity=verbosity)
+
 
 outputter: Outputter
 
@@ -43,12 +117,15 @@ def get_outputter() -> Outputter:
     return outputter
 
 
-def bind_outputter(printfn, verbosityfn):
+def bind_outputter(printfn, verbosityfn, formatfn=lambda: OutputFormat.TEXT, pagerfn=no_pager):
     """
     Sets the global outputter variable accessible from get_outputter.
     :param printfn: a function that accepts a string to print out to user.
     :param verbosityfn: a function that provides a verbosity level.
+    :param formatfn: a function that provides the output format of listings.
+    :param pagerfn: a context manager taking printfn and the number of lines known so far, which
+    provides the function to print long output with (printfn itself, or one writing to a pager).
     :return: None
     """
     global outputter
-    outputter = Outputter(printfn, verbosityfn)
+    outputter = Outputter(printfn, verbosityfn, formatfn, pagerfn)
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+from canvasapi.paginated_list import PaginatedList
+
+from .prefetch import inherit_background
+
+PER_PAGE = 100
+
+
+def page_number(url):
+    """
+    :return: the numeric page parameter of a pagination link, or None for bookmark style links.
+    """
+    page = dict(parse_qsl(urlparse(url).query)).get('page')
+    return int(page) if page is not None and page.isdigit() else None
+
+
+def with_page(url, page):
+    parsed = urlparse(url)
+    query = [(key, value if key != 'page' else str(page))
+             for key, value in parse_qsl(parsed.query, keep_blank_values=True)]
+    return urlunparse(parsed._replace(query=urlencode(query)))
+
+
+def page_elements(paginated, response):
+    data = response.json()
+    if paginated._root:
+        try:
+            data = data[paginated._root]
+        except KeyError:
+            raise ValueError('Invalid root value specified.')
+
+    elements = []
+    for element in data:
+        if element is not None:
+            element.update(paginated._extra_attribs)
+            elements.append(paginated._content_class(paginated._requester, element))
+    return elements
+
+
+def iterate_pages(paginated, jobs=8):
+    """
+    Yields the elements of a canvasapi PaginatedList in order, requesting PER_PAGE elements per page.
+    When the first response's last link has a page number, the remaining pages are fetched concurrently,
+    otherwise (e.g. bookmark pagination) next links are followed one at a time.
+    :param paginated: a PaginatedList that has not been iterated yet, other iterables are passed through.
+    :param jobs: maximum number of pages to fetch at once.
+    """
+    if not isinstance(paginated, PaginatedList):
+        yield from paginated
+        return
+
+    requester = paginated._requester
+    method = paginated._request_method
+
+    params = dict(paginated._first_params)
+    params['per_page'] = max(PER_PAGE, params.get('per_page', PER_PAGE))
+    if '_kwargs' in params:
+        params['_kwargs'] = list(params['_kwargs'])  # canvasapi extends this list in place
+
+    response = requester.request(method, paginated._first_url, **params)
+    yield from page_elements(paginated, response)
+
+    next_link = response.links.get('next')
+    last_link = response.links.get('last')
+    first_page = page_number(next_link['url']) if next_link else None
+    last_page = page_number(last_link['url']) if last_link else None
+
+    if first_page is not None and last_page is not None and last_page >= first_page:
+        urls = [with_page(last_link['url'], page) for page in range(first_page, last_page + 1)]
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(urls)))) as executor:
+            request = inherit_background(requester.request)
+            responses = [executor.submit(request, method, _url=url) for url in urls]
+            for future in responses:
+                response = future.result()
+                yield from page_elements(paginated, response)
+        # the listing may have grown while the pages were fetched
+        next_link = response.links.get('next')
+
+    while next_link:
+        response = requester.request(method, _url=next_link['url'])
+        yield from page_elements(paginated, response)
+        next_link = response.links.get('next')
+
+
+def fetch_all(paginated, jobs=8):
+    """
+    :return: every element of a canvasapi PaginatedList as a list, see iterate_pages.
+    """
+    return list(iterate_pages(paginated, jobs))
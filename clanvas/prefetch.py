@@ -0,0 +1,93 @@
+import itertools
+import queue
+import threading
+
+INTERACTIVE = 0
+CURRENT_COURSE = 1
+BACKGROUND = 2
+
+_thread_state = threading.local()
+
+
+def mark_background_thread():
+    """
+    Marks the calling thread as doing background work (prefetching, cache refreshes),
+    so that its requests are not attributed to the command being run.
+    """
+    _thread_state.background = True
+
+
+def is_background_thread():
+    return getattr(_thread_state, 'background', False)
+
+
+def inherit_background(func):
+    """
+    Wraps func, to be run on another thread (e.g. by an executor), so that it is marked as background work
+    if and only if the calling thread is.
+    """
+    background = is_background_thread()
+
+    def run(*args, **kwargs):
+        _thread_state.background = background
+        return func(*args, **kwargs)
+
+    return run
+
+
+class PrefetchScheduler:
+    """
+    Runs cache-warming calls on a small pool of daemon threads, lowest priority value first.
+    Submitting a call that is already queued only moves it forward if the new priority is higher,
+    so the same data is never fetched twice by the scheduler.
+    """
+
+    def __init__(self, workers=2):
+        self.queue = queue.PriorityQueue()
+        self.counter = itertools.count()
+        self.pending = {}  # (func, args) -> priority it is queued at
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, func, *args, priority=BACKGROUND):
+        key = (func, args)
+        with self.lock:
+            if self.stopped.is_set() or self.pending.get(key, priority + 1) <= priority:
+                return
+            self.pending[key] = priority
+        self.queue.put((priority, next(self.counter), key))
+
+    def shutdown(self, wait=False):
+        """
+        Drops every queued call and stops the workers once their current call returns.
+        """
+        with self.lock:
+            self.stopped.set()
+            self.pending.clear()
+        for _ in self.threads:
+            self.queue.put((-1, next(self.counter), None))
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+    def _work(self):
+        mark_background_thread()
+        while True:
+            priority, _, key = self.queue.get()
+            if key is None:
+                return
+
+            with self.lock:
+                if self.pending.get(key) != priority:
+                    continue  # already run from a higher priority entry, or cancelled
+                del self.pending[key]
+
+            func, args = key
+            try:
+                func(*args)
+            except Exception:
+                pass  # a failed prefetch just means the command fetches it again itself
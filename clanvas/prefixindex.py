@@ -0,0 +1,57 @@
+class PrefixIndex:
+    """
+    Case-insensitive trie from string keys to values. Every node keeps the values of all keys below it,
+    so a search costs O(len(prefix)) and returns a precomputed tuple without scanning or copying the items.
+    With substrings=True every suffix of a key is indexed, so searches match anywhere in the key.
+    """
+
+    def __init__(self, items=(), substrings=False):
+        """
+        :param items: (key, value) pairs, search results keep this order.
+        """
+        self.size = 0
+        root = _Node()
+        for index, (key, value) in enumerate(items):
+            key = key.lower()
+            for start in range(len(key) if substrings and key else 1):
+                root.add(index, value)
+                node = root
+                for char in key[start:]:
+                    node = node.children.setdefault(char, _Node())
+                    node.add(index, value)
+            self.size += 1
+        self.root = root.freeze()
+
+    def __len__(self):
+        return self.size
+
+    def search(self, prefix):
+        """
+        :return: the values whose key starts with (or, for substring indexes, contains) prefix.
+        """
+        node = self.root
+        for char in prefix.lower():
+            node = node.children.get(char)
+            if node is None:
+                return ()
+        return node.values
+
+
+class _Node:
+    __slots__ = ['children', 'values', 'last']
+
+    def __init__(self):
+        self.children = {}
+        self.values = []
+        self.last = -1  # index of the last item added, so an item reached by several suffixes is kept once
+
+    def add(self, index, value):
+        if self.last != index:
+            self.last = index
+            self.values.append(value)
+
+    def freeze(self):
+        self.values = tuple(self.values)
+        for child in self.children.values():
+            child.freeze()
+        return self
@@ -0,0 +1,122 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Canvas' default rate limit bucket: its size, how fast it drains (units per second), and the cost charged up front
+# for every request in flight, refunded when the request completes
+CAPACITY = 700.0
+REFILL_RATE = 10.0
+UPFRONT_COST = 50.0
+
+# Shortest and longest wait after a throttled response
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+
+
+def is_throttled(response):
+    return response.status_code == 403 and 'rate limit exceeded' in response.text.lower()
+
+
+class RateLimiter:
+    """
+    Token bucket mirroring Canvas' rate limit from the X-Rate-Limit-Remaining and X-Request-Cost headers,
+    shared by every thread making requests through one session.
+
+    A request starts when the estimated remaining units, less the up front cost of the requests in flight,
+    stay above the reserve for its priority: background requests leave `reserve` units for interactive ones,
+    and never start while an interactive request is waiting. Concurrency is additionally capped by a limit
+    that grows by one with every request that completes normally and is halved, with an exponentially growing
+    pause of all requests, whenever Canvas throttles.
+    """
+
+    def __init__(self, max_concurrency=32, reserve=300.0, capacity=CAPACITY, refill_rate=REFILL_RATE):
+        self.max_concurrency = max_concurrency
+        self.reserve = reserve
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+
+        self.condition = threading.Condition()
+        self.remaining = capacity
+        self.updated_at = time.monotonic()
+        self.cost = 0.0  # moving average of X-Request-Cost
+        self.in_flight = 0
+        self.limit = max_concurrency
+        self.interactive_waiting = 0
+        self.paused_until = 0.0
+        self.backoff = 0.0
+        self.throttles = 0
+
+    def estimated_remaining(self, now):
+        return min(self.capacity, self.remaining + (now - self.updated_at) * self.refill_rate)
+
+    @contextmanager
+    def slot(self, background=False):
+        """
+        Waits until a request of the given priority may start, and holds its place while it runs.
+        """
+        self.acquire(background)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, background=False):
+        reserve = self.reserve if background else 0.0
+        with self.condition:
+            if not background:
+                self.interactive_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._wait_time(now, reserve, background)
+                    if wait <= 0:
+                        break
+                    self.condition.wait(wait)
+            finally:
+                if not background:
+                    self.interactive_waiting -= 1
+                    self.condition.notify_all()
+            self.in_flight += 1
+
+    def _wait_time(self, now, reserve, background):
+        """
+        :return: seconds until a request could start, 0 if it may start now.
+        """
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= self.limit or (background and self.interactive_waiting):
+            return 1.0  # woken by release before then
+        if self.in_flight == 0 and not background:
+            return 0  # an interactive request always runs, a wrong estimate must not stall a command
+        shortfall = reserve + UPFRONT_COST * (self.in_flight + 1) + self.cost - self.estimated_remaining(now)
+        return shortfall / self.refill_rate if shortfall > 0 else 0
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def update(self, response):
+        """
+        Updates the estimates from a Canvas response, backing off if it was throttled.
+        """
+        remaining = response.headers.get('X-Rate-Limit-Remaining')
+        cost = response.headers.get('X-Request-Cost')
+        with self.condition:
+            now = time.monotonic()
+            if remaining is not None:
+                # the header is only accurate for this request, add back the up front cost of the others in flight
+                self.remaining = min(self.capacity, float(remaining) + UPFRONT_COST * (self.in_flight - 1))
+                self.updated_at = now
+            if cost is not None:
+                self.cost = 0.8 * self.cost + 0.2 * float(cost)
+
+            if is_throttled(response):
+                self.throttles += 1
+                self.limit = max(1, self.limit // 2)
+                self.backoff = min(MAX_BACKOFF, self.backoff * 2 or MIN_BACKOFF)
+                self.paused_until = max(self.paused_until, now + self.backoff)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1)
+                self.backoff = 0.0
+            self.condition.notify_all()
@@ -0,0 +1,104 @@
+import hashlib
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from html2text import html2text
+
+# Renders of at least this many messages are spread over a process pool, html2text being pure Python
+PROCESS_POOL_THRESHOLD = 16
+
+
+def render_html(message):
+    return html2text('\n'.join(message.splitlines())).strip()
+
+
+_pools = {}  # processes -> ProcessPoolExecutor
+_pools_lock = threading.Lock()
+
+
+def process_pool(processes=None):
+    """
+    :return: the process pool of the given size, started on first use and kept for the rest of the session.
+    Its workers are spawned rather than forked, as this process runs prefetching and refresh threads.
+    """
+    with _pools_lock:
+        if processes not in _pools:
+            _pools[processes] = ProcessPoolExecutor(max_workers=processes,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+        return _pools[processes]
+
+
+def render_all(messages, processes=None):
+    if processes != 1 and len(messages) >= PROCESS_POOL_THRESHOLD:
+        return list(process_pool(processes).map(render_html, messages, chunksize=4))
+    return [render_html(message) for message in messages]
+
+
+def topic_version(topic):
+    """
+    :return: a cache key for a discussion topic's message, which changes whenever the topic is edited. The message
+    digest is part of it since some Canvas instances leave out updated_at, leaving only posted_at.
+    """
+    edited = getattr(topic, 'updated_at', None) or getattr(topic, 'posted_at', None)
+    digest = hashlib.sha1((topic.message or '').encode('utf-8')).hexdigest()[:16]
+    return f'{topic.id}:{edited}:{digest}'
+
+
+class RenderCache:
+    """
+    Remembers the markdown rendering of discussion topic messages, keyed by topic id and last edit time,
+    in memory (least recently used first out) and, if a DiskCache is given, on disk across sessions.
+    """
+
+    resource = 'rendered_topics'
+
+    def __init__(self, disk_cache=None, maxsize=512, processes=None):
+        """
+        :param processes: size of the process pool for bulk renders, 1 to always render in this process.
+        """
+        self.disk_cache = disk_cache
+        self.maxsize = maxsize
+        self.processes = processes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __call__(self, topics):
+        """
+        :return: the rendered messages of the topics, in order.
+        """
+        keys = [topic_version(topic) for topic in topics]
+        rendered = [self._lookup(key) for key in keys]
+
+        missing = [i for i, body in enumerate(rendered) if body is None]
+        if not missing:
+            return rendered
+
+        for i, body in zip(missing, render_all([topics[i].message or '' for i in missing], self.processes)):
+            rendered[i] = body
+            self._store(keys[i], body)
+
+        return rendered
+
+    def _lookup(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        if self.disk_cache is not None:
+            entry = self.disk_cache.get(self.resource, key)
+            if entry is not None:
+                self._store(key, entry[0], persist=False)
+                return entry[0]
+        return None
+
+    def _store(self, key, body, persist=True):
+        with self.lock:
+            self.entries[key] = body
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        if persist and self.disk_cache is not None:
+            self.disk_cache.put(self.resource, key, body)
@@ -0,0 +1,148 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+from .prefetch import is_background_thread
+
+# Upper bounds (milliseconds) of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = [50, 100, 250, 500, 1000, 2500, 5000]
+
+ID_SEGMENT = re.compile(r'^(\d+|sis_[a-z_]+:.+|self|root)$')
+
+
+def endpoint_name(method, url):
+    """
+    Normalizes a request URL into an endpoint name, e.g. GET courses/:id/assignments.
+    Requests to other hosts (such as file storage) are named by host.
+    """
+    parsed = urlparse(url)
+    path = parsed.path
+    if '/api/v1/' in path:
+        path = path.split('/api/v1/', 1)[1]
+        segments = [':id' if ID_SEGMENT.match(segment) else segment for segment in path.split('/')]
+        return f'{method} {"/".join(segments)}'
+    elif re.search(r'/files/\d+/download', path):
+        return f'{method} files/:id/download'
+    else:
+        return f'{method} {parsed.netloc}'
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.pages = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, latency, num_bytes, page, error):
+        self.requests += 1
+        self.pages += page
+        self.errors += error
+        self.bytes += num_bytes
+        self.latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.histogram[next((i for i, bound in enumerate(LATENCY_BUCKETS) if latency * 1000 <= bound),
+                            len(LATENCY_BUCKETS))] += 1
+
+    def to_dict(self):
+        return {'requests': self.requests, 'pages': self.pages, 'errors': self.errors, 'bytes': self.bytes,
+                'latency_total': round(self.latency, 4), 'latency_max': round(self.max_latency, 4),
+                'latency_histogram': OrderedDict(
+                    [(f'<={bound}ms', count) for bound, count in zip(LATENCY_BUCKETS, self.histogram)]
+                    + [(f'>{LATENCY_BUCKETS[-1]}ms', self.histogram[-1])])}
+
+
+class CommandStats:
+    def __init__(self, command):
+        self.command = command
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.endpoints = {}  # endpoint name -> EndpointStats
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.completions = 0
+        self.completion_time = 0.0
+
+    def total_elapsed(self):
+        return self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+
+    def network_time(self):
+        return sum(endpoint.latency for endpoint in self.endpoints.values())
+
+    def to_dict(self):
+        return {'command': self.command,
+                'elapsed': round(self.total_elapsed(), 4),
+                'network_time': round(self.network_time(), 4),
+                'cache_hits': self.cache_hits, 'cache_misses': self.cache_misses,
+                'completions': self.completions, 'completion_time': round(self.completion_time, 4),
+                'endpoints': OrderedDict((name, self.endpoints[name].to_dict()) for name in sorted(self.endpoints))}
+
+
+class StatsRecorder:
+    """
+    Collects per-endpoint request statistics for the running command, the previous command and the whole
+    session. Requests from background threads (prefetching, cache refreshes) or made outside of a command
+    (such as during tab completion) are counted towards the session and a separate background entry.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.session = CommandStats('session')
+        self.background = CommandStats('background')
+        self.current = None
+        self.last = None
+
+    def instrument(self, session):
+        """
+        Adds a response hook to a requests session so that every request made through it is recorded.
+        """
+        def record(response, *args, **kwargs):
+            content_length = response.headers.get('Content-Length')
+            if content_length is not None and content_length.isdigit():
+                num_bytes = int(content_length)
+            elif not kwargs.get('stream', False):
+                num_bytes = len(response.content)
+            else:
+                num_bytes = 0
+
+            request = response.request
+            page = 'page' in parse_qs(urlparse(request.url).query)
+            self.record_request(endpoint_name(request.method, request.url), response.elapsed.total_seconds(),
+                                num_bytes, page, response.status_code >= 400)
+
+        session.hooks['response'].append(record)
+
+    def record_request(self, endpoint, latency, num_bytes, page, error):
+        with self.lock:
+            targets = [self.session, self.background if is_background_thread() or self.current is None
+                       else self.current]
+            for target in targets:
+                target.endpoints.setdefault(endpoint, EndpointStats()).add(latency, num_bytes, page, error)
+
+    def record_completion(self, elapsed):
+        with self.lock:
+            for target in [self.session, self.current] if self.current is not None else [self.session]:
+                target.completions += 1
+                target.completion_time += elapsed
+
+    def start_command(self, command, cache_counts):
+        with self.lock:
+            self.current = CommandStats(command)
+            self.current.cache_hits, self.current.cache_misses = (-count for count in cache_counts)
+
+    def finish_command(self, cache_counts):
+        with self.lock:
+            command, self.current = self.current, None
+            if command is None:
+                return
+            command.elapsed = time.perf_counter() - command.started
+            command.cache_hits += cache_counts[0]
+            command.cache_misses += cache_counts[1]
+            self.session.cache_hits += command.cache_hits
+            self.session.cache_misses += command.cache_misses
+            self.last = command
@@ -0,0 +1,77 @@
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .prefetch import is_background_thread
+from .ratelimit import RateLimiter, is_throttled
+
+# Config keys (lowercase, as parsed from the clanvas config) that tune the HTTP transport, with their defaults
+TRANSPORT_DEFAULTS = {
+    'poolsize': 32,
+    'connecttimeout': 5.0,
+    'readtimeout': 60.0,
+    'retries': 3,
+    'backoff': 0.5,
+    'ratereserve': 300.0,
+}
+
+RETRY_STATUSES = [429, 502, 503, 504]
+
+# Times a throttled idempotent request is sent again, once the rate limiter's pause is over
+THROTTLE_RETRIES = 3
+
+
+class TimeoutSession(requests.Session):
+    """
+    Session that applies a default (connect, read) timeout to every request that does not set its own.
+    Requests to the host of the rate limiter, if one is set, are scheduled through it, requests made on
+    background threads (see prefetch.mark_background_thread) with lower priority.
+    """
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+        self.limiter = None
+        self.limited_host = None
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        if self.limiter is None or urlparse(url).netloc != self.limited_host:
+            return super().request(method, url, **kwargs)
+
+        for attempt in range(THROTTLE_RETRIES + 1):
+            with self.limiter.slot(background=is_background_thread()):
+                response = super().request(method, url, **kwargs)
+                self.limiter.update(response)
+            if not is_throttled(response) or method.upper() not in ('GET', 'HEAD') or attempt == THROTTLE_RETRIES:
+                return response
+            response.close()  # release the connection to the pool before waiting to retry
+
+
+def build_session(poolsize, connecttimeout, readtimeout, retries, backoff, ratereserve):
+    session = TimeoutSession((connecttimeout, readtimeout))
+    session.limiter = RateLimiter(max_concurrency=poolsize, reserve=ratereserve)
+
+    # Retry only idempotent methods (urllib3's default set), with exponential backoff
+    retry = Retry(total=retries, connect=retries, read=retries, status=retries, backoff_factor=backoff,
+                  status_forcelist=RETRY_STATUSES, raise_on_status=False, respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=poolsize, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def configure_requester(requester, **options):
+    """
+    Replaces the session of a canvasapi Requester with a pooled, retrying, rate limited session.
+    :param options: any of the TRANSPORT_DEFAULTS keys, missing ones take the default value.
+    """
+    settings = dict(TRANSPORT_DEFAULTS)
+    settings.update({key: value for key, value in options.items() if key in TRANSPORT_DEFAULTS})
+    requester._session.close()
+    requester._session = build_session(**settings)
+    requester._session.limited_host = urlparse(requester.base_url).netloc
+    return requester._session
@@ -0,0 +1,179 @@
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from os.path import basename, expanduser
+
+from canvasapi.assignment import Assignment
+from canvasapi.exceptions import CanvasException
+
+from .offline import CONNECTION_ERRORS
+from .prefetch import inherit_background
+from .utils import human_size, get_outputter
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Seconds between progress reports while uploading
+PROGRESS_INTERVAL = 2.0
+
+
+def expand_file_patterns(patterns):
+    """
+    :return: the files matching the glob patterns (or plain paths), in order and without duplicates,
+    and the patterns that matched no file.
+    """
+    files, unmatched = [], []
+    for pattern in patterns:
+        matches = sorted(path for path in glob.glob(expanduser(pattern)) if os.path.isfile(path))
+        if not matches:
+            unmatched.append(pattern)
+        files.extend(path for path in matches if path not in files)
+    return files, unmatched
+
+
+class MultipartFile:
+    """
+    multipart/form-data body of some form fields followed by a file, read from disk chunk by chunk
+    as requests sends it instead of being built in memory.
+    """
+
+    def __init__(self, fields, path, progress=None):
+        """
+        :param fields: (name, value) pairs sent before the file.
+        :param progress: called with the number of file bytes read, from the sending thread.
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self.progress = progress
+
+        head = ''.join(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+                       for name, value in fields)
+        head += (f'--{self.boundary}\r\nContent-Disposition: form-data; name="file"; '
+                 f'filename="{basename(path)}"\r\nContent-Type: application/octet-stream\r\n\r\n')
+        self.head = head.encode('utf-8')
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+        self.size = os.path.getsize(path)
+        self.file = open(path, 'rb')
+        self.position = 0
+
+    def __len__(self):
+        return len(self.head) + self.size + len(self.tail)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self)
+        chunks = []
+        while size > 0 and self.position < len(self):
+            if self.position < len(self.head):
+                chunk = self.head[self.position:self.position + size]
+            elif self.position < len(self.head) + self.size:
+                chunk = self.file.read(min(size, UPLOAD_CHUNK_SIZE))
+                if not chunk:
+                    raise IOError(f'{self.file.name} shrank while uploading')
+                if self.progress is not None:
+                    self.progress(len(chunk))
+            else:
+                offset = self.position - len(self.head) - self.size
+                chunk = self.tail[offset:offset + size]
+            chunks.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        self.file.close()
+
+
+class UploadProgress:
+    """
+    Thread-safe byte counter for a set of uploads, reporting the overall progress and throughput
+    at most every PROGRESS_INTERVAL seconds.
+    """
+
+    def __init__(self, total_bytes):
+        self.total_bytes = total_bytes
+        self.sent_bytes = 0
+        self.start = time.perf_counter()
+        self.reported_at = self.start
+        self.lock = threading.Lock()
+
+    def throughput(self):
+        elapsed = time.perf_counter() - self.start
+        return self.sent_bytes / elapsed if elapsed > 0 else 0
+
+    def __call__(self, num_bytes):
+        with self.lock:
+            self.sent_bytes += num_bytes
+            now = time.perf_counter()
+            if now - self.reported_at < PROGRESS_INTERVAL or self.sent_bytes >= self.total_bytes:
+                return
+            self.reported_at = now
+            percent = 100 * self.sent_bytes // self.total_bytes
+            get_outputter().poutput(f'{human_size(self.sent_bytes)} of {human_size(self.total_bytes)} '
+                                    f'({percent}%), {human_size(self.throughput())}/s')
+
+
+def upload_file(requester, endpoint, path, progress=None):
+    """
+    Uploads a file through Canvas' three step process: the preflight request to the endpoint, which returns where
+    to send the file, the upload itself, streamed from disk, and the confirmation if the upload redirects to one.
+    :return: the Canvas file id.
+    """
+    response = requester.request('POST', endpoint, name=basename(path), size=os.path.getsize(path))
+    preflight = response.json()
+    if not preflight.get('upload_url') or preflight.get('upload_params') is None:
+        raise CanvasException('Bad API response, no upload_url or upload_params.')
+
+    body = MultipartFile(list(preflight['upload_params'].items()), path, progress)
+    try:
+        response = requester._session.post(preflight['upload_url'], data=body, allow_redirects=False,
+                                           headers={'Content-Type': body.content_type})
+    finally:
+        body.close()
+
+    if 300 <= response.status_code < 400:
+        response = requester.request('GET', _url=response.headers['Location'])
+    elif response.status_code >= 400:
+        raise CanvasException(f'upload failed with HTTP status {response.status_code}')
+
+    # remove `while(1);` that may appear at the top of a response
+    return json.loads(response.text.lstrip('while(1);'))['id']
+
+
+def submit_files(assignment: Assignment, paths, jobs=4):
+    """
+    Uploads the files concurrently, then makes one submission of all of them. Nothing is submitted if any upload fails.
+    :return: the Submission, or None if an upload failed.
+    :raises: the connection error if every failed upload could not connect, so the submission can be queued.
+    """
+    endpoint = f'courses/{assignment.course_id}/assignments/{assignment.id}/submissions/self/files'
+    progress = UploadProgress(sum(os.path.getsize(path) for path in paths))
+    file_ids, errors = [], []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(paths)))) as executor:
+        upload = inherit_background(upload_file)
+        futures = [(path, executor.submit(upload, assignment._requester, endpoint, path, progress)) for path in paths]
+        for count, (path, future) in enumerate(futures, 1):
+            try:
+                file_ids.append(future.result())
+                get_outputter().poutput_verbose(f'[{count}/{len(paths)}] {path} '
+                                                f'({human_size(os.path.getsize(path))})')
+            except Exception as e:
+                errors.append((path, e))
+
+    elapsed = time.perf_counter() - progress.start
+    if errors:
+        if all(isinstance(e, CONNECTION_ERRORS) for _, e in errors):
+            raise errors[0][1]
+        for path, e in errors:
+            get_outputter().poutput(f'Failed to upload {path}: {e}')
+        get_outputter().poutput('Not submitting.')
+        return None
+
+    get_outputter().poutput(f'Uploaded {len(paths)} file{"" if len(paths) == 1 else "s"} '
+                            f'({human_size(progress.total_bytes)}) in {elapsed:.1f}s, '
+                            f'{human_size(progress.throughput())}/s')
+    return assignment.submit({'submission_type': 'online_upload', 'file_ids': file_ids})
@@ -1,6 +1,4 @@
-import functools
 import os
-import threading
 from collections import defaultdict
 from datetime import datetime, timedelta
 from os.path import join, expanduser
@@ -50,6 +48,38 @@ def rstripped_fraction(score, possible):
     return f'{numerator}/{denominator}'
 
 
+def human_size(num_bytes):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(num_bytes) < 1024 or unit == 'GB':
+            return f'{num_bytes:.0f} {unit}' if unit == 'B' else f'{num_bytes:.1f} {unit}'
+        num_bytes /= 1024
+
+
+def last_activity(topic):
+    return getattr(topic, 'last_reply_at_date', None) or topic.posted_at_date
+
+
+def merge_updates(items, updates, key=None):
+    """
+    :param items: Canvas objects, sorted by key if one is given.
+    :return: the items with each update replacing the item of the same id, and updates of new ids added,
+    sorted by key. Sorting the mostly sorted result takes time linear in the number of items.
+    """
+    updates_by_id = {update.id: update for update in updates}
+    merged = [updates_by_id.pop(item.id, item) for item in items] + list(updates_by_id.values())
+    if key is not None:
+        merged.sort(key=key)
+    return merged
+
+
+def human_age(seconds):
+    for unit, length in [('day', 86400), ('hour', 3600), ('minute', 60)]:
+        if seconds >= length:
+            count = int(seconds // length)
+            return f'{count} {unit}{"s" if count != 1 else ""} ago'
+    return 'just now'
+
+
 def unique_course_code(course):
     return course.course_code.replace(' ', '') + '-' + str(course.id)
 
@@ -66,11 +96,6 @@ def submission_info_items(s):
     return [s.id, s.score if hasattr(s, 'score') else '']
 
 
-def filter_courses(courses, query):
-    query_processed = query.replace(' ', '').lower()
-    return filter(lambda course: query_processed in unique_course_code(course).lower(), courses)
-
-
 def tabulate_dict(item_to_list, items):
     return dict(zip(items, tabulate(map(item_to_list, items), tablefmt='plain').split('\n')))
 
@@ -83,7 +108,7 @@ def unix_time_seconds(dt):
 
 
 def get_course_by_query(clanvas, query, fail_on_ambiguous=False, quiet=False):
-    matched_courses = list(filter_courses(clanvas.get_courses().values(), query))
+    matched_courses = [course for _, course in clanvas.completion_index.search('get_courses', query.replace(' ', ''))]
     num_matches = len(matched_courses)
 
     if num_matches == 1:
@@ -124,36 +149,10 @@ def get_course_by_query(clanvas, query, fail_on_ambiguous=False, quiet=False):
     return None
 
 
-def call_eagerly(*args):
-    def runner(stop_event, callables):
-        while not stop_event.is_set() and callables:
-            callables.pop()()
-
-    event = threading.Event()
-    thread = threading.Thread(target=runner, args=(event, list(args)))
-    thread.start()
-    return event
-
-
-def blocking_lru(func):
-    func = functools.lru_cache(maxsize=None)(func)
-    lock_dict = defaultdict(threading.Lock)
-
-    def _thread_lru(*args, **kwargs):
-        key = functools._make_key(args, kwargs, typed=False)
-        with lock_dict[key]:
-            return func(*args, **kwargs)
-
-    return _thread_lru
-
-
-def get_submissions_for_assignments(course: Course, assignments):
-    assignment_ids = [assignment.id for assignment in assignments]
-    assignment_submissions = course.get_multiple_submissions(assignment_ids=assignment_ids)
-
+def group_submissions_by_assignment(submissions):
     submissions_by_assignment = defaultdict(list)
 
-    for submission in assignment_submissions:
+    for submission in submissions:
         submissions_by_assignment[submission.assignment_id].append(submission)
 
     return submissions_by_assignment
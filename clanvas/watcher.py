@@ -0,0 +1,190 @@
+from datetime import datetime
+
+import pytz
+
+from .utils import compact_datetime, rstripped_fraction, unique_course_code
+
+# Below this many remaining rate limit units the poll interval is stretched as if nothing had changed
+RATE_LIMIT_RESERVE = 200
+
+
+def new_announcements(previous, current):
+    known = {topic.id for topic in previous}
+    return [topic for topic in current if topic.id not in known]
+
+
+def new_grades(previous, current):
+    """
+    :return: the submissions of current whose grade or score differs from the same submission in previous.
+    """
+    known = {submission.id: submission for submission in previous}
+
+    def grade(submission):
+        return getattr(submission, 'grade', None), getattr(submission, 'score', None)
+
+    return [submission for submission in current if getattr(submission, 'grade', None) is not None and
+            (submission.id not in known or grade(known[submission.id]) != grade(submission))]
+
+
+def changed_due_dates(previous, current):
+    """
+    :return: the assignments of current whose due date differs from the same assignment in previous.
+    """
+    known = {assignment.id: assignment for assignment in previous}
+    return [assignment for assignment in current if assignment.id in known and
+            getattr(known[assignment.id], 'due_at', None) != getattr(assignment, 'due_at', None)]
+
+
+class Notification:
+    def __init__(self, kind, course, text, **fields):
+        self.kind = kind
+        self.course = course
+        self.text = text
+        self.fields = fields
+
+    def record(self):
+        return dict({'type': 'notification', 'kind': self.kind, 'course_id': self.course.id,
+                     'code': unique_course_code(self.course)}, **self.fields)
+
+    def line(self):
+        return f'{compact_datetime(datetime.now(pytz.utc))} {unique_course_code(self.course)}: {self.text}'
+
+
+class Watcher:
+    """
+    Polls Canvas for new announcements, new grades and changed due dates in the given courses.
+
+    Each poll makes one conditional request for the user's activity stream, and only the courses with new activity
+    in it are refreshed, through the delta refreshers of the Clanvas caches. Due dates do not show up in the
+    activity stream, so assignments are refreshed for every course once every assignments_every polls.
+    The interval doubles, up to max_interval, after each poll that found nothing, and goes back to interval
+    after one that did.
+
+    Changes are found by diffing against the watcher's own snapshot of each listing rather than the previous
+    value of the shared caches, which other commands and background refreshes update in between polls.
+    """
+
+    def __init__(self, clanvas, courses, interval=300, max_interval=3600, assignments_every=12):
+        """
+        :param interval: seconds between polls while there are changes.
+        """
+        self.clanvas = clanvas
+        self.courses = {course.id: course for course in courses}
+        self.interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.assignments_every = assignments_every
+
+        self.next_interval = interval
+        self.polls = 0
+        self.etag = None
+        self.since = None  # latest updated_at seen in the activity stream
+
+        # course id -> listing as of the last poll
+        self.announcements = {}
+        self.submissions = {}
+        self.assignments = {}
+
+    def snapshot(self):
+        """
+        Loads the data polls are compared against, from the caches where possible.
+        """
+        for course_id in self.courses:
+            self.announcements[course_id] = self.clanvas.list_announcements_cached(course_id)
+            self.submissions[course_id] = self.clanvas.list_submissions_cached(course_id)
+            self.assignments[course_id] = self.clanvas.list_assignments_cached(course_id)
+
+    def poll(self):
+        """
+        :return: the notifications for what changed since the last poll.
+        """
+        active_courses = self.active_courses()
+        if self.polls % self.assignments_every == 0:
+            assignment_courses = list(self.courses)
+        else:
+            assignment_courses = []
+        self.polls += 1
+
+        notifications = []
+        for course_id in active_courses:
+            notifications += self.poll_announcements(self.courses[course_id])
+            notifications += self.poll_grades(self.courses[course_id])
+        for course_id in assignment_courses:
+            notifications += self.poll_due_dates(self.courses[course_id])
+
+        if notifications:
+            self.next_interval = self.interval
+        else:
+            self.back_off()
+        return notifications
+
+    def back_off(self):
+        self.next_interval = min(self.next_interval * 2, self.max_interval)
+
+    def active_courses(self):
+        """
+        :return: ids of the watched courses with activity since the last poll, all of them on the first poll
+        or when more has happened than the first page of the activity stream shows.
+        """
+        requester = self.clanvas.canvas._Canvas__requester
+        response = requester.request('GET', 'users/self/activity_stream', per_page=50,
+                                     headers={'If-None-Match': self.etag} if self.etag else None)
+
+        remaining = response.headers.get('X-Rate-Limit-Remaining')
+        if remaining is not None and float(remaining) < RATE_LIMIT_RESERVE:
+            self.back_off()
+
+        if response.status_code == 304:
+            return []
+        self.etag = response.headers.get('ETag')
+
+        items = response.json()
+        newer = [item for item in items if self.since is None or item.get('updated_at', '') > self.since]
+        first_poll = self.since is None
+        self.since = max([item.get('updated_at', '') for item in items] + [self.since or ''])
+
+        if first_poll or (len(newer) == len(items) and 'next' in response.links):
+            return list(self.courses)
+        return [course_id for course_id in self.courses if any(item.get('course_id') == course_id for item in newer)]
+
+    def poll_announcements(self, course):
+        _, current = self.clanvas.list_announcements_cached.refresh(course.id)
+        previous = self.announcements.get(course.id, [])
+        self.announcements[course.id] = current
+        return [Notification('announcement', course, f'new announcement "{topic.title}" ({topic.id})',
+                             id=topic.id, title=topic.title, posted_at=getattr(topic, 'posted_at', None))
+                for topic in new_announcements(previous, current)]
+
+    def poll_grades(self, course):
+        _, current = self.clanvas.list_submissions_cached.refresh(course.id)
+        previous = self.submissions.get(course.id, [])
+        self.submissions[course.id] = current
+        assignments = {assignment.id: assignment for assignment in self.assignments.get(course.id, [])}
+
+        notifications = []
+        for submission in new_grades(previous, current):
+            assignment = assignments.get(submission.assignment_id)
+            name = assignment.name if assignment is not None else f'assignment {submission.assignment_id}'
+            score = getattr(submission, 'score', None)
+            if assignment is not None and score is not None:
+                grade = rstripped_fraction(score, assignment.points_possible)
+            else:
+                grade = submission.grade
+            notifications.append(Notification('grade', course, f'{name} graded {grade}',
+                                              assignment_id=submission.assignment_id, assignment=name,
+                                              grade=submission.grade, score=score))
+        return notifications
+
+    def poll_due_dates(self, course):
+        _, current = self.clanvas.list_assignments_cached.refresh(course.id)
+        previous = self.assignments.get(course.id, [])
+        self.assignments[course.id] = current
+
+        notifications = []
+        for assignment in changed_due_dates(previous, current):
+            if hasattr(assignment, 'due_at_date'):
+                text = f'{assignment.name} now due {compact_datetime(assignment.due_at_date)}'
+            else:
+                text = f'{assignment.name} no longer has a due date'
+            notifications.append(Notification('due_date', course, text, assignment_id=assignment.id,
+                                              assignment=assignment.name, due_at=getattr(assignment, 'due_at', None)))
+        return notifications
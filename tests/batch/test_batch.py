@@ -0,0 +1,106 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+
+import requests_mock
+
+from clanvas.batch import EXIT_OK, EXIT_COMMAND_FAILED, EXIT_USAGE, run_batch, split_commands
+from clanvas.clanvas import Clanvas
+from tests.register import register_uris
+from tests.regression.test_regression import login_requirements
+from tests.settings import BASE_URL, BASE_URL_WITH_VERSION, API_KEY
+
+UNAUTHORIZED = {'status_code': 401, 'json': {'errors': [{'message': 'user not authorized to perform that action'}]}}
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_split_commands(self):
+        self.assertEqual(['la -c cs101', 'lg -c "cs;101"', 'whoami'],
+                         split_commands('la -c cs101; lg -c "cs;101"\n# comment\n\n whoami ;'))
+
+    def run_commands(self, *commands, keep_going=False, responses=None):
+        """
+        :param responses: {endpoint under the API root: requests_mock response} mocked in addition to the login.
+        """
+        with requests_mock.Mocker() as m:
+            register_uris(login_requirements, m)
+            for endpoint, response in (responses or {}).items():
+                m.get(BASE_URL_WITH_VERSION + endpoint, **response)
+            clanvas = Clanvas(BASE_URL, API_KEY)
+            stdout = io.StringIO()
+            with redirect_stdout(stdout), redirect_stderr(io.StringIO()):
+                clanvas.stdout = stdout
+                status = run_batch(clanvas, commands, keep_going=keep_going)
+            clanvas.stop_prefetching()
+        return status, stdout.getvalue(), m.request_history
+
+    def test_commands_share_session(self):
+        status, output, requests = self.run_commands('lc', 'lc -l')
+
+        self.assertEqual(EXIT_OK, status)
+        self.assertIn('EECS455-13682', output)
+        self.assertEqual(1, len([r for r in requests if r.path.endswith('/courses')]))
+
+    def test_failures_stop_the_batch(self):
+        status, output, _ = self.run_commands('lc --bogus', 'whoami')
+        self.assertEqual(EXIT_USAGE, status)
+        self.assertEqual('', output)
+
+        status, output, _ = self.run_commands('la', 'whoami')
+        self.assertEqual(EXIT_COMMAND_FAILED, status)
+        self.assertEqual('Please specify a course to use this command.\n', output)
+
+    def test_keep_going(self):
+        status, output, _ = self.run_commands('la', 'lc', keep_going=True)
+        self.assertEqual(EXIT_COMMAND_FAILED, status)
+        self.assertIn('EECS455-13682', output)
+
+    def test_unknown_commands_and_courses_fail(self):
+        status, output, _ = self.run_commands('lsx', 'whoami')
+        self.assertEqual(EXIT_COMMAND_FAILED, status)
+        self.assertEqual('', output)
+
+        status, _, _ = self.run_commands('cc nosuchcourse', 'whoami')
+        self.assertEqual(EXIT_COMMAND_FAILED, status)
+
+    def test_usage_errors_are_per_session(self):
+        status, _, _ = self.run_commands('lc --bogus', 'lc', keep_going=True)
+        self.assertEqual(EXIT_USAGE, status)
+
+        status, _, _ = self.run_commands('lc')
+        self.assertEqual(EXIT_OK, status)
+
+    def test_failed_lookups_fail(self):
+        not_found = {'status_code': 404, 'json': {'errors': [{'message': 'The specified resource does not exist.'}]}}
+
+        with tempfile.TemporaryDirectory() as directory:
+            submission = os.path.join(directory, 'f')
+            open(submission, 'w').close()
+            status, output, _ = self.run_commands(f'ua -c 13682 999 {submission}',
+                                                  responses={'courses/13682/assignments/999': not_found})
+            self.assertEqual(EXIT_COMMAND_FAILED, status)
+            self.assertIn('Invalid assignment ID.', output)
+
+        status, output, _ = self.run_commands('catann -c 13682 5',
+                                              responses={'courses/13682/discussion_topics/5': not_found})
+        self.assertEqual(EXIT_COMMAND_FAILED, status)
+        self.assertIn('no such announcement id', output)
+
+        status, output, _ = self.run_commands('wopen -c 13682 grades', responses={'courses/13682/tabs': {'json': []}})
+        self.assertEqual(EXIT_COMMAND_FAILED, status)
+        self.assertIn('No tab found matching', output)
+
+    def test_unauthorized_listings_fail(self):
+        status, output, _ = self.run_commands('lg -c 13682', responses={'courses/13682/assignments': UNAUTHORIZED})
+        self.assertEqual(EXIT_COMMAND_FAILED, status)
+        self.assertIn('Unauthorized', output)
+
+        with tempfile.TemporaryDirectory() as directory:
+            status, output, _ = self.run_commands(f'pullf -c 13682 -o {directory}', responses={
+                'courses/13682/folders': UNAUTHORIZED, 'courses/13682/files': UNAUTHORIZED,
+                'courses/13682/folders/root': UNAUTHORIZED})
+        self.assertEqual(EXIT_COMMAND_FAILED, status)
+        self.assertIn('Not authorized to access this course\'s files', output)
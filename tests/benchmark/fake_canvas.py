@@ -0,0 +1,223 @@
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+USER_ID = 101
+EPOCH = datetime(2018, 8, 20, 14, 0, 0)
+
+
+def timestamp(offset):
+    """
+    :param offset: seconds after EPOCH.
+    """
+    return (EPOCH + timedelta(seconds=offset)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class SyntheticCanvas:
+    """
+    Deterministic Canvas data for benchmarks: the user is enrolled in `courses` courses of the current term,
+    each with the given number of assignments (with a graded submission for every other one), announcements,
+    folders and files of file_size bytes.
+    """
+
+    def __init__(self, courses=3, assignments=2000, announcements=1000, folders=20, files=1000, file_size=4096):
+        self.user = {'id': USER_ID, 'name': 'Bench Student', 'short_name': 'Bench Student',
+                     'sortable_name': 'Student, Bench'}
+        self.profile = dict(self.user, login_id='bench1', primary_email='bench1@example.com',
+                            time_zone='America/New_York')
+        self.file_size = file_size
+
+        self.courses = []
+        self.assignments, self.groups, self.submissions, self.topics, self.tabs = {}, {}, {}, {}, {}
+        self.folders, self.files = {}, {}
+
+        for c in range(courses):
+            course_id = 20000 + c
+            self.courses.append({'id': course_id, 'name': f'Synthetic Course {c} (100/{course_id})',
+                                 'course_code': f'BENCH {100 + c}', 'enrollment_term_id': 70,
+                                 'term': {'id': 70, 'name': 'Fall 2018'}, 'workflow_state': 'available',
+                                 'enrollments': [{'type': 'student', 'user_id': USER_ID,
+                                                  'enrollment_state': 'active', 'computed_current_score': 90.0}]})
+
+            self.groups[course_id] = [{'id': course_id * 10 + g, 'name': f'Group {g}', 'position': g + 1,
+                                       'group_weight': 25.0} for g in range(4)]
+            self.assignments[course_id] = [
+                {'id': course_id * 10000 + a, 'course_id': course_id, 'name': f'Assignment {a}',
+                 'assignment_group_id': course_id * 10 + a % 4, 'position': a + 1, 'points_possible': 20.0,
+                 'created_at': timestamp(a * 60), 'due_at': timestamp(a * 3600 + 86400),
+                 'submission_types': ['online_upload'],
+                 'html_url': f'/courses/{course_id}/assignments/{course_id * 10000 + a}'}
+                for a in range(assignments)]
+            self.submissions[course_id] = [
+                {'id': course_id * 10000 + a, 'assignment_id': course_id * 10000 + a, 'user_id': USER_ID,
+                 'score': float(a % 21), 'grade': str(a % 21), 'workflow_state': 'graded',
+                 'submitted_at': timestamp(a * 3600), 'graded_at': timestamp(a * 3600 + 7200)}
+                for a in range(0, assignments, 2)]
+            self.topics[course_id] = [
+                {'id': course_id * 10000 + t, 'title': f'Announcement {t}', 'user_name': 'Professor Bench',
+                 'message': f'<p>Announcement <b>{t}</b> of {course_id}.</p>' * 10,
+                 'posted_at': timestamp(t * 600), 'last_reply_at': timestamp(t * 600),
+                 'html_url': f'/courses/{course_id}/discussion_topics/{course_id * 10000 + t}'}
+                for t in range(announcements)]
+            self.tabs[course_id] = [{'id': tab, 'label': tab.title(), 'position': p + 1,
+                                     'html_url': f'/courses/{course_id}/{tab}'}
+                                    for p, tab in enumerate(['home', 'announcements', 'assignments', 'grades',
+                                                             'files', 'syllabus'])]
+
+            root_id = course_id * 1000
+            self.folders[course_id] = [{'id': root_id, 'name': 'course files', 'full_name': 'course files',
+                                        'parent_folder_id': None}]
+            self.folders[course_id] += [{'id': root_id + f + 1, 'name': f'Folder {f}',
+                                         'full_name': f'course files/Folder {f}', 'parent_folder_id': root_id}
+                                        for f in range(folders)]
+            self.files[course_id] = [
+                {'id': course_id * 10000 + f, 'folder_id': root_id + f % (folders + 1),
+                 'display_name': f'file{f}.txt', 'filename': f'file{f}.txt', 'size': file_size,
+                 'content-type': 'text/plain', 'created_at': timestamp(f), 'updated_at': timestamp(f),
+                 'modified_at': timestamp(f), 'url': f'/files/{course_id * 10000 + f}/download'}
+                for f in range(files)]
+
+    def file_contents(self, file_id):
+        pattern = f'{file_id}\n'.encode()
+        return (pattern * (self.file_size // len(pattern) + 1))[:self.file_size]
+
+
+class FakeCanvasServer(ThreadingHTTPServer):
+    """
+    Serves a SyntheticCanvas over HTTP on localhost, paginating listings like Canvas (per_page is honored up
+    to max_per_page, with next and last links) and delaying every response by latency seconds.
+    Requests are counted so that benchmarks can report how many a command made.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, canvas: SyntheticCanvas, latency=0.0, max_per_page=100, default_per_page=10):
+        super().__init__(('127.0.0.1', 0), FakeCanvasHandler)
+        self.canvas = canvas
+        self.latency = latency
+        self.max_per_page = max_per_page
+        self.default_per_page = default_per_page
+        self.url = f'http://127.0.0.1:{self.server_address[1]}'
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.not_found = []
+
+        self.routes = [(re.compile(pattern + '$'), handler) for pattern, handler in [
+            (r'/api/v1/users/(?:self|\d+)', lambda: canvas.user),
+            (r'/api/v1/users/(?:self|\d+)/profile', lambda: canvas.profile),
+            (r'/api/v1/users/(?:self|\d+)/courses', lambda: canvas.courses),
+            (r'/api/v1/users/self/activity_stream', lambda: []),
+            (r'/api/v1/courses', lambda: canvas.courses),
+            (r'/api/v1/courses/(\d+)', self.course),
+            (r'/api/v1/courses/(\d+)/assignments', lambda c: canvas.assignments[c]),
+            (r'/api/v1/courses/(\d+)/assignments/(\d+)', lambda c, a: self.find(canvas.assignments[c], a)),
+            (r'/api/v1/courses/(\d+)/assignment_groups', lambda c: canvas.groups[c]),
+            (r'/api/v1/courses/(\d+)/students/submissions', lambda c: canvas.submissions[c]),
+            (r'/api/v1/courses/(\d+)/discussion_topics', lambda c: canvas.topics[c]),
+            (r'/api/v1/courses/(\d+)/discussion_topics/(\d+)', lambda c, t: self.find(canvas.topics[c], t)),
+            (r'/api/v1/courses/(\d+)/tabs', lambda c: canvas.tabs[c]),
+            (r'/api/v1/courses/(\d+)/folders', lambda c: canvas.folders[c]),
+            (r'/api/v1/courses/(\d+)/folders/root', lambda c: canvas.folders[c][0]),
+            (r'/api/v1/courses/(\d+)/files', lambda c: self.files(c)),
+        ]]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset_count(self):
+        with self.lock:
+            self.requests = 0
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+
+    def course(self, course_id):
+        return next((course for course in self.canvas.courses if course['id'] == course_id), None)
+
+    def files(self, course_id):
+        return [dict(file, url=self.url + file['url']) for file in self.canvas.files[course_id]]
+
+    @staticmethod
+    def find(objects, object_id):
+        return next((o for o in objects if o['id'] == object_id), None)
+
+    def route(self, path):
+        for pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match:
+                return handler(*map(int, match.groups()))
+        return None
+
+
+class FakeCanvasHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.server.count()
+        time.sleep(self.server.latency)
+
+        download = re.match(r'/files/(\d+)/download$', url.path)
+        if download:
+            self.respond_file(self.server.canvas.file_contents(int(download.group(1))))
+            return
+
+        body = self.server.route(url.path)
+        if body is None:
+            self.server.not_found.append(url.path)
+            self.respond(404, {'errors': [{'message': 'The specified resource does not exist.'}]})
+        elif isinstance(body, list):
+            self.respond_page(url.path, query, body)
+        else:
+            self.respond(200, body)
+
+    def respond_page(self, path, query, objects):
+        per_page = min(int(query.get('per_page', [self.server.default_per_page])[0]), self.server.max_per_page)
+        page = int(query.get('page', ['1'])[0])
+        last = max(1, -(-len(objects) // per_page))
+
+        params = {key: values[-1] for key, values in query.items() if key not in ('page', 'per_page')}
+
+        def link(number, rel):
+            return f'<{self.server.url}{path}?{urlencode(dict(params, page=number, per_page=per_page))}>; rel="{rel}"'
+
+        links = [link(page, 'current'), link(1, 'first'), link(last, 'last')]
+        if page < last:
+            links.append(link(page + 1, 'next'))
+        self.respond(200, objects[(page - 1) * per_page:page * per_page], {'Link': ','.join(links)})
+
+    def respond_file(self, content):
+        start = 0
+        byte_range = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if byte_range:
+            start = int(byte_range.group(1))
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def respond(self, status, body, headers=None):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
@@ -0,0 +1,193 @@
+"""
+Benchmarks Clanvas commands against a FakeCanvasServer with large synthetic courses, reporting each command's
+wall time, the number of requests it made and its peak (Python) memory, and storing or comparing baselines.
+
+    python -m tests.benchmark.run --save before
+    python -m tests.benchmark.run --compare before
+"""
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from contextlib import redirect_stderr, redirect_stdout
+from os.path import dirname, join
+
+from tabulate import tabulate
+
+from clanvas.batch import EXIT_OK, run_batch
+from clanvas.clanvas import Clanvas
+from clanvas.utils import human_size
+from tests.benchmark.fake_canvas import FakeCanvasServer, SyntheticCanvas
+
+BASELINES_FILE = join(dirname(__file__), 'baselines.json')
+
+# Slower than the baseline by more than this fraction of its time counts as a regression
+DEFAULT_THRESHOLD = 0.2
+
+
+def run_command(clanvas, command):
+    if run_batch(clanvas, [command]) != EXIT_OK:
+        raise RuntimeError(f'{command} failed')
+
+
+def complete_assignments(clanvas, course_id):
+    """
+    A cold completion of assignment names, fetching the listing, followed by a completion for every prefix typed.
+    """
+    word = 'Assignment 1999'
+    for end in range(len(word) + 1):
+        clanvas.completion_index.search('list_assignments_cached', word[:end], course_id)
+
+
+SCENARIOS = {
+    'lc': lambda clanvas, course_id, output: run_command(clanvas, 'lc -l -a'),
+    'la': lambda clanvas, course_id, output: run_command(clanvas, f'la -l -c {course_id}'),
+    'lg': lambda clanvas, course_id, output: run_command(clanvas, f'lg -c {course_id}'),
+    'lann': lambda clanvas, course_id, output: run_command(clanvas, f'lann -c {course_id}'),
+    'pullf': lambda clanvas, course_id, output: run_command(clanvas, f'pullf -c {course_id} -o {output}'),
+    'complete': lambda clanvas, course_id, output: complete_assignments(clanvas, course_id),
+}
+
+
+def measure(server, scenario, traced=False):
+    """
+    Runs a scenario in a new session whose login data (profile and courses) is already loaded.
+    :param traced: also measure peak memory, which slows the run down too much to time it at the same time.
+    :return: (wall time in seconds, requests made, peak memory in bytes or None).
+    """
+    with tempfile.TemporaryDirectory() as output, redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+        clanvas = Clanvas(server.url, 'benchmark')
+        clanvas.stdout = sys.stdout
+        try:
+            clanvas.current_user_profile()
+            course_id = next(iter(clanvas.get_courses()))
+            server.reset_count()
+
+            if traced:
+                tracemalloc.start()
+            start = time.perf_counter()
+            SCENARIOS[scenario](clanvas, course_id, output)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if traced else None
+        finally:
+            tracemalloc.stop()
+            clanvas.stop_prefetching()
+    return elapsed, server.requests, peak
+
+
+def run_benchmarks(server, scenarios, repeat=3):
+    """
+    :return: {scenario: {'wall_time', 'requests', 'peak_memory'}}, the wall time being the median of repeat runs.
+    """
+    results = {}
+    for scenario in scenarios:
+        times = [measure(server, scenario)[0] for _ in range(repeat)]
+        _, requests, peak = measure(server, scenario, traced=True)
+        results[scenario] = {'wall_time': statistics.median(times), 'requests': requests, 'peak_memory': peak}
+    return results
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, name, settings, results):
+    baselines = load_baselines(path)
+    baselines[name] = {'settings': settings, 'results': results}
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+
+
+def change(value, baseline):
+    if baseline is None or value is None:
+        return ''
+    if baseline == 0:
+        return '' if value == 0 else '+inf%'
+    return f'{100 * (value - baseline) / baseline:+.0f}%'
+
+
+def regressions(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    :return: the scenarios that got slower by more than threshold or make more requests than in the baseline.
+    """
+    return [scenario for scenario, result in results.items() if scenario in baseline and
+            (result['wall_time'] > baseline[scenario]['wall_time'] * (1 + threshold) or
+             result['requests'] > baseline[scenario]['requests'])]
+
+
+def format_results(results, baseline=None):
+    baseline = baseline or {}
+    rows = []
+    for scenario, result in results.items():
+        base = baseline.get(scenario, {})
+        rows.append([scenario,
+                     f'{result["wall_time"]:.3f}s', change(result['wall_time'], base.get('wall_time')),
+                     result['requests'], change(result['requests'], base.get('requests')),
+                     human_size(result['peak_memory']), change(result['peak_memory'], base.get('peak_memory'))])
+    return tabulate(rows, headers=['Benchmark', 'Time', '', 'Requests', '', 'Peak memory', ''], tablefmt='plain')
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='Benchmark Clanvas commands against a local fake Canvas server.')
+    parser.add_argument('benchmarks', nargs='*', help=f'benchmarks to run, of {", ".join(SCENARIOS)} (all)')
+    parser.add_argument('--courses', type=int, default=3)
+    parser.add_argument('--assignments', type=int, default=2000, help='assignments per course')
+    parser.add_argument('--announcements', type=int, default=1000, help='announcements per course')
+    parser.add_argument('--files', type=int, default=1000, help='files per course')
+    parser.add_argument('--file-size', type=int, default=4096, help='size of each file in bytes')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every response')
+    parser.add_argument('--max-per-page', type=int, default=100, help='largest page the server returns')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='timed runs per benchmark, the median is kept')
+    parser.add_argument('--save', metavar='NAME', help='store the results as the baseline NAME')
+    parser.add_argument('--compare', metavar='NAME', help='compare with the baseline NAME, failing on regressions')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='fraction of a baseline\'s time a benchmark may be slower by')
+    parser.add_argument('--baselines', default=BASELINES_FILE, help='file the baselines are stored in')
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.benchmarks if name not in SCENARIOS]
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(unknown)}')
+
+    settings = {'courses': args.courses, 'assignments': args.assignments, 'announcements': args.announcements,
+                'files': args.files, 'file_size': args.file_size, 'latency': args.latency,
+                'max_per_page': args.max_per_page}
+
+    baseline = None
+    if args.compare is not None:
+        entry = load_baselines(args.baselines).get(args.compare)
+        if entry is None:
+            parser.error(f'no baseline {args.compare} in {args.baselines}')
+        if entry['settings'] != settings:
+            print(f'warning: baseline {args.compare} was run with {entry["settings"]}', file=sys.stderr)
+        baseline = entry['results']
+
+    canvas = SyntheticCanvas(courses=args.courses, assignments=args.assignments, announcements=args.announcements,
+                             files=args.files, file_size=args.file_size)
+    server = FakeCanvasServer(canvas, latency=args.latency, max_per_page=args.max_per_page).start()
+    try:
+        results = run_benchmarks(server, args.benchmarks or list(SCENARIOS), repeat=args.repeat)
+    finally:
+        server.stop()
+
+    print(format_results(results, baseline))
+    if args.save is not None:
+        save_baseline(args.baselines, args.save, settings, results)
+
+    if baseline is not None:
+        slower = regressions(results, baseline, args.threshold)
+        if slower:
+            print(f'Regressed: {", ".join(slower)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from os.path import join
+
+from tests.benchmark.fake_canvas import FakeCanvasServer, SyntheticCanvas
+from tests.benchmark.run import SCENARIOS, load_baselines, main, regressions, run_benchmarks, save_baseline
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.canvas = SyntheticCanvas(courses=2, assignments=250, announcements=120, folders=3, files=30)
+        self.server = FakeCanvasServer(self.canvas).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_scenarios_run_against_server(self):
+        results = run_benchmarks(self.server, list(SCENARIOS), repeat=1)
+
+        self.assertEqual([], self.server.not_found)
+        self.assertEqual(list(SCENARIOS), list(results))
+        self.assertEqual(3, results['la']['requests'])  # 250 assignments, 100 per page
+        self.assertEqual(2 + 30, results['pullf']['requests'])  # folder and file listings, then every file
+        for result in results.values():
+            self.assertGreater(result['wall_time'], 0)
+            self.assertGreater(result['peak_memory'], 0)
+
+    def test_baselines_compared(self):
+        baseline = {'la': {'wall_time': 1.0, 'requests': 3, 'peak_memory': 1000},
+                    'lg': {'wall_time': 1.0, 'requests': 6, 'peak_memory': 1000}}
+        results = {'la': {'wall_time': 1.1, 'requests': 3, 'peak_memory': 2000},
+                   'lg': {'wall_time': 0.5, 'requests': 7, 'peak_memory': 1000},
+                   'lann': {'wall_time': 9.0, 'requests': 2, 'peak_memory': 1000}}
+        self.assertEqual(['lg'], regressions(results, baseline))
+        self.assertEqual(['la', 'lg'], regressions(results, baseline, threshold=0.05))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = join(directory, 'baselines.json')
+            save_baseline(path, 'before', {'latency': 0}, baseline)
+            save_baseline(path, 'after', {'latency': 0}, results)
+            self.assertEqual(baseline, load_baselines(path)['before']['results'])
+            self.assertEqual({'before', 'after'}, set(load_baselines(path)))
+
+    def test_compare_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = join(directory, 'baselines.json')
+            args = ['lc', '--courses', '1', '--assignments', '5', '--announcements', '5', '--files', '5',
+                    '--latency', '0', '-r', '1', '--baselines', path]
+            with redirect_stdout(io.StringIO()) as output:
+                self.assertEqual(0, main(args + ['--save', 'before']))
+            self.assertIn('lc', output.getvalue())
+            self.assertNotIn('Regressed', output.getvalue())
+
+            baselines = load_baselines(path)
+            baselines['before']['results']['lc']['requests'] = -1
+            save_baseline(path, 'before', baselines['before']['settings'], baselines['before']['results'])
+            with redirect_stdout(io.StringIO()) as output:
+                self.assertEqual(1, main(args + ['--compare', 'before']))
+            self.assertTrue(output.getvalue().endswith('Regressed: lc\n'))
@@ -0,0 +1,244 @@
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+
+import requests_mock
+from canvasapi.course import Course
+
+from clanvas.cache import Cache, cached, make_key
+from clanvas.clanvas import Clanvas
+from clanvas.diskcache import DiskCache
+from clanvas.outputter import TABLE_BATCH
+from clanvas.pagination import PER_PAGE
+from tests.register import register_uris
+from tests.regression.test_regression import login_requirements
+from tests.settings import BASE_URL, BASE_URL_WITH_VERSION, API_KEY
+
+
+class Counter:
+    def __init__(self, disk_cache=None):
+        self.disk_cache = disk_cache
+        self.calls = 0
+
+    @cached(maxsize=2)
+    def square(self, x):
+        self.calls += 1
+        return x * x
+
+    @cached(ttl=timedelta(seconds=0))
+    def get_courses(self):
+        self.calls += 1
+        return {1: Course(None, {'id': 1, 'course_code': 'EECS 101'})}
+
+    @cached(ttl=timedelta(seconds=-1))
+    def history(self, x):
+        self.calls += 1
+        return [x]
+
+    @history.refresher
+    def history(self, previous, x):
+        return previous + [x]
+
+
+def topic(topic_id, posted_at):
+    return {'id': topic_id, 'title': f'Announcement {topic_id}', 'posted_at': posted_at, 'last_reply_at': posted_at}
+
+
+def wait_for(condition):
+    deadline = time.time() + 5
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestCache(unittest.TestCase):
+
+    def test_hits_and_lru_eviction(self):
+        counter = Counter()
+        counter.square(2)
+        counter.square(2)
+        counter.square(3)
+        counter.square(2)
+        counter.square(4)
+
+        self.assertEqual(3, counter.calls)
+        self.assertIsNone(counter.square.peek(3))
+        self.assertEqual(4, counter.square.peek(2))
+
+        stats = counter.square.stats()
+        self.assertEqual((2, 3, 1), (stats['hits'], stats['misses'], stats['evictions']))
+        self.assertEqual(['square'], list(counter._caches))
+
+    def test_max_age(self):
+        cache = Cache('f', lambda x: object(), max_age=timedelta(seconds=-1))
+        self.assertIsNot(cache(1), cache(1))
+        self.assertEqual(1, cache.stats()['expirations'])
+
+    def test_invalidate(self):
+        counter = Counter()
+        counter.square(2)
+        counter.square(3)
+        counter.square.invalidate(2)
+        counter.square(2)
+        counter.square(3)
+        self.assertEqual(3, counter.calls)
+
+    def test_single_flight(self):
+        release = threading.Event()
+        calls = []
+
+        def slow(x):
+            calls.append(x)
+            release.wait(5)
+            return x
+
+        cache = Cache('slow', slow)
+        threads = [threading.Thread(target=cache, args=(1,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        wait_for(lambda: calls)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([1], calls)
+        self.assertEqual({}, cache.key_locks)
+
+    def test_stale_disk_entry_served_then_refreshed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'cache.sqlite')
+
+            first = Counter(DiskCache(filename, 'example.com', '123', requester=None))
+            first.get_courses()
+            self.assertEqual(1, first.calls)
+
+            second = Counter(DiskCache(filename, 'example.com', '123', requester=None))
+            self.assertEqual('EECS 101', second.get_courses()[1].course_code)
+            wait_for(lambda: second.calls == 1 and not second.get_courses.refreshing)
+            self.assertEqual(1, second.calls)
+
+    def test_refresher_updates_stale_entry(self):
+        counter = Counter()
+        self.assertEqual([1], counter.history(1))
+        self.assertEqual([1], counter.history(1))
+        wait_for(lambda: not counter.history.refreshing)
+
+        self.assertEqual([1, 1], counter.history.peek(1))
+        self.assertEqual(1, counter.calls)
+
+    def test_full_load_once_older_than_max_age(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'cache.sqlite')
+            calls = []
+
+            def session():
+                return Cache('history', lambda x: calls.append('full') or [x], max_age=timedelta(days=1),
+                             refresher=lambda previous, x: calls.append('delta') or previous + [x],
+                             disk_cache=DiskCache(filename, 'example.com', '123', requester=None))
+
+            cache = session()
+            cache(1)
+            cache.refresh(1)
+            cache.full_loads[make_key((1,), {})] = time.time() - timedelta(days=2).total_seconds()
+            cache.refresh(1)
+            self.assertEqual(['full', 'delta', 'full'], calls)
+
+            cache = session()
+            cache(1)
+            cache.refresh(1)
+            self.assertEqual(['full', 'delta', 'full', 'delta'], calls)
+
+            cache.disk_cache.delete(cache.full_load_resource)
+            cache = session()
+            cache(1)
+            wait_for(lambda: len(calls) == 5 and not cache.refreshing)
+            self.assertEqual(['full', 'delta', 'full', 'delta', 'full'], calls)
+
+    def test_stream_yields_before_listing_completes(self):
+        pages = []
+
+        def streamer(x):
+            for page in [[3, 1], [2]]:
+                pages.append(page)
+                yield from page
+
+        cache = Cache('listing', lambda x: [1, 2, 3], streamer=streamer, order=lambda n: n)
+        elements = cache.stream(1)
+        self.assertEqual(3, next(elements))
+        self.assertEqual(1, len(pages))
+        self.assertIsNone(cache.peek(1))
+
+        self.assertEqual([1, 2], list(elements))
+        self.assertEqual([1, 2, 3], cache.peek(1))
+        self.assertEqual([1, 2, 3], cache.stream(1))
+        self.assertEqual((1, 1), (cache.stats()['hits'], cache.stats()['misses']))
+
+    def lines_printed_before_pages(self, command, output_format='text'):
+        """
+        Runs command with three pages of assignments to list, none cached yet.
+        :return: {page number: lines printed before the page was requested} and the Clanvas instance.
+        """
+        assignments_url = BASE_URL_WITH_VERSION + 'courses/13682/assignments'
+        printed_before_page = {}
+
+        def page(number, last=3):
+            def callback(request, context):
+                printed_before_page[number] = stdout.getvalue().count('\n')
+                links = [f'<{assignments_url}?page={last}&per_page={PER_PAGE}>; rel="last"']
+                if number < last:
+                    links.append(f'<{assignments_url}?page={number + 1}&per_page={PER_PAGE}>; rel="next"')
+                context.headers['Link'] = ', '.join(links)
+                return [{'id': number * 1000 + i, 'name': f'Assignment {number}.{i}', 'course_id': 13682,
+                         'created_at': '2018-08-28T14:00:00Z'} for i in range(PER_PAGE)]
+            return callback
+
+        with requests_mock.Mocker() as m:
+            register_uris(login_requirements, m)
+            m.get(assignments_url + f'?per_page={PER_PAGE}', complete_qs=True, json=page(1))
+            for number in [2, 3]:
+                m.get(assignments_url + f'?page={number}&per_page={PER_PAGE}', complete_qs=True, json=page(number))
+
+            clanvas = Clanvas(BASE_URL, API_KEY)
+            clanvas.get_courses()
+            clanvas.output_format = output_format
+            stdout = io.StringIO()
+            clanvas.stdout = stdout
+            clanvas.onecmd(command)
+            clanvas.stop_prefetching()
+        return printed_before_page, clanvas
+
+    def test_listing_printed_as_pages_arrive(self):
+        printed_before_page, clanvas = self.lines_printed_before_pages('la -l -c 13682')
+        self.assertEqual((0, TABLE_BATCH), (printed_before_page[1], printed_before_page[2]))
+        self.assertEqual(3 * PER_PAGE, len(clanvas.list_assignments_cached.peek(13682)))
+
+    def test_records_written_as_pages_arrive(self):
+        printed_before_page, _ = self.lines_printed_before_pages('la -c 13682', output_format='jsonl')
+        self.assertEqual((0, PER_PAGE), (printed_before_page[1], printed_before_page[2]))
+
+    def test_announcements_delta_sync(self):
+        topics_url = BASE_URL_WITH_VERSION + 'courses/13682/discussion_topics'
+        with requests_mock.Mocker() as m:
+            register_uris(login_requirements, m)
+            m.get(topics_url, [
+                {'json': [topic(2, '2018-10-02T12:00:00Z'), topic(1, '2018-10-01T12:00:00Z')]},
+                {'json': [topic(3, '2018-10-03T12:00:00Z'), topic(2, '2018-10-02T12:00:00Z'),
+                          topic(1, '2018-10-01T12:00:00Z')],
+                 'headers': {'Link': f'<{topics_url}?page=2>; rel="next"'}}])
+
+            clanvas = Clanvas(BASE_URL, API_KEY)
+            announcements = clanvas.list_announcements_cached
+            self.assertEqual([1, 2], [t.id for t in announcements(13682)])
+
+            announcements.ttl = -1
+            announcements(13682)
+            wait_for(lambda: not announcements.refreshing)
+            clanvas.stop_prefetching()
+
+            topic_requests = [r for r in m.request_history if r.path.endswith('/discussion_topics')]
+            self.assertEqual(2, len(topic_requests))
+            self.assertEqual(['recent_activity'], topic_requests[1].qs['order_by'])
+            self.assertEqual([1, 2, 3], [t.id for t in announcements.peek(13682)])
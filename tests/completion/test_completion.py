@@ -0,0 +1,70 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from clanvas.cache import Cache
+from clanvas.completion import CompletionIndex
+from clanvas.prefetch import PrefetchScheduler
+from clanvas.prefixindex import PrefixIndex
+
+
+class TestPrefixIndex(unittest.TestCase):
+
+    def test_prefix_search(self):
+        index = PrefixIndex([('Syllabus', 'syllabus'), ('Grades', 'grades'), ('Files', 'files'), ('Sys', 'sys')])
+        self.assertEqual(('syllabus', 'sys'), index.search('sy'))
+        self.assertEqual(('files',), index.search('FI'))
+        self.assertEqual(('syllabus', 'grades', 'files', 'sys'), index.search(''))
+        self.assertEqual((), index.search('x'))
+        self.assertEqual(4, len(index))
+
+    def test_substring_search(self):
+        index = PrefixIndex([('EECS345-6937', 'eecs345'), ('MATH121-7001', 'math121'), ('ESS101-1', 'ess101')],
+                            substrings=True)
+        self.assertEqual(('eecs345', 'ess101'), index.search('e'))
+        self.assertEqual(('eecs345',), index.search('s345'))
+        self.assertEqual(('eecs345', 'math121', 'ess101'), index.search(''))
+
+
+class TestCompletionIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = 0
+
+        def load_tabs(course_id):
+            self.loads += 1
+            return [SimpleNamespace(label=label) for label in ['Home', 'Grades', 'Groups']]
+
+        self.clanvas = SimpleNamespace(get_courses=Cache('get_courses', dict),
+                                       list_assignments_cached=Cache('list_assignments_cached', list),
+                                       list_announcements_cached=Cache('list_announcements_cached', list),
+                                       list_tabs_cached=Cache('list_tabs_cached', load_tabs))
+        self.index = CompletionIndex(self.clanvas)
+
+    def test_built_on_load_and_dropped_on_invalidate(self):
+        self.assertEqual(('Grades', 'Groups'), self.index.search('list_tabs_cached', 'gr', 1))
+        self.assertEqual(('Home',), self.index.search('list_tabs_cached', 'h', 1))
+        self.assertEqual(1, self.loads)
+
+        self.clanvas.list_tabs_cached.invalidate(1)
+        self.assertEqual({}, self.index.indexes)
+        self.assertEqual(('Grades',), self.index.search('list_tabs_cached', 'grad', 1))
+        self.assertEqual(2, self.loads)
+
+    def test_search_within_deadline(self):
+        release = threading.Event()
+
+        def load_slowly(course_id):
+            release.wait(5)
+            return [SimpleNamespace(label='Home')]
+
+        self.clanvas.list_tabs_cached = Cache('list_tabs_cached', load_slowly)
+        self.clanvas.prefetcher = PrefetchScheduler(workers=1)
+        self.index = CompletionIndex(self.clanvas)
+        try:
+            self.assertEqual((), self.index.search('list_tabs_cached', 'h', 1, deadline=time.monotonic() + 0.05))
+            release.set()
+            self.assertEqual(('Home',), self.index.search('list_tabs_cached', 'h', 1, deadline=time.monotonic() + 5))
+        finally:
+            self.clanvas.prefetcher.shutdown(wait=True)
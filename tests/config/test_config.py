@@ -1,7 +1,7 @@
 import unittest
 from os.path import join, dirname, abspath
 
-from clanvas.config import parse_clanvas_config_file
+from clanvas.config import parse_clanvas_config_file, InvalidClanvasConfigurationException
 
 
 def parse(filename):
@@ -13,6 +13,9 @@ expected_2 = {"site1": {"url": "https://canvas.website1.edu", "token": "1234~ZDU
 expected_3 = {"site1": {"url": "https://canvas.website1.edu", "token": "1234~ZDUtxyIhxCOYNwDd1Szk8KRy6YZ31jZduvmozrfmDhQe3bLfDTx7AnwPOqofxmfU"},
               "site2": {"url": "https://canvas.website2.edu", "token": "apW5q2kxoi9o6tUXM7gNKhvtOLMPrS49jZNbp7g9JRoMuKkKdhDLTRPD3sluDIzx"}}
 
+expected_4 = {"site1": {"url": "https://canvas.website1.edu", "token": "1234~ZDUtxyIhxCOYNwDd1Szk8KRy6YZ31jZduvmozrfmDhQe3bLfDTx7AnwPOqofxmfU",
+                        "poolsize": 64, "readtimeout": 120.0, "retries": 5}}
+
 
 class TestConfigParser(unittest.TestCase):
 
@@ -24,3 +27,10 @@ class TestConfigParser(unittest.TestCase):
 
     def test_3(self):
         self.assertDictEqual(expected_3, parse('config_3'))
+
+    def test_4(self):
+        self.assertDictEqual(expected_4, parse('config_4'))
+
+    def test_5(self):
+        with self.assertRaises(InvalidClanvasConfigurationException):
+            parse('config_5')
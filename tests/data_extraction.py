@@ -77,7 +77,7 @@ if __name__ == '__main__':
     parser.add_argument('--output', '-o', default=None, help='file to output the extracted data to')
     args = parser.parse_args()
 
-    url, token, _ = get_login_entry(args.hostname)
+    url, token, _, _ = get_login_entry(args.hostname)
     canvas = Canvas(url, token)
 
     if canvas is None:
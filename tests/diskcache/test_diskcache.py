@@ -0,0 +1,32 @@
+import os
+import tempfile
+import unittest
+
+from canvasapi.course import Course
+
+from clanvas.diskcache import DiskCache
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'cache.sqlite')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        cache = DiskCache(self.filename, 'example.com', '123', requester=None)
+        cache.put('get_courses', '[]', {1: Course(None, {'id': 1, 'course_code': 'EECS 101',
+                                                          'start_at': '2018-07-05T15:40:16Z'})})
+
+        courses, _ = cache.get('get_courses', '[]')
+        self.assertEqual({1}, set(courses))
+        self.assertIsInstance(courses[1], Course)
+        self.assertEqual('EECS 101', courses[1].course_code)
+        self.assertEqual(2018, courses[1].start_at_date.year)
+
+    def test_scoped_by_token(self):
+        DiskCache(self.filename, 'example.com', '123', requester=None).put('get_courses', '[]', {})
+        self.assertIsNone(DiskCache(self.filename, 'example.com', '456', requester=None).get('get_courses', '[]'))
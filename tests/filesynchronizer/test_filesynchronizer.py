@@ -0,0 +1,266 @@
+import itertools
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytz
+
+from clanvas.filesynchronizer import FileTree, pull_all_files, pull_file_tree, build_canvas_file_tree, \
+    traverse_canvas_file_tree
+from clanvas.outputter import Verbosity, bind_outputter
+
+
+class FakeResponse:
+    def __init__(self, status_code, body, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(f'{self.status_code} error')
+
+    def iter_content(self, chunk_size):
+        return (self.body[i:i + chunk_size] for i in range(0, len(self.body), chunk_size))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeSession:
+    def __init__(self, file):
+        self.file = file
+
+    def get(self, url, headers, stream):
+        self.file.requests.append(headers.get('Range'))
+        self.file.if_ranges.append(headers.get('If-Range'))
+        if self.file.fail:
+            return FakeResponse(500, b'')
+        etag = {'ETag': f'"{hash(self.file.contents)}"'}
+        if 'Range' in headers and headers.get('If-Range', etag['ETag']) == etag['ETag']:
+            start = int(headers['Range'][len('bytes='):-1])
+            return FakeResponse(206, self.file.contents[start:self.file.served], etag)
+        return FakeResponse(200, self.file.contents[:self.file.served], etag)
+
+
+class FakeFile:
+    ids = itertools.count(1)
+
+    def __init__(self, filename, contents, modified_at, fail=False):
+        self.id = next(FakeFile.ids)
+        self.filename = filename
+        self.contents = contents
+        self.size = len(contents)
+        self.url = f'https://example.com/files/{filename}/download'
+        self.modified_at_date = modified_at
+        self.fail = fail
+        self.served = None  # bytes served before the connection drops, all if None
+        self.requests = []
+        self.if_ranges = []
+        self._requester = SimpleNamespace(access_token='123', _session=FakeSession(self))
+
+
+class FakeFolder:
+    def __init__(self, name, folders=(), files=()):
+        self.name = name
+        self.folders = folders
+        self.files = files
+
+    def get_folders(self):
+        return iter(self.folders)
+
+    def get_files(self):
+        return iter(self.files)
+
+
+def tree_listing(tree):
+    return ([(tree.path, sorted(file.filename for file in tree.files))]
+            + [entry for folder in tree.folders for entry in tree_listing(folder)])
+
+
+MODIFIED = datetime(2018, 9, 1, 12, 0, tzinfo=pytz.utc)
+
+
+class TestPullFileTree(unittest.TestCase):
+
+    def setUp(self):
+        self.output = []
+        bind_outputter(self.output.append, lambda: Verbosity.NORMAL)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_downloads_and_skips_up_to_date(self):
+        syllabus = FakeFile('syllabus.pdf', b'syllabus', MODIFIED)
+        lecture = FakeFile('lecture1.ppt', b'slides', MODIFIED)
+        tree = FileTree('.', [FileTree('./Lectures', [], [lecture])], [syllabus])
+
+        self.assertTrue(pull_file_tree(self.directory.name, tree, jobs=2))
+        self.assertTrue(pull_file_tree(self.directory.name, tree, jobs=2))
+
+        self.assertEqual([None], syllabus.requests)
+        self.assertEqual([None], lecture.requests)
+        lecture_path = os.path.join(self.directory.name, 'Lectures', 'lecture1.ppt')
+        self.assertEqual(MODIFIED.timestamp(), os.stat(lecture_path).st_mtime)
+
+    def test_failures_do_not_stop_other_downloads(self):
+        files = [FakeFile('b.pdf', b'b', MODIFIED, fail=True),
+                 FakeFile('c.pdf', b'c', MODIFIED),
+                 FakeFile('a.pdf', b'a', MODIFIED, fail=True)]
+
+        self.assertFalse(pull_file_tree(self.directory.name, FileTree('.', [], files), jobs=3))
+
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, 'c.pdf')))
+        failures = [line for line in self.output if line.startswith('Failed')]
+        self.assertEqual(['Failed to download a.pdf: 500 error\n',
+                          'Failed to download b.pdf: 500 error\n'], failures)
+
+    def test_pull_all_files_reports_failed_downloads(self):
+        files = [FakeFile('a.pdf', b'a', MODIFIED, fail=True), FakeFile('b.pdf', b'b', MODIFIED)]
+        for file in files:
+            file.folder_id = 1
+        root = SimpleNamespace(id=1, name='course files', parent_folder_id=None)
+        course = SimpleNamespace(get_folders=lambda: [root], get_files=lambda: files)
+
+        self.assertFalse(pull_all_files(self.directory.name, course))
+        files[0].fail = False
+        self.assertTrue(pull_all_files(self.directory.name, course))
+
+    def test_resumes_partial_download(self):
+        video = FakeFile('video.mp4', b'0123456789', MODIFIED)
+        video.served = 4
+        self.assertFalse(pull_file_tree(self.directory.name, FileTree('.', [], [video])))
+
+        video.served = None
+        self.assertTrue(pull_file_tree(self.directory.name, FileTree('.', [], [video])))
+
+        video_path = os.path.join(self.directory.name, 'video.mp4')
+        self.assertEqual([None, 'bytes=4-'], video.requests)
+        self.assertEqual([None, f'"{hash(video.contents)}"'], video.if_ranges)
+        self.assertEqual([], [name for name in os.listdir(self.directory.name) if '.part' in name])
+        with open(video_path, 'rb') as f:
+            self.assertEqual(b'0123456789', f.read())
+
+    def test_partial_download_of_changed_file_is_discarded(self):
+        video = FakeFile('video.mp4', b'0123456789', MODIFIED)
+        video.served = 4
+        self.assertFalse(pull_file_tree(self.directory.name, FileTree('.', [], [video])))
+
+        video.contents, video.served = b'abcdefghij', None
+        video.modified_at_date = datetime(2018, 9, 2, 12, 0, tzinfo=pytz.utc)
+        self.assertTrue(pull_file_tree(self.directory.name, FileTree('.', [], [video])))
+
+        self.assertEqual([None, None], video.requests)
+        with open(os.path.join(self.directory.name, 'video.mp4'), 'rb') as f:
+            self.assertEqual(b'abcdefghij', f.read())
+
+    def test_changed_file_with_same_metadata_restarts_through_if_range(self):
+        video = FakeFile('video.mp4', b'0123456789', MODIFIED)
+        video.served = 4
+        self.assertFalse(pull_file_tree(self.directory.name, FileTree('.', [], [video])))
+
+        video.contents, video.served = b'abcdefghij', None
+        self.assertTrue(pull_file_tree(self.directory.name, FileTree('.', [], [video])))
+
+        self.assertEqual([None, 'bytes=4-'], video.requests)
+        with open(os.path.join(self.directory.name, 'video.mp4'), 'rb') as f:
+            self.assertEqual(b'abcdefghij', f.read())
+
+    def test_truncated_download_is_not_moved_into_place(self):
+        video = FakeFile('video.mp4', b'0123456789', MODIFIED)
+        video.size = 20
+
+        self.assertFalse(pull_file_tree(self.directory.name, FileTree('.', [], [video])))
+
+        video_path = os.path.join(self.directory.name, 'video.mp4')
+        self.assertFalse(os.path.exists(video_path))
+        self.assertEqual(10, os.path.getsize(video_path + '.part'))
+
+
+class TestDiscoverFileTree(unittest.TestCase):
+
+    expected = [('.', ['syllabus.pdf']), ('./Lectures', ['lecture1.ppt', 'lecture2.ppt']),
+                ('./Lectures/Extra', ['notes.txt']), ('./Homework', [])]
+
+    def test_build_from_flat_listings(self):
+        folders = [SimpleNamespace(id=1, name='course files', parent_folder_id=None),
+                   SimpleNamespace(id=2, name='Lectures', parent_folder_id=1),
+                   SimpleNamespace(id=3, name='Homework', parent_folder_id=1),
+                   SimpleNamespace(id=4, name='Extra', parent_folder_id=2)]
+        files = [SimpleNamespace(filename='lecture2.ppt', folder_id=2),
+                 SimpleNamespace(filename='notes.txt', folder_id=4),
+                 SimpleNamespace(filename='syllabus.pdf', folder_id=1),
+                 SimpleNamespace(filename='lecture1.ppt', folder_id=2)]
+
+        self.assertEqual(self.expected, tree_listing(build_canvas_file_tree(folders, files)))
+
+    def test_breadth_first_traversal(self):
+        def file(name):
+            return SimpleNamespace(filename=name)
+
+        root = FakeFolder('course files', [
+            FakeFolder('Lectures', [FakeFolder('Extra', files=[file('notes.txt')])],
+                       [file('lecture1.ppt'), file('lecture2.ppt')]),
+            FakeFolder('Homework')
+        ], [file('syllabus.pdf')])
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(self.expected, tree_listing(traverse_canvas_file_tree(root, executor)))
+
+
+class TestSyncManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.output = []
+        bind_outputter(self.output.append, lambda: Verbosity.NORMAL)
+        self.directory = tempfile.TemporaryDirectory()
+        self.syllabus = FakeFile('syllabus.pdf', b'syllabus', MODIFIED)
+        self.lecture = FakeFile('lecture1.ppt', b'slides', MODIFIED)
+        pull_file_tree(self.directory.name, FileTree('.', [], [self.syllabus, self.lecture]))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, *components):
+        return os.path.join(self.directory.name, *components)
+
+    def test_moved_on_canvas(self):
+        tree = FileTree('.', [FileTree('./Lectures', [], [self.lecture])], [self.syllabus])
+        self.lecture.requests.clear()
+
+        self.assertTrue(pull_file_tree(self.directory.name, tree))
+
+        self.assertEqual([], self.lecture.requests)
+        self.assertFalse(os.path.exists(self.path('lecture1.ppt')))
+        self.assertTrue(os.path.exists(self.path('Lectures', 'lecture1.ppt')))
+
+    def test_deleted_on_canvas(self):
+        tree = FileTree('.', [], [self.syllabus])
+
+        pull_file_tree(self.directory.name, tree)
+        self.assertTrue(os.path.exists(self.path('lecture1.ppt')))
+        self.assertIn('Deleted on Canvas: lecture1.ppt\n', self.output)
+
+        pull_file_tree(self.directory.name, tree, delete=True)
+        self.assertFalse(os.path.exists(self.path('lecture1.ppt')))
+
+    def test_local_changes_are_kept(self):
+        with open(self.path('syllabus.pdf'), 'wb') as f:
+            f.write(b'annotated syllabus')
+        self.syllabus.modified_at_date = datetime(2018, 9, 2, tzinfo=pytz.utc)
+
+        pull_file_tree(self.directory.name, FileTree('.', [], [self.syllabus, self.lecture]), delete=True)
+
+        self.assertIn('Conflict: syllabus.pdf changed locally and on Canvas, keeping local copy\n', self.output)
+        with open(self.path('syllabus.pdf'), 'rb') as f:
+            self.assertEqual(b'annotated syllabus', f.read())
@@ -0,0 +1,23 @@
+import unittest
+from types import SimpleNamespace
+
+from clanvas.lister import calculate_group_ratio, course_grade_ratio
+
+
+class TestGrades(unittest.TestCase):
+
+    def test_cached_group_ratio_follows_submissions(self):
+        group = SimpleNamespace(id=7001, group_weight=40.0)
+        homework = SimpleNamespace(points_possible=20.0)
+
+        self.assertEqual(0.5, calculate_group_ratio(group, [(homework, SimpleNamespace(score=10.0))])[0])
+        self.assertEqual(0.75, calculate_group_ratio(group, [(homework, SimpleNamespace(score=15.0))])[0])
+
+    def test_course_ratio_weighs_groups(self):
+        homework = SimpleNamespace(id=7001, group_weight=40.0)
+        exams = SimpleNamespace(id=7002, group_weight=60.0)
+        assignment = SimpleNamespace(points_possible=20.0)
+
+        groups_item = [(homework, [(assignment, SimpleNamespace(score=10.0)), (assignment, None)]),
+                       (exams, [(assignment, SimpleNamespace(score=20.0))])]
+        self.assertAlmostEqual(0.4 * 0.5 + 0.6, course_grade_ratio(groups_item))
@@ -0,0 +1,105 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from os.path import join
+
+import requests_mock
+from requests.exceptions import ConnectionError
+
+from clanvas.batch import EXIT_OK, run_batch
+from clanvas.cache import Cache
+from clanvas.clanvas import Clanvas
+from clanvas.offline import NotAvailableOfflineException, OfflineMode
+from tests.register import register_uris
+from tests.regression.test_regression import compose_requirements, grades_requirements, login_requirements
+from tests.settings import BASE_URL, BASE_URL_WITH_VERSION, API_KEY
+
+announcement = {'id': 5001, 'title': 'Midterm moved', 'message': '<p>The midterm is on <b>Friday</b>.</p>',
+                'posted_at': '2018-10-01T12:00:00Z', 'user_name': 'Professor Oak'}
+
+read_commands = ['whoami', 'lc', 'la -c 13682', 'lg -c 13682', 'lann -c 13682', 'catann -c 13682 5001']
+
+
+class TestOffline(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_file = join(self.directory.name, 'cache.sqlite')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_session(self, *commands, online=True):
+        with requests_mock.Mocker() as m:
+            if online:
+                register_uris(compose_requirements(login_requirements, grades_requirements), m)
+                m.get(BASE_URL_WITH_VERSION + 'courses/13682/discussion_topics', json=[announcement])
+                m.get(BASE_URL_WITH_VERSION + 'courses/13682/discussion_topics/5001', json=announcement)
+            else:
+                m.register_uri(requests_mock.ANY, requests_mock.ANY, exc=ConnectionError)
+
+            clanvas = Clanvas(BASE_URL, API_KEY, cache_file=self.cache_file)
+            stdout, stderr = io.StringIO(), io.StringIO()
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                clanvas.stdout = stdout
+                status = run_batch(clanvas, commands, keep_going=True)
+            clanvas.stop_prefetching()
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_reads_answered_from_snapshot(self):
+        self.run_session(*read_commands)  # listings not cached yet are printed in the order Canvas sends them
+        status, online_output, _ = self.run_session(*read_commands)
+        self.assertEqual(EXIT_OK, status)
+        self.assertIn('Midterm moved', online_output)
+
+        status, offline_output, feedback = self.run_session('set offline true', *read_commands, online=False)
+        self.assertEqual(EXIT_OK, status)
+        self.assertTrue(offline_output.endswith(online_output))
+        self.assertEqual(len(read_commands), feedback.count('offline: saved data from just now'))
+
+    def test_connection_failure_switches_offline(self):
+        self.run_session('lann -c 13682')
+
+        status, output, feedback = self.run_session('catann -c 13682 5001', 'lg -c 13682', online=False)
+        self.assertIn('The midterm is on **Friday**.', output)
+        self.assertIn('offline: could not connect to example.com', feedback)
+        self.assertIn('Not available offline', output)
+
+    def test_uploads_queued(self):
+        self.run_session('la -c 13682')
+
+        with open(join(self.directory.name, 'homework.pdf'), 'w') as f:
+            f.write('homework')
+
+        _, output, _ = self.run_session('set offline true', f'ua -c 13682 40002 {f.name}',
+                                        'ua -c 13682 99 ' + f.name, 'outbox -s', online=False)
+        self.assertIn(f'Offline, queued {f.name} for "Homework 2"', output)
+        self.assertIn('Invalid assignment ID.', output)
+        self.assertIn('outbox: cannot send while offline', output)
+
+        _, output, _ = self.run_session('outbox', 'outbox --clear', 'outbox', online=False)
+        self.assertRegex(output, r'EECS455-13682 +Homework 2 +' + f.name)
+        self.assertTrue(output.endswith('No queued submissions.\n'))
+
+    def test_cache_falls_back_to_snapshot(self):
+        offline = OfflineMode()
+        responses = [{'id': 1}]
+
+        def loader():
+            if not responses:
+                raise ConnectionError('no network')
+            return responses.pop()
+
+        cache = Cache('profile', loader, offline=offline)
+        self.assertEqual({'id': 1}, cache())
+
+        cache.invalidate()
+        self.assertRaises(NotAvailableOfflineException, cache)
+        self.assertTrue(offline.active)
+        self.assertTrue(offline.automatic)
+
+        offline.set_enabled(False)
+        responses.append({'id': 2})
+        self.assertEqual({'id': 2}, cache())
+        self.assertFalse(offline.active)
@@ -0,0 +1,36 @@
+import unittest
+from contextlib import contextmanager
+
+from tabulate import tabulate
+
+from clanvas.outputter import Outputter, Verbosity, TABLE_BATCH
+
+
+class TestStreamingTable(unittest.TestCase):
+
+    def setUp(self):
+        self.output = []
+        self.outputter = Outputter(self.output.append, lambda: Verbosity.NORMAL)
+
+    def test_matches_tabulate_plain(self):
+        rows = [[40003, '10-10 06:00PM', 'Midterm', ''], [2, '', 'Homework 2', None], [101, '09-04 03:59AM', 'HW', 7]]
+        self.outputter.ptable(rows)
+        self.assertEqual(tabulate(rows, tablefmt='plain') + '\n', ''.join(self.output))
+
+    def test_rows_printed_as_produced(self):
+        produced = []
+
+        def rows():
+            for i in range(TABLE_BATCH + 2):
+                produced.append(i)
+                yield [i, 'row']
+
+        def pager(printfn, num_lines):
+            self.assertEqual(TABLE_BATCH, num_lines)
+            return contextmanager(lambda: (yield lambda line: printfn((len(produced), line))))()
+
+        Outputter(self.output.append, lambda: Verbosity.NORMAL, pagerfn=pager).ptable(rows())
+
+        self.assertEqual((TABLE_BATCH, ' 0  row\n'), self.output[0])
+        self.assertEqual((TABLE_BATCH + 1, '100  row\n'), self.output[TABLE_BATCH])
+        self.assertEqual(TABLE_BATCH + 2, len(self.output))
@@ -0,0 +1,91 @@
+import threading
+import unittest
+
+import requests_mock
+from canvasapi import Canvas
+from canvasapi.assignment import Assignment
+from canvasapi.paginated_list import PaginatedList
+
+from clanvas.pagination import fetch_all
+from clanvas.prefetch import is_background_thread, mark_background_thread
+
+API = 'https://example.com/api/v1/'
+
+
+def link_header(*links):
+    return ', '.join(f'<{API}courses/1/assignments?{query}>; rel="{rel}"' for rel, query in links)
+
+
+class TestPagination(unittest.TestCase):
+
+    def setUp(self):
+        self.requester = Canvas('https://example.com', '123')._Canvas__requester
+
+    def assignments(self):
+        return PaginatedList(Assignment, self.requester, 'GET', 'courses/1/assignments', {'course_id': 1})
+
+    def page(self, number, last):
+        links = [('current', f'page={number}&per_page=100'), ('first', 'page=1&per_page=100'),
+                 ('last', f'page={last}&per_page=100')]
+        if number < last:
+            links.append(('next', f'page={number + 1}&per_page=100'))
+        return {'json': [{'id': number * 10 + i, 'name': f'{number}.{i}'} for i in range(2)],
+                'headers': {'Link': link_header(*links)}}
+
+    def test_remaining_pages_fetched_from_last_link_in_order(self):
+        threads = {}
+
+        def page_callback(number):
+            def callback(request, context):
+                threads[number] = threading.current_thread()
+                context.headers['Link'] = self.page(number, 3)['headers']['Link']
+                return self.page(number, 3)['json']
+            return callback
+
+        with requests_mock.Mocker() as m:
+            m.get(API + 'courses/1/assignments?per_page=100', complete_qs=True, **self.page(1, 3))
+            m.get(API + 'courses/1/assignments?page=3&per_page=100', complete_qs=True, json=page_callback(3))
+            m.get(API + 'courses/1/assignments?page=2&per_page=100', complete_qs=True, json=page_callback(2))
+
+            assignments = fetch_all(self.assignments())
+            self.assertEqual(3, m.call_count)
+
+        self.assertEqual([10, 11, 20, 21, 30, 31], [assignment.id for assignment in assignments])
+        self.assertEqual([1] * 6, [assignment.course_id for assignment in assignments])
+        self.assertNotIn(threading.current_thread(), threads.values())
+
+    def test_page_workers_inherit_background_marking(self):
+        background = {}
+
+        def page_callback(number):
+            def callback(request, context):
+                background[number] = is_background_thread()
+                context.headers['Link'] = self.page(number, 3)['headers']['Link']
+                return self.page(number, 3)['json']
+            return callback
+
+        def prefetch():
+            mark_background_thread()
+            fetch_all(self.assignments())
+
+        with requests_mock.Mocker() as m:
+            m.get(API + 'courses/1/assignments?per_page=100', complete_qs=True, json=page_callback(1))
+            m.get(API + 'courses/1/assignments?page=2&per_page=100', complete_qs=True, json=page_callback(2))
+            m.get(API + 'courses/1/assignments?page=3&per_page=100', complete_qs=True, json=page_callback(3))
+
+            thread = threading.Thread(target=prefetch)
+            thread.start()
+            thread.join()
+            self.assertEqual({1: True, 2: True, 3: True}, background)
+
+            fetch_all(self.assignments())
+            self.assertEqual({1: False, 2: False, 3: False}, background)
+
+    def test_bookmark_pages_followed_sequentially(self):
+        with requests_mock.Mocker() as m:
+            m.get(API + 'courses/1/assignments?per_page=100', complete_qs=True, json=[{'id': 1}],
+                  headers={'Link': link_header(('next', 'page=bookmark:abc&per_page=100'))})
+            m.get(API + 'courses/1/assignments?page=bookmark:abc&per_page=100', json=[{'id': 2}])
+
+            self.assertEqual([1, 2], [assignment.id for assignment in fetch_all(self.assignments())])
+            self.assertEqual(2, m.call_count)
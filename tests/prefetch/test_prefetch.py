@@ -0,0 +1,44 @@
+import threading
+import unittest
+
+from clanvas.prefetch import PrefetchScheduler, INTERACTIVE, CURRENT_COURSE, BACKGROUND
+
+
+class TestPrefetchScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = PrefetchScheduler(workers=1)
+        self.release = threading.Event()
+        self.calls = []
+        self.scheduler.submit(self.release.wait, 5, priority=INTERACTIVE)
+
+    def tearDown(self):
+        self.release.set()
+        self.scheduler.shutdown(wait=True)
+
+    def record(self, name):
+        self.calls.append(name)
+
+    def test_priority_order_and_promotion(self):
+        self.scheduler.submit(self.record, 'announcements', priority=BACKGROUND)
+        self.scheduler.submit(self.record, 'tabs', priority=BACKGROUND)
+        self.scheduler.submit(self.record, 'tabs', priority=CURRENT_COURSE)
+        self.scheduler.submit(self.record, 'tabs', priority=BACKGROUND)
+        self.scheduler.submit(self.record, 'profile', priority=INTERACTIVE)
+
+        done = threading.Event()
+        self.scheduler.submit(done.set, priority=BACKGROUND + 1)
+        self.release.set()
+        done.wait(5)
+
+        self.assertEqual(['profile', 'tabs', 'announcements'], self.calls)
+
+    def test_shutdown_cancels_queued_calls(self):
+        self.scheduler.submit(self.record, 'assignments', priority=BACKGROUND)
+        self.scheduler.shutdown()
+        self.scheduler.submit(self.record, 'tabs', priority=INTERACTIVE)
+        self.release.set()
+        for thread in self.scheduler.threads:
+            thread.join(5)
+
+        self.assertEqual([], self.calls)
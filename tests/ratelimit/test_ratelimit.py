@@ -0,0 +1,86 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import requests
+import requests_mock
+from canvasapi.requester import Requester
+
+from clanvas import ratelimit
+from clanvas.ratelimit import RateLimiter
+from clanvas.transport import configure_requester
+from tests.settings import BASE_URL_WITH_VERSION, API_KEY
+
+
+def response(status_code=200, text='', **headers):
+    return SimpleNamespace(status_code=status_code, text=text, headers=headers)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_throttling_halves_concurrency_and_pauses(self):
+        limiter = RateLimiter(max_concurrency=8)
+        limiter.update(response(403, '403 Forbidden (Rate Limit Exceeded)'))
+        self.assertEqual(4, limiter.limit)
+        self.assertGreater(limiter.paused_until, time.monotonic())
+
+        limiter.update(response(403, '403 Forbidden (Rate Limit Exceeded)'))
+        self.assertEqual((2, 2 * ratelimit.MIN_BACKOFF), (limiter.limit, limiter.backoff))
+
+        limiter.update(response(200))
+        self.assertEqual((3, 0.0), (limiter.limit, limiter.backoff))
+
+    def test_background_keeps_reserve_for_interactive(self):
+        limiter = RateLimiter(reserve=300, refill_rate=0.001)
+        limiter.update(response(**{'X-Rate-Limit-Remaining': '250', 'X-Request-Cost': '1.5'}))
+
+        started = threading.Event()
+
+        def background():
+            with limiter.slot(background=True):
+                started.set()
+
+        thread = threading.Thread(target=background, daemon=True)
+        thread.start()
+        self.assertFalse(started.wait(0.1))
+
+        with limiter.slot():
+            self.assertEqual(1, limiter.in_flight)
+
+        limiter.update(response(**{'X-Rate-Limit-Remaining': '700'}))
+        self.assertTrue(started.wait(5))
+        thread.join()
+
+    def test_session_retries_throttled_requests(self):
+        requester = Requester(BASE_URL_WITH_VERSION, API_KEY)
+        session = configure_requester(requester)
+
+        with requests_mock.Mocker() as m, mock.patch.object(ratelimit, 'MIN_BACKOFF', 0.01):
+            m.get(BASE_URL_WITH_VERSION + 'users/self', [
+                {'status_code': 403, 'text': '403 Forbidden (Rate Limit Exceeded)'},
+                {'json': {'id': 101}, 'headers': {'X-Rate-Limit-Remaining': '690', 'X-Request-Cost': '2'}}])
+            m.get('https://files.example.org/file', text='contents')
+
+            self.assertEqual({'id': 101}, requester.request('GET', 'users/self').json())
+            self.assertEqual(2, m.call_count)
+            self.assertEqual(1, session.limiter.throttles)
+            self.assertAlmostEqual(690, session.limiter.remaining)
+
+            session.get('https://files.example.org/file')
+            self.assertEqual(0, session.limiter.in_flight)
+
+    def test_throttled_responses_are_closed(self):
+        requester = Requester(BASE_URL_WITH_VERSION, API_KEY)
+        configure_requester(requester)
+        throttled = {'status_code': 403, 'text': '403 Forbidden (Rate Limit Exceeded)'}
+
+        with requests_mock.Mocker() as m, mock.patch.object(ratelimit, 'MIN_BACKOFF', 0.01), \
+                mock.patch.object(requests.Response, 'close', autospec=True) as close:
+            m.get(BASE_URL_WITH_VERSION + 'users/self', [throttled, throttled, {'json': {'id': 101}}])
+
+            response = requester.request('GET', 'users/self')
+            self.assertEqual(3, m.call_count)
+            self.assertEqual(2, close.call_count)
+            self.assertNotIn(response, [call[0][0] for call in close.call_args_list])
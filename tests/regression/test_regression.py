@@ -1,3 +1,5 @@
+import io
+import json
 import os
 import unittest
 from argparse import ArgumentParser
@@ -12,6 +14,21 @@ from tests.register import register_uris
 
 login_requirements = {'user': {'self', 'profile'}, 'courses': {'courses'}}
 
+grades_requirements = {'grades': {'assignments', 'submissions', 'assignment_groups'}}
+
+all_grades_requirements = {'grades': {'assignments', 'submissions', 'assignment_groups',
+                                      'unauthorized_assignments', 'unauthorized_submissions',
+                                      'unauthorized_assignment_groups',
+                                      'empty_assignments', 'empty_submissions', 'empty_assignment_groups'}}
+
+
+def compose_requirements(*args):
+    def merge_dicts(d1, d2):
+        keys = set(d1).union(d2)
+        return dict((k, d1.get(k, set()) | d2.get(k, set())) for k in keys)
+    return reduce(merge_dicts, args)
+
+
 script_requirements = {
     'whoami': {
         'whoami': login_requirements,
@@ -22,6 +39,23 @@ script_requirements = {
         'lc_long': login_requirements,
         'lc_all': login_requirements,
         'lc_long_all': login_requirements
+    },
+    'lg': {
+        'lg': compose_requirements(login_requirements, grades_requirements),
+        'lg_hide_ungraded': compose_requirements(login_requirements, grades_requirements),
+        'lg_all': compose_requirements(login_requirements, all_grades_requirements),
+        'lg_all_expand': compose_requirements(login_requirements, all_grades_requirements)
+    }
+}
+
+# JSONL listings are compared line by line with <command dir>/<name>.jsonl rather than through transcripts,
+# since cmd2 transcripts cannot set the output format before the command being tested
+jsonl_scripts = {
+    'lc': {
+        'lc_jsonl': ('lc -a', login_requirements)
+    },
+    'lg': {
+        'lg_all_jsonl': ('lg --all --expand', compose_requirements(login_requirements, all_grades_requirements))
     }
 }
 
@@ -34,12 +68,27 @@ class TestRegression(unittest.TestCase):
                 with self.subTest():
                     test_transcript(command_name, script_name)
 
+    def test_jsonl_regression(self):
+        for command_name, scripts in jsonl_scripts.items():
+            for script_name, (command, requirements) in scripts.items():
+                with self.subTest(script=script_name):
+                    with open(join(dirname(abspath(__file__)), command_name, script_name + '.jsonl')) as f:
+                        expected = [json.loads(line) for line in f]
+                    self.assertEqual(expected, run_jsonl(command, requirements))
 
-def compose_requirements(*args):
-    def merge_dicts(d1, d2):
-        keys = set(d1).union(d2)
-        return dict((k, d1.get(k, set()) + d2.get(k, set())) for k in keys)
-    return reduce(merge_dicts, args)
+
+def run_jsonl(command, requirements):
+    """
+    :return: the records a command prints with the JSONL output format.
+    """
+    with requests_mock.Mocker() as m:
+        register_uris(requirements, m)
+        clanvas = Clanvas('https://example.com', '123')
+        clanvas.output_format = 'jsonl'
+        clanvas.stdout = io.StringIO()
+        clanvas.onecmd(command)
+        clanvas.stop_prefetching()
+    return [json.loads(line) for line in clanvas.stdout.getvalue().splitlines()]
 
 
 def generate_transcript(command_name, script_name):
@@ -53,7 +102,7 @@ def _generate_transcript(clanvas_file, output_file):
         for line in f.readlines():
             clanvas.onecmd(line)
 
-    clanvas.onecmd(f'history 2: -t "{output_file}"')
+    clanvas.onecmd(f'history 1: -t "{output_file}"')
 
 
 def test_transcript(command_name, script_name):
@@ -0,0 +1,44 @@
+import tempfile
+import unittest
+from os.path import join
+from types import SimpleNamespace
+from unittest import mock
+
+from clanvas import rendering
+from clanvas.diskcache import DiskCache
+from clanvas.rendering import RenderCache, PROCESS_POOL_THRESHOLD
+
+
+def topic(topic_id, message, updated_at='2019-01-01T00:00:00Z'):
+    return SimpleNamespace(id=topic_id, message=message, updated_at=updated_at)
+
+
+class TestRenderCache(unittest.TestCase):
+
+    def test_cached_by_id_and_edit_time(self):
+        cache = RenderCache(processes=1)
+        with mock.patch.object(rendering, 'render_html', wraps=rendering.render_html) as render_html:
+            self.assertEqual(['**bold**'], cache([topic(1, '<b>bold</b>')]))
+            self.assertEqual(['**bold**'], cache([topic(1, '<b>bold</b>')]))
+            self.assertEqual(['_edited_'], cache([topic(1, '<i>edited</i>', updated_at='2019-01-02T00:00:00Z')]))
+        self.assertEqual(2, render_html.call_count)
+
+    def test_edit_without_updated_at_is_rendered_again(self):
+        cache = RenderCache(processes=1)
+        posted = SimpleNamespace(id=1, message='<b>bold</b>', posted_at='2019-01-01T00:00:00Z')
+        self.assertEqual(['**bold**'], cache([posted]))
+        self.assertEqual(['_edited_'], cache([SimpleNamespace(**dict(vars(posted), message='<i>edited</i>'))]))
+
+    def test_disk_cache_and_process_pool(self):
+        with tempfile.TemporaryDirectory() as directory:
+            disk_cache = DiskCache(join(directory, 'cache.sqlite'), 'example.com', '123', None)
+            topics = [topic(i, f'<p>announcement {i}</p>') for i in range(PROCESS_POOL_THRESHOLD)]
+
+            rendered = RenderCache(disk_cache, processes=2)(topics)
+            self.assertEqual([f'announcement {i}' for i in range(PROCESS_POOL_THRESHOLD)], rendered)
+            self.assertEqual(rendered[::-1], RenderCache(processes=2)(topics[::-1]))
+            self.assertIs(rendering.process_pool(2), rendering.process_pool(2))
+
+            with mock.patch.object(rendering, 'render_all') as render_all:
+                self.assertEqual(rendered, RenderCache(disk_cache)(topics))
+            render_all.assert_not_called()
@@ -0,0 +1,65 @@
+import threading
+import unittest
+
+import requests
+import requests_mock
+
+from clanvas.prefetch import mark_background_thread
+from clanvas.stats import StatsRecorder, endpoint_name
+
+
+class TestStatsRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.recorder = StatsRecorder()
+        self.session = requests.Session()
+        self.recorder.instrument(self.session)
+
+    def test_endpoint_name(self):
+        self.assertEqual('GET courses/:id/assignments',
+                         endpoint_name('GET', 'https://example.com/api/v1/courses/123/assignments?per_page=100'))
+        self.assertEqual('GET users/:id/profile', endpoint_name('GET', 'https://example.com/api/v1/users/self/profile'))
+        self.assertEqual('GET files.example.com', endpoint_name('GET', 'https://files.example.com/abc?sig=1'))
+
+    def test_command_and_session_totals(self):
+        with requests_mock.Mocker(session=self.session) as m:
+            m.get('https://example.com/api/v1/courses/1/assignments', text='[]', headers={'Content-Length': '2'})
+            m.get('https://example.com/api/v1/courses/2/tabs', text='nope', status_code=401)
+
+            self.recorder.start_command('la', (3, 1))
+            self.session.get('https://example.com/api/v1/courses/1/assignments?per_page=100')
+            self.session.get('https://example.com/api/v1/courses/1/assignments?page=2&per_page=100')
+            self.recorder.finish_command((5, 2))
+
+            self.recorder.start_command('wopen', (5, 2))
+            self.session.get('https://example.com/api/v1/courses/2/tabs')
+            self.recorder.finish_command((5, 3))
+
+        last = self.recorder.last
+        self.assertEqual('wopen', last.command)
+        self.assertEqual((0, 1), (last.cache_hits, last.cache_misses))
+        self.assertEqual({'GET courses/:id/tabs'}, set(last.endpoints))
+        self.assertEqual(1, last.endpoints['GET courses/:id/tabs'].errors)
+
+        assignments = self.recorder.session.endpoints['GET courses/:id/assignments']
+        self.assertEqual((2, 1, 4), (assignments.requests, assignments.pages, assignments.bytes))
+        self.assertEqual(2, sum(assignments.histogram))
+        self.assertEqual((2, 2), (self.recorder.session.cache_hits, self.recorder.session.cache_misses))
+
+    def test_background_requests_not_attributed_to_command(self):
+        with requests_mock.Mocker(session=self.session) as m:
+            m.get('https://example.com/api/v1/courses/1/tabs', text='[]')
+
+            def prefetch():
+                mark_background_thread()
+                self.session.get('https://example.com/api/v1/courses/1/tabs')
+
+            self.recorder.start_command('lc', (0, 0))
+            thread = threading.Thread(target=prefetch)
+            thread.start()
+            thread.join()
+            self.recorder.finish_command((0, 0))
+
+        self.assertEqual({}, self.recorder.last.endpoints)
+        self.assertEqual(1, self.recorder.background.endpoints['GET courses/:id/tabs'].requests)
+        self.assertEqual(1, self.recorder.session.endpoints['GET courses/:id/tabs'].requests)
@@ -1,11 +1,46 @@
 import unittest
 
+from tests.batch.test_batch import TestBatch
+from tests.benchmark.test_benchmark import TestBenchmark
+from tests.cache.test_cache import TestCache
+from tests.completion.test_completion import TestPrefixIndex, TestCompletionIndex
 from tests.config.test_config import TestConfigParser
+from tests.diskcache.test_diskcache import TestDiskCache
+from tests.filesynchronizer.test_filesynchronizer import TestPullFileTree, TestDiscoverFileTree, TestSyncManifest
+from tests.lister.test_lister import TestGrades
+from tests.offline.test_offline import TestOffline
+from tests.outputter.test_outputter import TestStreamingTable
+from tests.pagination.test_pagination import TestPagination
+from tests.prefetch.test_prefetch import TestPrefetchScheduler
+from tests.ratelimit.test_ratelimit import TestRateLimiter
 from tests.regression.test_regression import TestRegression
+from tests.rendering.test_rendering import TestRenderCache
+from tests.stats.test_stats import TestStatsRecorder
+from tests.upload.test_upload import TestUpload
+from tests.watcher.test_watcher import TestWatcher
 
 
 if __name__ == '__main__':
     suite = unittest.TestSuite()
     suite.addTest(TestRegression())
     suite.addTest(TestConfigParser())
+    suite.addTest(TestDiskCache())
+    suite.addTest(TestPullFileTree())
+    suite.addTest(TestDiscoverFileTree())
+    suite.addTest(TestSyncManifest())
+    suite.addTest(TestCache())
+    suite.addTest(TestPrefetchScheduler())
+    suite.addTest(TestStatsRecorder())
+    suite.addTest(TestPagination())
+    suite.addTest(TestPrefixIndex())
+    suite.addTest(TestCompletionIndex())
+    suite.addTest(TestBatch())
+    suite.addTest(TestStreamingTable())
+    suite.addTest(TestRenderCache())
+    suite.addTest(TestOffline())
+    suite.addTest(TestWatcher())
+    suite.addTest(TestRateLimiter())
+    suite.addTest(TestUpload())
+    suite.addTest(TestBenchmark())
+    suite.addTest(TestGrades())
     unittest.TextTestRunner().run(suite)
@@ -0,0 +1,127 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from os.path import join
+from urllib.parse import parse_qs
+
+import requests_mock
+
+from clanvas.batch import EXIT_COMMAND_FAILED, EXIT_OK, run_batch
+from clanvas.clanvas import Clanvas
+from clanvas.uploader import MultipartFile, expand_file_patterns
+from tests.register import register_uris
+from tests.regression.test_regression import compose_requirements, grades_requirements, login_requirements
+from tests.settings import BASE_URL, BASE_URL_WITH_VERSION, API_KEY
+
+assignment = {'id': 40002, 'course_id': 13682, 'name': 'Homework 2',
+              'html_url': 'https://example.com/courses/13682/assignments/40002'}
+
+upload_url = 'https://files.example.org/upload'
+
+
+class TestUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.files = []
+        for name, contents in [('part1.txt', 'first part'), ('part2.txt', 'second part'), ('notes.md', 'notes')]:
+            path = join(self.directory.name, name)
+            with open(path, 'w') as f:
+                f.write(contents)
+            self.files.append(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_session(self, command, upload_responses):
+        """
+        :param upload_responses: function from the uploaded file name to the response of the upload step.
+        """
+        uploads = []
+
+        def upload(request, context):
+            self.assertIsInstance(request.body, MultipartFile)
+            body = request.body.read().decode('utf-8')
+            name = request.body.file.name
+            uploads.append((name, body))
+            context.status_code, context.headers, json = upload_responses(name)
+            return json
+
+        with requests_mock.Mocker() as m:
+            register_uris(compose_requirements(login_requirements, grades_requirements), m)
+            m.get(BASE_URL_WITH_VERSION + 'courses/13682/assignments/40002', json=assignment)
+            m.post(BASE_URL_WITH_VERSION + 'courses/13682/assignments/40002/submissions/self/files',
+                   json={'upload_url': upload_url, 'upload_params': {'key': 'abc'}})
+            m.post(upload_url, json=upload)
+            m.get(BASE_URL_WITH_VERSION + 'files/3/create_success', json={'id': 3})
+            submit = m.post(BASE_URL_WITH_VERSION + 'courses/13682/assignments/40002/submissions',
+                            json={'id': 1, 'assignment_id': 40002})
+
+            clanvas = Clanvas(BASE_URL, API_KEY)
+            stdout = io.StringIO()
+            with redirect_stdout(stdout), redirect_stderr(io.StringIO()):
+                clanvas.stdout = stdout
+                status = run_batch(clanvas, [command], keep_going=True)
+            clanvas.stop_prefetching()
+        return status, stdout.getvalue(), uploads, submit
+
+    def test_multipart_body_streams_file(self):
+        sent = []
+        body = MultipartFile([('key', 'abc')], self.files[0], progress=sent.append)
+        chunks = iter(lambda: body.read(7), b'')
+        contents = b''.join(chunks).decode('utf-8')
+        body.close()
+
+        self.assertEqual(len(body), len(contents))
+        self.assertEqual(len('first part'), sum(sent))
+        self.assertIn('name="key"\r\n\r\nabc\r\n', contents)
+        self.assertIn('filename="part1.txt"', contents)
+        self.assertTrue(contents.endswith(f'first part\r\n--{body.boundary}--\r\n'))
+
+    def test_expand_file_patterns(self):
+        files, unmatched = expand_file_patterns([join(self.directory.name, 'part*.txt'), self.files[0],
+                                                 join(self.directory.name, '*.pdf')])
+        self.assertEqual(self.files[:2], files)
+        self.assertEqual([join(self.directory.name, '*.pdf')], unmatched)
+
+    def test_files_submitted_together(self):
+        def upload_responses(name):
+            if name.endswith('part1.txt'):
+                return 302, {'Location': BASE_URL_WITH_VERSION + 'files/3/create_success'}, {}
+            return 201, {}, {'id': 4}
+
+        status, output, uploads, submit = self.run_session(
+            f'ua -c 13682 40002 {join(self.directory.name, "part*.txt")}', upload_responses)
+
+        self.assertEqual(EXIT_OK, status)
+        self.assertEqual(self.files[:2], sorted(name for name, _ in uploads))
+        self.assertTrue(all('name="key"\r\n\r\nabc' in body for _, body in uploads))
+        self.assertEqual(1, submit.call_count)
+        submission = parse_qs(submit.last_request.text)
+        self.assertEqual(['online_upload'], submission['submission[submission_type]'])
+        self.assertEqual(['3', '4'], submission['submission[file_ids][]'])
+        self.assertIn('Uploaded 2 files', output)
+
+    def test_failed_upload_not_submitted(self):
+        def upload_responses(name):
+            if name.endswith('notes.md'):
+                return 500, {}, {}
+            return 201, {}, {'id': 4}
+
+        status, output, uploads, submit = self.run_session(f'ua -c 13682 40002 {" ".join(self.files)}',
+                                                           upload_responses)
+
+        self.assertEqual(EXIT_COMMAND_FAILED, status)
+        self.assertEqual(3, len(uploads))
+        self.assertFalse(submit.called)
+        self.assertIn(f'Failed to upload {self.files[2]}', output)
+        self.assertIn('Not submitting.', output)
+
+    def test_missing_file_not_uploaded(self):
+        status, output, uploads, submit = self.run_session(f'ua -c 13682 40002 {self.files[0]} missing.pdf',
+                                                           lambda name: (201, {}, {'id': 4}))
+
+        self.assertEqual(EXIT_COMMAND_FAILED, status)
+        self.assertEqual([], uploads)
+        self.assertIn('ua: no such file: missing.pdf', output)
@@ -0,0 +1,87 @@
+import unittest
+from types import SimpleNamespace
+
+import requests_mock
+
+from clanvas.clanvas import Clanvas
+from clanvas.watcher import Watcher, changed_due_dates, new_grades
+from tests.register import register_uris
+from tests.regression.test_regression import compose_requirements, grades_requirements, login_requirements
+from tests.settings import BASE_URL, BASE_URL_WITH_VERSION, API_KEY
+
+
+def topic(topic_id, posted_at):
+    return {'id': topic_id, 'title': f'Announcement {topic_id}', 'posted_at': posted_at, 'last_reply_at': posted_at}
+
+
+class TestWatcher(unittest.TestCase):
+
+    def test_diffs(self):
+        graded = SimpleNamespace(id=1, grade='18', score=18.0)
+        regraded = SimpleNamespace(id=1, grade='19', score=19.0)
+        ungraded = SimpleNamespace(id=2, grade=None, score=None)
+        self.assertEqual([], new_grades([graded, ungraded], [graded, ungraded]))
+        self.assertEqual([regraded], new_grades([graded, ungraded], [regraded, ungraded]))
+
+        due = SimpleNamespace(id=1, due_at='2018-09-04T03:59:59Z')
+        moved = SimpleNamespace(id=1, due_at='2018-09-06T03:59:59Z')
+        self.assertEqual([moved], changed_due_dates([due], [moved, SimpleNamespace(id=2, due_at=None)]))
+
+    def test_polls_only_courses_with_activity(self):
+        stream_url = BASE_URL_WITH_VERSION + 'users/self/activity_stream'
+        topics_url = BASE_URL_WITH_VERSION + 'courses/13682/discussion_topics'
+        with requests_mock.Mocker() as m:
+            register_uris(compose_requirements(login_requirements, grades_requirements), m)
+            m.get(stream_url, [
+                {'json': [{'course_id': 13682, 'updated_at': '2018-10-01T12:00:00Z'}], 'headers': {'ETag': '"a"'}},
+                {'status_code': 304},
+                {'json': [{'course_id': 13682, 'updated_at': '2018-10-02T12:00:00Z'},
+                          {'course_id': 13682, 'updated_at': '2018-10-01T12:00:00Z'}], 'headers': {'ETag': '"b"'}}])
+            m.get(topics_url, [{'json': [topic(1, '2018-10-01T12:00:00Z')]},
+                               {'json': [topic(1, '2018-10-01T12:00:00Z')]},
+                               {'json': [topic(2, '2018-10-02T12:00:00Z'), topic(1, '2018-10-01T12:00:00Z')]}])
+
+            clanvas = Clanvas(BASE_URL, API_KEY)
+            watcher = Watcher(clanvas, [clanvas.get_courses()[13682]], interval=10, max_interval=30,
+                              assignments_every=100)
+            watcher.snapshot()
+
+            self.assertEqual([], watcher.poll())
+            self.assertEqual(20, watcher.next_interval)
+
+            topic_requests = len([r for r in m.request_history if r.path.endswith('/discussion_topics')])
+            self.assertEqual([], watcher.poll())
+            self.assertEqual('"a"', m.last_request.headers['If-None-Match'])
+            self.assertEqual(topic_requests, len([r for r in m.request_history
+                                                  if r.path.endswith('/discussion_topics')]))
+            self.assertEqual(30, watcher.next_interval)
+
+            notifications = watcher.poll()
+            self.assertEqual(['announcement'], [notification.kind for notification in notifications])
+            self.assertEqual(2, notifications[0].record()['id'])
+            self.assertIn('EECS455-13682: new announcement "Announcement 2" (2)', notifications[0].line())
+            self.assertEqual(10, watcher.next_interval)
+            clanvas.stop_prefetching()
+
+    def test_due_dates_diffed_against_own_snapshot(self):
+        assignments_url = BASE_URL_WITH_VERSION + 'courses/13682/assignments'
+        homework = {'id': 40001, 'name': 'Homework 1', 'course_id': 13682, 'points_possible': 20.0,
+                    'created_at': '2018-08-28T14:00:00Z', 'due_at': '2018-09-04T03:59:59Z'}
+        with requests_mock.Mocker() as m:
+            register_uris(compose_requirements(login_requirements, grades_requirements), m)
+            m.get(assignments_url, [{'json': [homework]},
+                                    {'json': [dict(homework, due_at='2018-09-06T03:59:59Z')]}])
+            m.get(BASE_URL_WITH_VERSION + 'courses/13682/discussion_topics', json=[])
+
+            clanvas = Clanvas(BASE_URL, API_KEY)
+            course = clanvas.get_courses()[13682]
+            watcher = Watcher(clanvas, [course])
+            watcher.snapshot()
+
+            # another command or a background refresh updates the shared cache before the next poll
+            clanvas.list_assignments_cached.refresh(13682)
+
+            notifications = watcher.poll_due_dates(course)
+            self.assertEqual(['due_date'], [notification.kind for notification in notifications])
+            self.assertEqual([], watcher.poll_due_dates(course))
+            clanvas.stop_prefetching()